@@ -0,0 +1,363 @@
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import sys
+import time
+
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+import numpy as np
+
+import src.main
+
+from src.constants import MAX_BATCH_SIZE, MAX_K, MIN_K, WINDOW_SIZES
+from src.services import SymbolManager
+
+# Constants
+SEED = 42
+START_PRICE = 10000.0
+PRICE_STEP = 0.01  # Standard deviation of the random walk per trade
+INGEST_BATCHES = 2000  # Batches fed per ingest scenario
+READS = 20000  # Reads per read scenario
+HTTP_REQUESTS = 2000  # Requests per HTTP scenario
+HTTP_BATCH_SIZE = 1000
+SMALL_BATCH_SIZE = 10  # Largest batch of the small_batches scenario
+READS_PER_BATCH = 10  # Reads between two batches in the mixed scenario
+SYMBOLS = 10  # Symbols the batches of the many_symbols scenario are spread over
+PREFILL_CHUNK = 10**7
+REPEAT = 3  # Runs per scenario, of which the median is kept
+# Relative change of throughput or p50 latency reported as a regression, doubled for p99
+DEFAULT_TOLERANCE = 0.3
+BASELINE = Path(__file__).with_name("bench_baseline.json")
+
+# Keep per-request logs out of the timings
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+class Recorder:
+    """Latency of every operation of a scenario, and the number of values they carried."""
+
+    def __init__(self):
+        self.latencies: List[int] = []  # Nanoseconds
+        self.values = 0
+
+    async def time(self, operation: Awaitable, values: int = 0):
+        start_time = time.perf_counter_ns()
+        result = await operation
+        self.latencies.append(time.perf_counter_ns() - start_time)
+        self.values += values
+        return result
+
+    def summary(self) -> Dict[str, float]:
+        latencies = np.array(self.latencies) / 1e3  # Microseconds
+        elapsed = latencies.sum() / 1e6
+        p50, p99, p999 = np.percentile(latencies, [50, 99, 99.9])
+        return {
+            "ops": len(latencies),
+            "ops_per_s": round(len(latencies) / elapsed, 1),
+            "values_per_s": round(self.values / elapsed, 1),
+            "p50_us": round(p50, 2),
+            "p99_us": round(p99, 2),
+            "p999_us": round(p999, 2),
+        }
+
+
+def batch_sizes(rng: np.random.Generator, count: int, high: int = MAX_BATCH_SIZE) -> List[int]:
+    return rng.integers(1, high + 1, count).tolist()
+
+
+def random_walk(rng: np.random.Generator, size: int, start: float = START_PRICE) -> np.ndarray:
+    return (start + np.cumsum(rng.normal(0.0, PRICE_STEP, size))).astype(np.float32)
+
+
+def prefill(manager: SymbolManager, symbol: str, rng: np.random.Generator) -> None:
+    """Fill the symbol's buffer, so the largest window is full and every batch evicts."""
+    capacity = WINDOW_SIZES[MAX_K]
+    manager._load(
+        symbol,
+        (
+            random_walk(rng, min(PREFILL_CHUNK, capacity - start))
+            for start in range(0, capacity, PREFILL_CHUNK)
+        ),
+    )
+
+
+async def steady_ingest(rng: np.random.Generator) -> Dict[str, Recorder]:
+    """Random walk batches of random sizes for one symbol."""
+    manager, recorder = SymbolManager(), Recorder()
+    for size in batch_sizes(rng, INGEST_BATCHES):
+        values = random_walk(rng, size)
+        await recorder.time(manager.add_batch("AAPL", values), size)
+    return {"manager/steady_ingest": recorder}
+
+
+async def small_batches(rng: np.random.Generator) -> Dict[str, Recorder]:
+    """Batches of 1 to 10 values for one symbol, where the fixed cost of publishing dominates."""
+    manager, recorder = SymbolManager(), Recorder()
+    for size in batch_sizes(rng, INGEST_BATCHES, high=SMALL_BATCH_SIZE):
+        await recorder.time(manager.add_batch("AAPL", random_walk(rng, size)), size)
+    return {"manager/small_batches": recorder}
+
+
+async def monotonic_ingest(rng: np.random.Generator) -> Dict[str, Recorder]:
+    """Strictly rising prices: every value evicted was the window minimum."""
+    manager, recorder = SymbolManager(), Recorder()
+    price = START_PRICE
+    for size in batch_sizes(rng, INGEST_BATCHES):
+        values = price + np.arange(1, size + 1, dtype=np.float32) * PRICE_STEP
+        price = float(values[-1])
+        await recorder.time(manager.add_batch("AAPL", values), size)
+    return {"manager/monotonic_ingest": recorder}
+
+
+async def full_window(rng: np.random.Generator) -> Dict[str, Recorder]:
+    """Ingest and reads on a symbol holding the largest window in full."""
+    manager, ingest, reads, custom = SymbolManager(), Recorder(), Recorder(), Recorder()
+    prefill(manager, "AAPL", rng)
+    for size in batch_sizes(rng, INGEST_BATCHES):
+        await ingest.time(manager.add_batch("AAPL", random_walk(rng, size)), size)
+    for k in rng.integers(MIN_K, MAX_K + 1, READS).tolist():
+        await reads.time(manager.get_stats_json("AAPL", k))
+    for last in rng.integers(1, WINDOW_SIZES[MAX_K] + 1, READS // 10).tolist():
+        await custom.time(manager.get_window_stats("AAPL", last=last))
+    return {
+        "manager/full_window_ingest": ingest,
+        "manager/full_window_reads": reads,
+        "manager/full_window_custom_reads": custom,
+    }
+
+
+async def mixed(rng: np.random.Generator) -> Dict[str, Recorder]:
+    """Batches for several symbols, with reads of any symbol and window between them."""
+    manager, ingest, reads = SymbolManager(), Recorder(), Recorder()
+    symbols = [f"SYMBOL{i}" for i in range(4)]
+    for size in batch_sizes(rng, INGEST_BATCHES):
+        symbol = symbols[rng.integers(len(symbols))]
+        await ingest.time(manager.add_batch(symbol, random_walk(rng, size)), size)
+        for _ in range(READS_PER_BATCH):
+            symbol = symbols[rng.integers(len(symbols))]
+            if symbol in manager.symbols:
+                await reads.time(
+                    manager.get_stats_json(symbol, int(rng.integers(MIN_K, MAX_K + 1)))
+                )
+    return {"manager/mixed_ingest": ingest, "manager/mixed_reads": reads}
+
+
+async def many_symbols(rng: np.random.Generator) -> Dict[str, Recorder]:
+    """Small batches spread over every symbol, where fixed per-batch costs dominate."""
+    manager, recorder = SymbolManager(), Recorder()
+    for i, size in enumerate(batch_sizes(rng, INGEST_BATCHES, high=100)):
+        await recorder.time(manager.add_batch(f"SYMBOL{i % SYMBOLS}", random_walk(rng, size)), size)
+    multi = Recorder()
+    for _ in range(READS // 10):
+        await multi.time(manager.get_multi_stats_json())
+    return {"manager/many_symbols_ingest": recorder, "manager/many_symbols_multi_reads": multi}
+
+
+async def http(rng: np.random.Generator) -> Dict[str, Recorder]:
+    """The ASGI app in-process, from request to response, on a fresh SymbolManager."""
+    src.main.symbol_manager = SymbolManager()
+    recorders = {
+        name: Recorder() for name in ("ingest_json", "ingest_binary", "stats", "multi_stats")
+    }
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=src.main.app), base_url="http://bench"
+    ) as client:
+        for _ in range(HTTP_REQUESTS):
+            values = random_walk(rng, HTTP_BATCH_SIZE)
+            body = {"symbol": "AAPL", "values": values.tolist()}
+            response = await recorders["ingest_json"].time(
+                client.post("/add_batch/", json=body), HTTP_BATCH_SIZE
+            )
+            response.raise_for_status()
+            response = await recorders["ingest_binary"].time(
+                client.post(
+                    "/add_batch/MSFT",
+                    content=values.astype("<f8").tobytes(),
+                    headers={"Content-Type": "application/octet-stream"},
+                ),
+                HTTP_BATCH_SIZE,
+            )
+            response.raise_for_status()
+        for k in rng.integers(MIN_K, MAX_K + 1, HTTP_REQUESTS).tolist():
+            response = await recorders["stats"].time(client.get(f"/stats/AAPL/{k}"))
+            response.raise_for_status()
+            response = await recorders["multi_stats"].time(client.get("/stats"))
+            response.raise_for_status()
+    return {f"http/{name}": recorder for name, recorder in recorders.items()}
+
+
+def calibrate() -> float:
+    """
+    Median time in microseconds of a fixed mix of interpreter and NumPy work, measured
+    alongside every scenario so results can be compared across machines and machine load.
+    """
+    values = np.random.default_rng(SEED).random(10**5, dtype=np.float32)
+    timings = []
+    for _ in range(21):
+        start_time = time.perf_counter_ns()
+        total = 0.0
+        for i in range(2000):
+            total += i * 0.5
+        np.cumsum(values).min()
+        json.dumps({"values": values[:200].tolist()})
+        timings.append(time.perf_counter_ns() - start_time)
+    return float(np.median(timings)) / 1e3
+
+
+SCENARIOS: Dict[str, Callable[[np.random.Generator], Awaitable[Dict[str, Recorder]]]] = {
+    "steady_ingest": steady_ingest,
+    "small_batches": small_batches,
+    "monotonic_ingest": monotonic_ingest,
+    "full_window": full_window,
+    "mixed": mixed,
+    "many_symbols": many_symbols,
+    "http": http,
+}
+
+
+def run(scenarios: List[str], seed: int, repeat: int) -> Dict[str, Dict[str, float]]:
+    """
+    Run each scenario `repeat` times, each time with a generator seeded with `seed` so every
+    run does the same work, and keep the median of each metric over the runs.
+    """
+    results = {}
+    for name in scenarios:
+        runs: Dict[str, List[Dict[str, float]]] = {}
+        for _ in range(repeat):
+            calibration = calibrate()
+            recorders = asyncio.run(SCENARIOS[name](np.random.default_rng(seed)))
+            for key, recorder in recorders.items():
+                summary = recorder.summary()
+                summary["calibration_us"] = round(calibration, 2)
+                runs.setdefault(key, []).append(summary)
+        for key, summaries in runs.items():
+            results[key] = {
+                metric: float(np.median([summary[metric] for summary in summaries]))
+                for metric in summaries[0]
+            }
+            results[key]["ops"] = summaries[0]["ops"]  # The same in every run
+            print_result(key, results[key])
+    return results
+
+
+def compare(
+    results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], tolerance: float
+) -> List[str]:
+    """
+    Compare results with a baseline, returning a description of every regression: throughput
+    down or p50 latency up by more than `tolerance`, or p99 latency up by more than twice
+    that. p99.9 is too noisy to gate on.
+    Baseline figures are first scaled by how much slower the calibration ran this time.
+    """
+    regressions = []
+    for key, expected in baseline.items():
+        actual = results.get(key)
+        if actual is None:
+            continue
+        slowdown = actual["calibration_us"] / expected["calibration_us"]
+        ops_per_s = expected["ops_per_s"] / slowdown
+        if actual["ops_per_s"] < ops_per_s * (1 - tolerance):
+            regressions.append(
+                f"{key}: throughput {actual['ops_per_s']:,.0f} ops/s, "
+                f"baseline {ops_per_s:,.0f} ops/s"
+            )
+        for metric, allowed in (("p50_us", tolerance), ("p99_us", 2 * tolerance)):
+            latency = expected[metric] * slowdown
+            if actual[metric] > latency * (1 + allowed):
+                regressions.append(
+                    f"{key}: {metric} {actual[metric]:,.1f} us, baseline {latency:,.1f} us"
+                )
+    return regressions
+
+
+def print_result(key: str, result: Dict[str, float]) -> None:
+    print(
+        f"{key:<36} {result['ops']:>7,} {result['ops_per_s']:>11,.0f} "
+        f"{result['values_per_s']:>13,.0f} {result['p50_us']:>9.1f} {result['p99_us']:>9.1f} "
+        f"{result['p999_us']:>9.1f}"
+    )
+
+
+def main(
+    scenarios: List[str],
+    seed: int,
+    repeat: int,
+    output: Optional[Path],
+    baseline: Optional[Path],
+    save_baseline: bool,
+    tolerance: float,
+) -> int:
+    header = (
+        f"{'scenario':<36} {'ops':>7} {'ops/s':>11} {'values/s':>13} "
+        f"{'p50 us':>9} {'p99 us':>9} {'p99.9 us':>9}"
+    )
+    print(header)
+    print("-" * len(header))
+    results = run(scenarios, seed, repeat)
+    report = {
+        "seed": seed,
+        "repeat": repeat,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "results": results,
+    }
+    if output is not None:
+        output.write_text(json.dumps(report, indent=2) + "\n")
+    if baseline is None:
+        return 0
+    if save_baseline:
+        baseline.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"\nSaved baseline to {baseline}")
+        return 0
+
+    expected = json.loads(baseline.read_text())
+    if expected["seed"] != seed:
+        print(f"\nBaseline was recorded with seed {expected['seed']}, not {seed}")
+        return 1
+    regressions = compare(results, expected["results"], tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) against {baseline}:")
+        for regression in regressions:
+            print(f"  REGRESSION {regression}")
+        return 1
+    print(f"\nNo regression against {baseline} (tolerance {tolerance:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run reproducible benchmarks of SymbolManager and the app."
+    )
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=SCENARIOS)
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="Runs per scenario")
+    parser.add_argument("--output", type=Path, help="Write the results to this JSON file")
+    parser.add_argument(
+        "--baseline",
+        type=Path,
+        nargs="?",
+        const=BASELINE,
+        help=f"Compare against this baseline (default {BASELINE.name}), failing on regressions",
+    )
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="Record the results as the baseline instead"
+    )
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+    sys.exit(
+        main(
+            args.scenarios,
+            args.seed,
+            args.repeat,
+            args.output,
+            args.baseline,
+            args.save_baseline,
+            args.tolerance,
+        )
+    )
@@ -48,13 +48,16 @@ def symbol_progress_pill(symbol: str, progress: float, current_size: int):
     )
 
 
-async def get_stats(client: httpx.AsyncClient, symbol: str, k: int):
+async def get_all_stats(client: httpx.AsyncClient):
+    """Fetch every window size of every symbol with data, in a single request."""
     try:
-        response = await client.get(f"http://localhost:8000/stats/{symbol}/{k}")
-        return response.json() if response.status_code == 200 else None
-    except httpx.HTTPStatusError as e:
+        response = await client.get(
+            "http://localhost:8000/stats", params={"symbol": SYMBOLS, "k": list(range(1, 9))}
+        )
+        return response.json() if response.status_code == 200 else {}
+    except httpx.HTTPError as e:
         print(f"HTTP error occurred: {e}")
-        return None
+        return {}
 
 
 async def fetch_all_stats():
@@ -62,43 +65,34 @@ async def fetch_all_stats():
         active_symbols = set()
         stats_data: Dict[str, dict] = {}
 
-        # Fetch initial stats for all symbols concurrently
-        tasks = []
-        for symbol in SYMBOLS:
-            tasks.append(get_stats(client, symbol, 1))
-        initial_stats = await asyncio.gather(*tasks)
-
-        for symbol, stats in zip(SYMBOLS, initial_stats):
-            if stats:
-                active_symbols.add(symbol)
-                stats_data[symbol] = {"window_stats": [], "max_window": None}
-
-                # Fetch all window sizes concurrently for this symbol
-                window_tasks = []
-                for k in range(1, 9):
-                    window_tasks.append(get_stats(client, symbol, k))
-                window_stats = await asyncio.gather(*window_tasks)
-
-                for k, stats in enumerate(window_stats, 1):
-                    if stats:
-                        stats_data[symbol]["window_stats"].append(
-                            {
-                                "window": f"10^{k}",
-                                "min": stats["min"],
-                                "max": stats["max"],
-                                "last": stats["last"],
-                                "avg": stats["avg"],
-                                "var": stats["var"],
-                                "values": stats["values"],
-                            }
-                        )
+        # All windows of a symbol come from the same snapshot, so they reflect the same trade
+        all_stats = await get_all_stats(client)
+
+        for symbol, symbol_stats in all_stats.items():
+            active_symbols.add(symbol)
+            stats_data[symbol] = {"window_stats": [], "max_window": None}
+
+            for k in range(1, 9):
+                stats = symbol_stats["stats"].get(str(k))
+                if stats:
+                    stats_data[symbol]["window_stats"].append(
+                        {
+                            "window": f"10^{k}",
+                            "min": stats["min"],
+                            "max": stats["max"],
+                            "last": stats["last"],
+                            "avg": stats["avg"],
+                            "var": stats["var"],
+                            "values": stats["values"],
+                        }
+                    )
 
-                        if k == 8:
-                            stats_data[symbol]["max_window"] = {
-                                "current_size": stats["values"],
-                                "max_size": MAX_WINDOW_SIZE,
-                                "last": stats["last"],
-                            }
+                    if k == 8:
+                        stats_data[symbol]["max_window"] = {
+                            "current_size": stats["values"],
+                            "max_size": MAX_WINDOW_SIZE,
+                            "last": stats["last"],
+                        }
 
         return active_symbols, stats_data
 
@@ -1,4 +1,6 @@
+import argparse
 import asyncio
+import json
 import logging
 import random
 import time
@@ -37,13 +39,18 @@ def generate_random_values(size: int) -> List[float]:
 
 
 @time_execution
-async def simulate_hft_stream(batch_count: Optional[int] = None):
+async def simulate_hft_stream(
+    batch_count: Optional[int] = None, binary: bool = False, bulk: bool = False
+):
     """
     Simulate a high-frequency trading data stream by sending batches of random values
     to a RESTful service endpoint.
 
     Args:
         batch_count (Optional[int]): Number of batches to send. If None, run indefinitely.
+        binary (bool): Send raw little-endian float64 bodies to /add_batch/{symbol} instead
+            of JSON to /add_batch/.
+        bulk (bool): Send one batch for every symbol per request to /add_batches/.
 
     Returns:
         dict: Contains request_count, total_time, and total_trades for logging purposes.
@@ -56,12 +63,31 @@ async def simulate_hft_stream(batch_count: Optional[int] = None):
         while True:
             symbol = random.choice(REAL_SYMBOLS)
             batch_size = random.randint(MIN_BATCH_SIZE, MAX_BATCH_SIZE)
-            values = generate_random_values(batch_size)
-            batch_data = BatchData(symbol=symbol, values=values)
+            if bulk:
+                symbol = "all symbols"
+                batches = [
+                    BatchData(symbol=name, values=generate_random_values(batch_size)).model_dump()
+                    for name in REAL_SYMBOLS
+                ]
+                values = [value for batch in batches for value in batch["values"]]
+            elif binary:
+                values = np.random.uniform(MIN_VALUE, MAX_VALUE, batch_size)
+            else:
+                values = generate_random_values(batch_size)
+                batch_data = BatchData(symbol=symbol, values=values)
 
             try:
                 start_time = time.perf_counter()
-                response = await client.post("/add_batch/", json=batch_data.model_dump())
+                if bulk:
+                    response = await client.post("/add_batches/", json={"batches": batches})
+                elif binary:
+                    response = await client.post(
+                        f"/add_batch/{symbol}",
+                        content=values.astype("<f8").tobytes(),
+                        headers={"Content-Type": "application/octet-stream"},
+                    )
+                else:
+                    response = await client.post("/add_batch/", json=batch_data.model_dump())
                 response.raise_for_status()
                 end_time = time.perf_counter()
 
@@ -91,6 +117,73 @@ async def simulate_hft_stream(batch_count: Optional[int] = None):
     return {"request_count": request_count, "total_time": total_time, "total_trades": total_trades}
 
 
+def ingest_frame(symbol: str, values: np.ndarray) -> bytes:
+    """Encode a batch as a binary frame of the /ws/ingest channel."""
+    encoded = symbol.encode()
+    return bytes([len(encoded)]) + encoded + values.astype("<f8").tobytes()
+
+
+@time_execution
+async def simulate_hft_websocket_stream(batch_count: int):
+    """
+    Stream batches of random values for random symbols over one /ws/ingest connection,
+    waiting for acks whenever the server's in-flight limit is reached.
+
+    Returns:
+        dict: Contains request_count, total_time, and total_trades for logging purposes.
+    """
+    import websockets  # Only needed for this mode
+
+    total_trades = 0
+    async with websockets.connect("ws://localhost:8000/ws/ingest", max_size=None) as websocket:
+        max_in_flight = json.loads(await websocket.recv())["max_in_flight"]
+        acked = 0
+
+        async def wait_for_ack() -> int:
+            while True:
+                message = json.loads(await websocket.recv())
+                if "error" in message:
+                    logger.error("Batch %s rejected: %s", message["batch"], message["error"])
+                else:
+                    return message["ack"]
+
+        start_time = time.perf_counter()
+        for sent in range(1, batch_count + 1):
+            values = np.random.uniform(
+                MIN_VALUE, MAX_VALUE, random.randint(MIN_BATCH_SIZE, MAX_BATCH_SIZE)
+            )
+            await websocket.send(ingest_frame(random.choice(REAL_SYMBOLS), values))
+            total_trades += len(values)
+            while sent - acked >= max_in_flight:
+                acked = await wait_for_ack()
+
+        await websocket.send("flush")
+        while acked < batch_count:
+            acked = await wait_for_ack()
+        total_time = (time.perf_counter() - start_time) * 1_000_000  # Convert to microseconds
+
+    return {"request_count": batch_count, "total_time": total_time, "total_trades": total_trades}
+
+
 # Example usage
 if __name__ == "__main__":
-    asyncio.run(simulate_hft_stream(batch_count=1000))
+    parser = argparse.ArgumentParser(description="Send a stream of random trade batches.")
+    parser.add_argument("--batches", type=int, default=1000, help="Number of batches to send")
+    parser.add_argument(
+        "--binary", action="store_true", help="Use the binary ingest endpoint instead of JSON"
+    )
+    parser.add_argument(
+        "--bulk", action="store_true", help="Send a batch for every symbol in each request"
+    )
+    parser.add_argument(
+        "--websocket",
+        action="store_true",
+        help="Stream binary batches over one /ws/ingest connection instead of HTTP requests",
+    )
+    args = parser.parse_args()
+    if args.websocket:
+        asyncio.run(simulate_hft_websocket_stream(batch_count=args.batches))
+    else:
+        asyncio.run(
+            simulate_hft_stream(batch_count=args.batches, binary=args.binary, bulk=args.bulk)
+        )
@@ -0,0 +1,345 @@
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .constants import BLOCK_SIZE
+from .moments import EMPTY_MOMENTS, Moments, combine_moments, merge_moments, moments
+
+# Moments, min and max of a range of values
+Summary = Tuple[Moments, float, float]
+
+
+class BlockIndex:
+    """
+    Hierarchical block summaries over a fixed-size array.
+
+    Level 0 holds the count, sum, M2, min and max of every `block_size` consecutive slots,
+    level 1 the same aggregates over every `block_size` level-0 blocks, and so on until a level
+    fits in one block. A range query combines at most two partial blocks per level with the
+    full blocks of the highest level it reaches, so its cost is independent of the range length.
+    """
+
+    def __init__(self, data: np.ndarray, block_size: int = BLOCK_SIZE):
+        self.data = data
+        self.block_size = block_size
+        # Per level, one row per block: (count, sum, M2) as float64 and (min, max) as data dtype
+        self.moments: List[np.ndarray] = []
+        self.extrema: List[np.ndarray] = []
+        size = len(data)
+        while size > block_size:
+            if not self.moments:
+                # Every block is full except possibly the last one
+                counts = np.full(-(-size // block_size), float(block_size))
+                counts[-1] = size - (len(counts) - 1) * block_size
+            else:
+                counts = np.add.reduceat(counts, np.arange(0, size, block_size))
+            size = len(counts)
+            level_moments = np.zeros((size, 3))
+            level_moments[:, 0] = counts
+            level_extrema = np.empty((size, 2), dtype=data.dtype)
+            level_extrema[:, 0], level_extrema[:, 1] = np.inf, -np.inf
+            self.moments.append(level_moments)
+            self.extrema.append(level_extrema)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the summaries, not counting the data."""
+        return sum(level.nbytes for level in self.moments + self.extrema)
+
+    def update(self, first: int, last: int) -> None:
+        """Recompute the summaries covering the slots [first, last) after they were written."""
+        for level in range(len(self.moments)):
+            first_block = first // self.block_size
+            last_block = -(-last // self.block_size)
+            segment = slice(first_block * self.block_size, last_block * self.block_size)
+            blocks = self.moments[level][first_block:last_block]
+            counts = blocks[:, 0]
+
+            if level == 0:
+                values = self.data[segment]
+                offsets = np.arange(0, len(values), self.block_size)
+                mins, maxs = values, values
+                sums = np.add.reduceat(values, offsets, dtype=np.float64)
+                deviations = np.subtract(
+                    values, np.repeat(sums / counts, np.diff(offsets, append=len(values)))
+                )
+                m2s = np.add.reduceat(np.square(deviations), offsets)
+            else:
+                children = self.moments[level - 1][segment]
+                offsets = np.arange(0, len(children), self.block_size)
+                mins = self.extrema[level - 1][segment, 0]
+                maxs = self.extrema[level - 1][segment, 1]
+                sums = np.add.reduceat(children[:, 1], offsets)
+                parent_means = np.repeat(sums / counts, np.diff(offsets, append=len(children)))
+                deviations = children[:, 1] / children[:, 0] - parent_means
+                spread = children[:, 0] * np.square(deviations)
+                m2s = np.add.reduceat(children[:, 2] + spread, offsets)
+
+            blocks[:, 1] = sums
+            blocks[:, 2] = m2s
+            extrema = self.extrema[level][first_block:last_block]
+            extrema[:, 0] = np.minimum.reduceat(mins, offsets)
+            extrema[:, 1] = np.maximum.reduceat(maxs, offsets)
+            first, last = first_block, last_block
+
+    def _pieces(self, first: int, last: int) -> Iterator[Tuple[int, int, int]]:
+        """
+        Cover the slots [first, last) with (level, first, last) pieces, where level -1 refers to
+        the raw data: partial blocks at each edge, and whole blocks from the highest level.
+        """
+        level = -1
+        while level + 1 < len(self.moments) and last - first > 2 * self.block_size:
+            inner_first = -(-first // self.block_size) * self.block_size
+            inner_last = last // self.block_size * self.block_size
+            if first < inner_first:
+                yield level, first, inner_first
+            if inner_last < last:
+                yield level, inner_last, last
+            first, last = inner_first // self.block_size, inner_last // self.block_size
+            level += 1
+        if first < last:
+            yield level, first, last
+
+    def _gather(self, ranges: Iterable[Tuple[int, int]]) -> Tuple[np.ndarray, ...]:
+        """
+        Collect the raw values and the block rows covering the slot ranges, so each group is
+        reduced with a single set of NumPy calls.
+        """
+        values, moments_rows, extrema_rows = [], [], []
+        for first, last in ranges:
+            for level, start, stop in self._pieces(first, last):
+                if level < 0:
+                    values.append(self.data[start:stop])
+                else:
+                    moments_rows.append(self.moments[level][start:stop])
+                    extrema_rows.append(self.extrema[level][start:stop])
+        return tuple(
+            parts[0] if len(parts) == 1 else np.concatenate(parts) if parts else None
+            for parts in (values, moments_rows, extrema_rows)
+        )
+
+    def min_max(self, ranges: Iterable[Tuple[int, int]]) -> Tuple:
+        """Return the min and max of the slots in the given [first, last) ranges."""
+        values, _, extrema = self._gather(ranges)
+        lowest, highest = np.inf, -np.inf
+        if values is not None:
+            lowest, highest = values.min(), values.max()
+        if extrema is not None:
+            lowest, highest = min(lowest, extrema[:, 0].min()), max(highest, extrema[:, 1].max())
+        return self.data.dtype.type(lowest), self.data.dtype.type(highest)
+
+    def summary(self, ranges: Iterable[Tuple[int, int]]) -> Summary:
+        """Return the moments, min and max of the slots in the given [first, last) ranges."""
+        values, blocks, extrema = self._gather(ranges)
+        total = EMPTY_MOMENTS
+        lowest, highest = np.inf, -np.inf
+        if values is not None:
+            total = moments(values)
+            lowest, highest = values.min(), values.max()
+        if blocks is not None:
+            total = merge_moments(total, combine_moments(blocks[:, 0], blocks[:, 1], blocks[:, 2]))
+            lowest, highest = min(lowest, extrema[:, 0].min()), max(highest, extrema[:, 1].max())
+        return total, self.data.dtype.type(lowest), self.data.dtype.type(highest)
+
+
+class RingBuffer:
+    """
+    Fixed-capacity circular buffer backed by one contiguous NumPy array.
+    Windows over the most recent values are expressed as offsets from the write head, so
+    any number of windows can share a single copy of the data. A BlockIndex over the array
+    answers stats queries for any range without scanning it.
+
+    The array can start smaller than the capacity and double as values arrive, and can be
+    spilled to a memory-mapped file while the buffer is not written to.
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        dtype=np.float32,
+        block_size: int = BLOCK_SIZE,
+        initial_capacity: Optional[int] = None,
+    ):
+        """
+        Initialize the buffer. Without an initial capacity, the array is allocated in full
+        up front, and its pages are only committed by the OS once they are written to.
+        """
+        if capacity <= 0:
+            raise ValueError("Capacity must be positive")
+        self.capacity = capacity
+        self.block_size = block_size
+        size = capacity if initial_capacity is None else min(initial_capacity, capacity)
+        self.data = np.zeros(size, dtype=dtype)
+        self.count = 0  # Total number of values ever appended
+        self.index = BlockIndex(self.data, block_size)
+        self.path: Optional[Path] = None  # File holding the values while spilled
+
+    def __len__(self) -> int:
+        return min(self.count, self.capacity)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the buffer: its array, unless spilled, and its index."""
+        return (0 if self.path is not None else self.data.nbytes) + self.index.nbytes
+
+    def spill(self, path: Path) -> None:
+        """
+        Write the array to `path` and memory-map the file in its place, so the memory is
+        returned and the OS only pages values back in when they are read. The next write moves
+        them back into memory.
+        """
+        self.data.tofile(path)
+        self.path = path
+        self.data = self.index.data = np.memmap(
+            path, dtype=self.data.dtype, mode="r", shape=self.data.shape
+        )
+
+    def unspill(self) -> None:
+        """Move the values of a spilled buffer back into memory, and delete its file."""
+        self.data = self.index.data = np.array(self.data)
+        self.path.unlink(missing_ok=True)
+        self.path = None
+
+    def value_at(self, age: int):
+        """Return the value `age` positions back from the newest one (0 is the newest)."""
+        return self.data[(self.count - 1 - age) % self.capacity]
+
+    def slots(self, start: int, stop: int) -> List[Tuple[int, int]]:
+        """
+        Map the absolute positions [start, stop) to one or two [first, last) slot ranges of the
+        underlying array, split where the range wraps around its end.
+        """
+        if start < self.count - self.capacity or stop > self.count or start > stop:
+            raise IndexError(f"Range [{start}, {stop}) is not held in the buffer")
+        if start == stop:
+            return []
+        first = start % self.capacity
+        last = (stop - 1) % self.capacity + 1
+        if first < last:
+            return [(first, last)]
+        return [(first, self.capacity), (0, last)]
+
+    def parts(self, start: int, stop: int) -> Tuple[np.ndarray, ...]:
+        """
+        Return the values at absolute positions [start, stop) as one or two views, split where
+        the range wraps around the end of the array. Nothing is copied.
+        """
+        slots = self.slots(start, stop)
+        if not slots:
+            return (self.data[:0],)
+        return tuple(self.data[first:last] for first, last in slots)
+
+    def range(self, start: int, stop: int) -> np.ndarray:
+        """
+        Return the values at absolute positions [start, stop) in insertion order.
+        A view when the range is contiguous in memory, a copy when it wraps around.
+        """
+        parts = self.parts(start, stop)
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    def last(self, n: int) -> np.ndarray:
+        """Return the most recent n values in insertion order."""
+        n = min(n, len(self))
+        return self.range(self.count - n, self.count)
+
+    def min_max(self, start: int, stop: int) -> Tuple:
+        """Return the min and max of the values at absolute positions [start, stop)."""
+        return self.index.min_max(self.slots(start, stop))
+
+    def summary(self, start: int, stop: int) -> Summary:
+        """Return the moments, min and max of the values at absolute positions [start, stop)."""
+        return self.index.summary(self.slots(start, stop))
+
+    def append(self, value: float) -> None:
+        self._reserve(min(self.count + 1, self.capacity))
+        slot = self.count % self.capacity
+        self.data[slot] = value
+        self.index.update(slot, slot + 1)
+        self.count += 1
+
+    def extend(self, values: np.ndarray) -> None:
+        """Append many values, keeping only the last `capacity` if the batch is larger."""
+        total = len(values)
+        self._reserve(min(self.count + total, self.capacity))
+        values = values[-self.capacity :]
+        n = len(values)
+        start = (self.count + total - n) % self.capacity
+        first = min(n, self.capacity - start)
+        self.data[start : start + first] = values[:first]
+        self.data[: n - first] = values[first:]
+        self.index.update(start, start + first)
+        if n > first:
+            self.index.update(0, n - first)
+        self.count += total
+
+    def _reserve(self, size: int) -> None:
+        """Make the array writable and at least `size` values long, before writing to it."""
+        if self.path is not None:
+            self.unspill()
+        if size > len(self.data):
+            # Positions only wrap once the array has its full capacity, so until then the
+            # values held are its first `count` slots
+            data = np.zeros(min(max(size, 2 * len(self.data)), self.capacity), self.data.dtype)
+            data[: self.count] = self.data[: self.count]
+            self.data = data
+            self.index = BlockIndex(data, self.block_size)
+            if self.count:
+                self.index.update(0, self.count)
+
+
+class TimeIndex:
+    """
+    Wall-clock time at which each batch still held in a RingBuffer was added, so time-based
+    windows resolve to a range of absolute positions with a binary search.
+    """
+
+    def __init__(self, initial_size: int = 1024):
+        self.ends = np.zeros(initial_size, dtype=np.int64)  # Absolute position after each batch
+        self.times = np.zeros(initial_size, dtype=np.float64)
+        self.first = 0  # Index of the oldest batch still tracked
+        self.size = 0  # Index after the newest batch
+        self.base = 0  # Absolute position where the oldest tracked batch starts
+
+    def __len__(self) -> int:
+        return self.size - self.first
+
+    @property
+    def nbytes(self) -> int:
+        return self.ends.nbytes + self.times.nbytes
+
+    def record(self, end: int, timestamp: float) -> None:
+        """Record that the values up to absolute position `end` were added at `timestamp`."""
+        if self.size == len(self.ends):
+            self._compact()
+        if self.size > self.first:
+            # Keep times sorted even if the wall clock steps back
+            timestamp = max(timestamp, self.times[self.size - 1])
+        self.ends[self.size] = end
+        self.times[self.size] = timestamp
+        self.size += 1
+
+    def trim(self, oldest: int) -> None:
+        """Forget the batches whose values all precede absolute position `oldest`."""
+        held = self.ends[self.first : self.size]
+        evicted = int(np.searchsorted(held, oldest, side="right"))
+        if evicted:
+            self.base = int(held[evicted - 1])
+            self.first += evicted
+
+    def start_since(self, cutoff: float) -> int:
+        """Absolute position of the first value added at or after `cutoff`."""
+        index = int(np.searchsorted(self.times[self.first : self.size], cutoff, side="left"))
+        if index == 0:
+            return self.base
+        return int(self.ends[self.first + index - 1])
+
+    def _compact(self) -> None:
+        """Drop trimmed batches, growing the arrays if most of them are still tracked."""
+        held = len(self)
+        size = len(self.ends) * 2 if held > len(self.ends) // 2 else len(self.ends)
+        ends, times = np.zeros(size, dtype=np.int64), np.zeros(size, dtype=np.float64)
+        ends[:held] = self.ends[self.first : self.size]
+        times[:held] = self.times[self.first : self.size]
+        self.ends, self.times = ends, times
+        self.first, self.size = 0, held
@@ -0,0 +1,144 @@
+import asyncio
+import contextlib
+import json
+import os
+import time
+
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from urllib.parse import quote, unquote
+
+import numpy as np
+
+from .buffers import RingBuffer
+from .constants import CHECKPOINT_CHUNK
+
+MANIFEST = "manifest.json"
+# Symbols discarded since the manifest was written, one quoted name per line
+DISCARDED = "discarded.txt"
+CHECKPOINT_DTYPE = np.dtype("<f4")
+
+
+class Checkpointer:
+    """
+    Saves the values held in each symbol's ring buffer to raw little-endian float32 files,
+    and restores them at startup by memory-mapping the files.
+
+    A checkpoint runs in the background, one chunk of `chunk_values` at a time from the
+    newest values back: each chunk is copied out of the buffer in one go, then written to
+    disk in a worker thread while batches keep landing. If batches overwrite values the
+    checkpoint has not reached yet, it stops there and keeps the newer, consistent part.
+    A manifest replaced atomically once every file is fsynced names the latest complete
+    checkpoint, so a crash mid-checkpoint leaves the previous one usable.
+
+    Symbols discarded since then, e.g. evicted, are listed in a file next to the manifest and
+    left out of the restore, until the next checkpoint leaves them out of the manifest.
+    """
+
+    def __init__(self, directory: str, chunk_values: int = CHECKPOINT_CHUNK):
+        self.directory = Path(directory)
+        self.chunk_values = chunk_values
+        self.lock = asyncio.Lock()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.discarded: Set[str] = set()  # Symbols discarded since the last checkpoint
+
+    async def save(
+        self, buffers: Dict[str, RingBuffer], locks: Optional[Dict[str, asyncio.Lock]] = None
+    ) -> None:
+        """
+        Checkpoint the buffers of every symbol, replacing the previous checkpoint. The lock of
+        a symbol in `locks`, if given, is held while each chunk is copied out of its buffer.
+        """
+        async with self.lock:
+            manifest = {}
+            for symbol, buffer in list(buffers.items()):
+                name = f"{quote(symbol, safe='')}.{time.time_ns()}.f32"
+                lock = (locks or {}).get(symbol)
+                base, start, stop = await self._write(buffer, self.directory / name, lock)
+                manifest[symbol] = {"file": name, "base": base, "start": start, "stop": stop}
+            for symbol in self.discarded:
+                manifest.pop(symbol, None)
+
+            path = self.directory / f"{MANIFEST}.tmp"
+            with open(path, "w") as file:
+                json.dump(manifest, file)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(path, self.directory / MANIFEST)
+            (self.directory / DISCARDED).unlink(missing_ok=True)
+            self.discarded.clear()
+
+            # Files of earlier checkpoints are no longer referenced
+            files = {entry["file"] for entry in manifest.values()}
+            for path in self.directory.glob("*.f32"):
+                if path.name not in files:
+                    path.unlink()
+
+    def discard(self, symbol: str) -> None:
+        """
+        Leave a symbol out of the restore, and of the next checkpoint. Its values no longer
+        count, even if it receives more before then.
+        """
+        self.discarded.add(symbol)
+        if (self.directory / MANIFEST).exists():
+            with open(self.directory / DISCARDED, "a") as file:
+                file.write(f"{quote(symbol, safe='')}\n")
+
+    def restore(self) -> Iterator[Tuple[str, List[np.ndarray]]]:
+        """Yield each checkpointed symbol with its values, memory-mapped rather than read."""
+        path = self.directory / MANIFEST
+        if not path.exists():
+            return
+        with open(path) as file:
+            manifest = json.load(file)
+        discarded = set()
+        if (self.directory / DISCARDED).exists():
+            with open(self.directory / DISCARDED) as file:
+                discarded = {unquote(line.rstrip("\n")) for line in file}
+        for symbol, entry in manifest.items():
+            if entry["stop"] > entry["start"] and symbol not in discarded:
+                values = np.memmap(
+                    self.directory / entry["file"],
+                    dtype=CHECKPOINT_DTYPE,
+                    mode="r",
+                    offset=(entry["start"] - entry["base"]) * CHECKPOINT_DTYPE.itemsize,
+                    shape=(entry["stop"] - entry["start"],),
+                )
+                yield symbol, [values]
+
+    async def _write(
+        self, buffer: RingBuffer, path: Path, lock: Optional[asyncio.Lock] = None
+    ) -> Tuple[int, int, int]:
+        """
+        Write the values held in the buffer to `path`, newest chunk first. Returns the absolute
+        position of the first value of the file, and the [start, stop) positions written.
+        """
+        stop = cursor = buffer.count
+        base = stop - len(buffer)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+        try:
+            os.ftruncate(fd, (stop - base) * CHECKPOINT_DTYPE.itemsize)
+            # Values overwritten by batches since the checkpoint started are left out
+            while cursor > max(base, buffer.count - len(buffer)):
+                # Copied without yielding to the event loop, and under the symbol's lock if
+                # batches are applied in worker threads, so no batch can land meanwhile
+                async with lock or contextlib.nullcontext():
+                    start = max(base, buffer.count - len(buffer), cursor - self.chunk_values)
+                    if start >= cursor:
+                        break
+                    chunk = b"".join(buffer.parts(start, cursor))
+                offset = (start - base) * CHECKPOINT_DTYPE.itemsize
+                await asyncio.to_thread(_write_all, fd, chunk, offset)
+                cursor = start
+            await asyncio.to_thread(os.fsync, fd)
+        finally:
+            os.close(fd)
+        return base, cursor, stop
+
+
+def _write_all(fd: int, data: bytes, offset: int) -> None:
+    """Write all of `data` at `offset`, as os.pwrite may write only part of it."""
+    view = memoryview(data)
+    while view:
+        written = os.pwrite(fd, view, offset)
+        view, offset = view[written:], offset + written
@@ -1,6 +1,15 @@
 # Batch limits
 MAX_BATCH_SIZE = 10000
+# Symbols held at once: without a memory budget, new symbols past MAX_SYMBOLS are rejected,
+# as each may hold up to 400 MB. With one, up to MAX_BUDGETED_SYMBOLS are held, and new ones
+# past it evict the least recently used
 MAX_SYMBOLS = 10
+MAX_BUDGETED_SYMBOLS = 10000
+MAX_BULK_BATCHES = 100  # Batches per bulk ingest request
+
+# Element types accepted by the binary ingest endpoint, as little-endian NumPy dtypes
+BINARY_DTYPES = {"float32": "<f4", "float64": "<f8"}
+DEFAULT_BINARY_DTYPE = "float64"
 
 # Window size limits
 MIN_K = 1
@@ -8,3 +17,71 @@ MAX_K = 8
 
 # Window sizes for stats (10^k where k is 1-8)
 WINDOW_SIZES = {k: 10**k for k in range(MIN_K, MAX_K + 1)}
+
+# Streaming ingest: batches applied between two acks, and the most batches a producer may
+# have sent without an ack before it has to wait
+INGEST_ACK_EVERY = 100
+INGEST_MAX_IN_FLIGHT = 1000
+# Binary ingest frames naming their symbol by ID: a zero symbol length, then the ID as a
+# little-endian unsigned integer of this many bytes
+SYMBOL_ID_BYTES = 4
+
+# Ingest queues: batches queued for a symbol without waiting, past which submitters have to
+# wait for their batch to be applied
+INGEST_MAX_QUEUED = 1000
+
+# Ingest executor: enabled by setting a number of worker threads in this environment variable.
+# They apply batches off the event loop, as NumPy releases the GIL in its array kernels
+INGEST_THREADS_ENV = "INGEST_THREADS"
+
+# Write-ahead log: enabled by setting its directory in this environment variable.
+# Segments hold 2^24 values (64 MB); dirty segments are fsynced every interval, and the
+# segments of at most WAL_MAX_OPEN_FILES symbols are kept open at a time
+WAL_DIR_ENV = "WAL_DIR"
+WAL_SEGMENT_VALUES = 2**24
+WAL_FSYNC_INTERVAL = 0.05
+WAL_MAX_OPEN_FILES = 256
+
+# Checkpoints: enabled by setting their directory in this environment variable. Values are
+# copied out of a ring buffer 2^22 (16 MB) at a time, and a checkpoint is taken every interval
+CHECKPOINT_DIR_ENV = "CHECKPOINT_DIR"
+CHECKPOINT_CHUNK = 2**22
+CHECKPOINT_INTERVAL = 60.0
+
+# Sharded mode: Unix socket of each worker process, and how long the router waits for them
+SHARD_SOCKET_NAME = "financial-data-service-shard-{index}.sock"
+SHARD_STARTUP_TIMEOUT = 30.0
+# Response header of ingest requests listing, as a JSON array, the symbols evicted since the
+# previous one, so the router stops counting them towards MAX_SYMBOLS
+EVICTED_HEADER = "X-Evicted-Symbols"
+
+# Shared-memory stats: enabled by naming the segment in this environment variable, which
+# reader workers attach to. Symbols are stored in up to 255 bytes of UTF-8, as in ingest frames
+STATS_SHM_ENV = "STATS_SHM_NAME"
+DEFAULT_STATS_SHM_NAME = "financial-data-service-stats"
+SHARED_SYMBOL_BYTES = 255
+
+# Admin endpoints are only served when a token is set in this environment variable, and
+# must be called with it in the X-Admin-Token header
+ADMIN_TOKEN_ENV = "ADMIN_TOKEN"
+
+# Profiling sessions: longest duration in seconds, and default seconds between two samples
+MAX_PROFILE_SECONDS = 300.0
+DEFAULT_PROFILE_INTERVAL = 0.005
+
+# Default minimum seconds between two stats updates pushed to a subscriber
+DEFAULT_PUSH_INTERVAL = 0.1
+
+# Number of values summarised by each block of the ring buffer index
+BLOCK_SIZE = 1024
+
+# Values the ring buffer of a new symbol has room for. It doubles as values arrive, up to the
+# largest window size, so symbols that trade rarely only hold what they received
+BUFFER_INITIAL_CAPACITY = 1024
+# Batch times the time index of a new symbol has room for, before it grows
+TIME_INDEX_INITIAL_SIZE = 16
+
+# Memory budget, in MiB, of the ring buffers held in memory: past it, the least recently used
+# symbols are spilled to memory-mapped files in the spill directory, or evicted without one
+MEMORY_BUDGET_ENV = "MEMORY_BUDGET_MB"
+SPILL_DIR_ENV = "SPILL_DIR"
@@ -18,13 +18,50 @@ class SymbolNotFoundError(FinancialServiceError):
         super().__init__(f"Symbol {symbol} not found", status_code=404)
 
 
+class EmptyWindowError(FinancialServiceError):
+    def __init__(self, symbol: str, seconds: float):
+        super().__init__(
+            f"No values for symbol {symbol} in the last {seconds} seconds", status_code=404
+        )
+
+
 class MaxSymbolsReachedError(FinancialServiceError):
     def __init__(self, max_symbols: int):
         super().__init__(f"Maximum number of symbols ({max_symbols}) reached", status_code=400)
 
 
+class InvalidBatchError(FinancialServiceError):
+    def __init__(self, reason: str):
+        super().__init__(f"Invalid batch: {reason}", status_code=422)
+
+
+class StatsUnavailableError(FinancialServiceError):
+    def __init__(self, reason: str):
+        super().__init__(f"Stats unavailable: {reason}", status_code=503)
+
+
+class ForbiddenError(FinancialServiceError):
+    def __init__(self, reason: str):
+        super().__init__(f"Forbidden: {reason}", status_code=403)
+
+
+class ProfilerUnavailableError(FinancialServiceError):
+    def __init__(self, reason: str):
+        super().__init__(f"Profiler unavailable: {reason}", status_code=503)
+
+
+class NotShardedError(FinancialServiceError):
+    def __init__(self, reason: str):
+        super().__init__(f"Not available in sharded mode: {reason}", status_code=501)
+
+
 class InvalidWindowSizeError(FinancialServiceError):
     def __init__(self, k: int):
         super().__init__(
             f"Window size exponent (k={k}) must be between {MIN_K} and {MAX_K}", status_code=422
         )
+
+
+class InvalidWindowError(FinancialServiceError):
+    def __init__(self, reason: str):
+        super().__init__(f"Invalid window: {reason}", status_code=422)
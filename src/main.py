@@ -1,13 +1,124 @@
-from fastapi import FastAPI
-from fastapi.responses import JSONResponse
+import asyncio
+import json
+import os
+import secrets
+import time
 
-from src.constants import MAX_K, MIN_K
-from src.exceptions import FinancialServiceError, InvalidWindowSizeError
-from src.models import BatchData, BatchResponse, Stats
-from src.services import SymbolManager
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Annotated, Dict, List, Literal, Optional
 
-app = FastAPI(title="Financial Data Service")
-symbol_manager = SymbolManager()
+from fastapi import FastAPI, Header, Query, Request, WebSocket, status
+from fastapi.responses import JSONResponse, Response
+from pydantic import ValidationError
+
+from src import profiler
+from src.checkpoint import Checkpointer
+from src.constants import (
+    ADMIN_TOKEN_ENV,
+    CHECKPOINT_DIR_ENV,
+    CHECKPOINT_INTERVAL,
+    DEFAULT_BINARY_DTYPE,
+    DEFAULT_PROFILE_INTERVAL,
+    DEFAULT_PUSH_INTERVAL,
+    EVICTED_HEADER,
+    INGEST_ACK_EVERY,
+    INGEST_MAX_IN_FLIGHT,
+    INGEST_THREADS_ENV,
+    MAX_BUDGETED_SYMBOLS,
+    MAX_K,
+    MAX_PROFILE_SECONDS,
+    MAX_SYMBOLS,
+    MEMORY_BUDGET_ENV,
+    MIN_K,
+    SPILL_DIR_ENV,
+    STATS_SHM_ENV,
+    WAL_DIR_ENV,
+    WINDOW_SIZES,
+)
+from src.exceptions import (
+    FinancialServiceError,
+    ForbiddenError,
+    InvalidWindowError,
+    InvalidWindowSizeError,
+    ProfilerUnavailableError,
+)
+from src.metrics import RequestTimer, add_batch_phases, get_stats_latency, render
+from src.models import (
+    BatchData,
+    BatchResponse,
+    BulkBatchData,
+    Stats,
+    SymbolStats,
+    decode_binary_batch,
+    decode_ingest_frame,
+)
+from src.services import SymbolManager, SymbolWindows
+from src.shared import SharedStatsStore
+from src.wal import WriteAheadLog
+
+wal_dir = os.environ.get(WAL_DIR_ENV)
+checkpoint_dir = os.environ.get(CHECKPOINT_DIR_ENV)
+stats_shm_name = os.environ.get(STATS_SHM_ENV)
+ingest_threads = int(os.environ.get(INGEST_THREADS_ENV) or 0)
+memory_budget_mb = os.environ.get(MEMORY_BUDGET_ENV)
+memory_budget = int(float(memory_budget_mb) * 2**20) if memory_budget_mb else None
+max_symbols = MAX_SYMBOLS if memory_budget is None else MAX_BUDGETED_SYMBOLS
+admin_token = os.environ.get(ADMIN_TOKEN_ENV)
+symbol_manager = SymbolManager(
+    wal=WriteAheadLog(wal_dir) if wal_dir else None,
+    checkpointer=Checkpointer(checkpoint_dir) if checkpoint_dir else None,
+    store=SharedStatsStore.create(stats_shm_name, max_symbols) if stats_shm_name else None,
+    executor=(
+        ThreadPoolExecutor(ingest_threads, thread_name_prefix="ingest") if ingest_threads else None
+    ),
+    memory_budget=memory_budget,
+    spill_dir=os.environ.get(SPILL_DIR_ENV),
+    max_symbols=max_symbols,
+)
+
+
+async def checkpoint_periodically() -> None:
+    while True:
+        await asyncio.sleep(CHECKPOINT_INTERVAL)
+        await symbol_manager.checkpoint()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Refill every symbol before serving: from the write-ahead log, which holds every batch,
+    # or else from the latest checkpoint
+    if symbol_manager.wal is not None:
+        await symbol_manager.recover()
+    elif symbol_manager.checkpointer is not None:
+        await symbol_manager.restore()
+    checkpoints = commits = None
+    if symbol_manager.checkpointer is not None:
+        checkpoints = asyncio.create_task(checkpoint_periodically())
+    if symbol_manager.wal is not None:
+        commits = asyncio.create_task(symbol_manager.wal.run())
+
+    yield
+
+    # Apply the batches still queued, then checkpoint once more, so a restart or reload comes
+    # back with full windows
+    await symbol_manager.flush()
+    if checkpoints is not None:
+        checkpoints.cancel()
+        await symbol_manager.checkpoint()
+    if symbol_manager.executor is not None:
+        symbol_manager.executor.shutdown()
+    if commits is not None:
+        commits.cancel()
+        symbol_manager.wal.close()
+    if symbol_manager.store is not None:
+        symbol_manager.store.close()
+
+
+app = FastAPI(title="Financial Data Service", lifespan=lifespan)
+app.add_middleware(RequestTimer)
+# Held while a profiling session runs, so only one runs at a time
+profiling = asyncio.Lock()
 
 
 @app.exception_handler(FinancialServiceError)
@@ -15,14 +126,273 @@ async def financial_service_exception_handler(request, exc: FinancialServiceErro
     return JSONResponse(status_code=exc.status_code, content={"detail": str(exc)})
 
 
+def submitted(batches: str, wait: bool) -> Response:
+    """
+    The response to an ingest request of `batches`, e.g. "batch for symbol: AAPL", encoded
+    here so its serialization is timed.
+    """
+    start_ns = time.perf_counter_ns()
+    if wait:
+        message, status_code = f"Added {batches}", status.HTTP_201_CREATED
+    else:
+        message, status_code = f"Queued {batches}", status.HTTP_202_ACCEPTED
+    body = BatchResponse(status="success", message=message).model_dump_json()
+    response = Response(content=body, status_code=status_code, media_type="application/json")
+    report_evictions(response)
+    add_batch_phases["serialize"].since(start_ns)
+    return response
+
+
+def report_evictions(response: Response) -> None:
+    """
+    List the symbols evicted since the previous ingest response in this one, for the router
+    of the sharded mode, which counts symbols towards MAX_SYMBOLS across shards.
+    """
+    if symbol_manager.evicted:
+        response.headers[EVICTED_HEADER] = json.dumps(list(symbol_manager.evicted))
+        symbol_manager.evicted.clear()
+
+
 @app.post("/add_batch/", response_model=BatchResponse, status_code=201)
-async def add_batch(data: BatchData) -> BatchResponse:
-    await symbol_manager.add_batch(data.symbol, data.values)
-    return BatchResponse(status="success", message=f"Added batch for symbol: {data.symbol}")
+async def add_batch(data: BatchData, request: Request, wait: bool = True) -> Response:
+    """
+    Add a batch. It is queued and applied together with the other batches queued for the
+    symbol meanwhile, and with a write-ahead log, the reply waits for the group commit that
+    makes it durable. With wait=false, return 202 as soon as it is queued.
+    """
+    # The body was read, decoded and validated before the handler was called
+    add_batch_phases["parse"].since(request.scope["received_ns"])
+    await symbol_manager.submit(data.symbol, data.array, wait)
+    if wait:
+        await symbol_manager.synced()
+    return submitted(f"batch for symbol: {data.symbol}", wait)
+
+
+@app.post("/add_batches/", response_model=BatchResponse, status_code=201)
+async def add_batches(data: BulkBatchData, wait: bool = True) -> Response:
+    """
+    Add many batches, for any mix of symbols, in one request. Each symbol's batches are queued
+    behind those already queued for it, and waited for, like a batch sent to /add_batch/.
+    With wait=false, return 202 as soon as they are queued.
+    """
+    await symbol_manager.add_batches(((batch.symbol, batch.array) for batch in data.batches), wait)
+    if wait:
+        await symbol_manager.synced()
+    symbols = ", ".join(dict.fromkeys(batch.symbol for batch in data.batches))
+    return submitted(f"{len(data.batches)} batches for symbols: {symbols}", wait)
+
+
+@app.post("/add_batch/{symbol}", response_model=BatchResponse, status_code=201)
+async def add_binary_batch(
+    symbol: str,
+    request: Request,
+    dtype: str = DEFAULT_BINARY_DTYPE,
+    wait: bool = True,
+) -> Response:
+    """
+    Add a batch sent as a body of raw little-endian float32 or float64 values. It is queued,
+    and waited for, like a batch sent to /add_batch/.
+    """
+    values = decode_binary_batch(await request.body(), dtype)
+    add_batch_phases["parse"].since(request.scope["received_ns"])
+    await symbol_manager.submit(symbol, values, wait)
+    if wait:
+        await symbol_manager.synced()
+    return submitted(f"batch for symbol: {symbol}", wait)
+
+
+@app.get("/stats", response_model=Dict[str, SymbolStats])
+async def get_multi_stats(
+    symbol: Annotated[Optional[List[str]], Query()] = None,
+    k: Annotated[Optional[List[int]], Query()] = None,
+) -> Response:
+    """
+    Stats for every requested symbol (all by default) and window size exponent k (all by
+    default), each symbol read from a single snapshot. Symbols without data are left out.
+    """
+    for window in k or []:
+        if not MIN_K <= window <= MAX_K:
+            raise InvalidWindowSizeError(window)
+    body = await symbol_manager.get_multi_stats_json(symbol, k)
+    return Response(content=body, media_type="application/json")
+
+
+@app.websocket("/ws/ingest")
+async def stream_ingest(websocket: WebSocket) -> None:
+    """
+    Persistent ingest channel for producers streaming batches of many symbols.
+
+    Each message is one batch: a JSON text frame shaped like BatchData, or a binary frame as
+    decoded by decode_ingest_frame. Batches are applied in order, and the number applied so
+    far is acked every INGEST_ACK_EVERY batches, or on a "flush" text frame, once they are
+    durable with a write-ahead log. Rejected batches are reported right away with their
+    position and still count towards the acks.
+
+    The next message is only read once the previous batch is applied, so a producer that
+    outruns the server is held back by the WebSocket's flow control. Producers should also
+    wait for an ack before having more than INGEST_MAX_IN_FLIGHT batches unacked.
+    """
+    await websocket.accept()
+    await websocket.send_json(
+        {"ack_every": INGEST_ACK_EVERY, "max_in_flight": INGEST_MAX_IN_FLIGHT}
+    )
+
+    received = 0
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            break
+        if message.get("text") == "flush":
+            await symbol_manager.synced()
+            await websocket.send_json({"ack": received})
+            continue
+
+        received += 1
+        start_ns = time.perf_counter_ns()
+        try:
+            if message.get("bytes") is not None:
+                symbol, values = decode_ingest_frame(message["bytes"])
+                if isinstance(symbol, int):
+                    symbol = symbol_manager.symbol_name(symbol)
+            else:
+                batch = BatchData.model_validate_json(message["text"])
+                symbol, values = batch.symbol, batch.array
+            add_batch_phases["parse"].since(start_ns)
+            await symbol_manager.submit(symbol, values)
+        except ValidationError as e:
+            await websocket.send_json({"error": e.errors()[0]["msg"], "batch": received})
+        except FinancialServiceError as e:
+            await websocket.send_json({"error": str(e), "batch": received})
+
+        if received % INGEST_ACK_EVERY == 0:
+            await symbol_manager.synced()
+            await websocket.send_json({"ack": received})
+
+
+@app.websocket("/ws/stats")
+async def stream_stats(
+    websocket: WebSocket,
+    symbol: Annotated[Optional[List[str]], Query()] = None,
+    k: Annotated[Optional[List[int]], Query()] = None,
+    interval: float = DEFAULT_PUSH_INTERVAL,
+) -> None:
+    """
+    Push the stats of the subscribed symbols (all by default) and window sizes (all by
+    default) whenever a batch changes them, in the format of GET /stats, at most once per
+    `interval` seconds.
+    """
+    invalid = [window for window in k or [] if not MIN_K <= window <= MAX_K]
+    if invalid:
+        await websocket.close(
+            code=status.WS_1008_POLICY_VIOLATION, reason=str(InvalidWindowSizeError(invalid[0]))
+        )
+        return
+    if interval < 0:
+        await websocket.close(
+            code=status.WS_1008_POLICY_VIOLATION, reason="interval cannot be negative"
+        )
+        return
+
+    async def push_updates() -> None:
+        async for body in symbol_manager.stats_updates(symbol, k, interval):
+            await websocket.send_text(body.decode())
+
+    await websocket.accept()
+    pusher = asyncio.create_task(push_updates())
+    try:
+        # Clients only listen, so wait for the disconnect to stop pushing as soon as it happens
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+    finally:
+        pusher.cancel()
 
 
 @app.get("/stats/{symbol}/{k}", response_model=Stats)
-async def get_stats(symbol: str, k: int) -> Stats:
+async def get_stats(symbol: str, k: int, request: Request) -> Response:
     if not MIN_K <= k <= MAX_K:
         raise InvalidWindowSizeError(k)
-    return await symbol_manager.get_stats(symbol, k)
+    # Served from the JSON cached in the symbol's snapshot, bypassing response_model encoding
+    body = await symbol_manager.get_stats_json(symbol, k)
+    get_stats_latency.since(request.scope["received_ns"])
+    return Response(content=body, media_type="application/json")
+
+
+@app.get("/symbols", response_model=Dict[str, int])
+async def get_symbol_ids() -> Dict[str, int]:
+    """The ID of every symbol holding data, for the ID-based endpoints and ingest frames."""
+    return symbol_manager.symbol_ids()
+
+
+@app.get("/stats/by-id/{symbol_id}/{k}", response_model=Stats)
+async def get_stats_by_id(symbol_id: int, k: int, request: Request) -> Response:
+    if not MIN_K <= k <= MAX_K:
+        raise InvalidWindowSizeError(k)
+    body = await symbol_manager.get_stats_json_by_id(symbol_id, k)
+    get_stats_latency.since(request.scope["received_ns"])
+    return Response(content=body, media_type="application/json")
+
+
+@app.get("/stats/{symbol}", response_model=Stats)
+async def get_window_stats(
+    symbol: str, last: Optional[int] = None, seconds: Optional[float] = None
+) -> Stats:
+    """Stats for the last N values (`last`) or for the last S seconds (`seconds`)."""
+    if (last is None) == (seconds is None):
+        raise InvalidWindowError("exactly one of last or seconds is required")
+    if last is not None and not 1 <= last <= WINDOW_SIZES[MAX_K]:
+        raise InvalidWindowError(f"last must be between 1 and {WINDOW_SIZES[MAX_K]}")
+    if seconds is not None and not seconds > 0:
+        raise InvalidWindowError("seconds must be positive")
+    return await symbol_manager.get_window_stats(symbol, last=last, seconds=seconds)
+
+
+@app.get("/metrics")
+async def get_metrics() -> Response:
+    """Latency histograms and per-symbol counters, in the Prometheus text format."""
+    return Response(content=render(symbol_manager), media_type="text/plain; version=0.0.4")
+
+
+def check_admin(token: Optional[str]) -> None:
+    if not admin_token:
+        raise ForbiddenError(f"admin endpoints are disabled, set {ADMIN_TOKEN_ENV} to enable them")
+    if token is None or not secrets.compare_digest(token.encode(), admin_token.encode()):
+        raise ForbiddenError("invalid admin token")
+
+
+@app.post("/admin/profile")
+async def profile(
+    x_admin_token: Annotated[Optional[str], Header()] = None,
+    seconds: Annotated[float, Query(gt=0, le=MAX_PROFILE_SECONDS)] = 10.0,
+    output: Annotated[Literal["collapsed", "prof", "lines"], Query(alias="format")] = "collapsed",
+    interval: Annotated[float, Query(gt=0, le=1)] = DEFAULT_PROFILE_INTERVAL,
+) -> Response:
+    """
+    Profile the running service for `seconds` while it keeps serving, and return the result:
+    collapsed stacks for a flame graph, a .prof file for snakeviz, or (with line_profiler
+    installed) line timings of SymbolManager.add_batch and SymbolWindows.add_many.
+    """
+    check_admin(x_admin_token)
+    if profiling.locked():
+        raise ProfilerUnavailableError("a profiling session is already running")
+    if output == "lines" and profiler.line_profiler is None:
+        raise ProfilerUnavailableError("line_profiler is not installed")
+
+    async with profiling:
+        if output == "lines":
+            session = profiler.LineTimer(SymbolManager.add_batch, SymbolWindows.add_many)
+        else:
+            session = profiler.SamplingProfiler(interval)
+        session.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            session.stop()
+
+    if output == "prof":
+        return Response(
+            content=session.pstats(),
+            media_type="application/octet-stream",
+            headers={"Content-Disposition": 'attachment; filename="profile.prof"'},
+        )
+    body = session.report() if output == "lines" else session.collapsed()
+    return Response(content=body, media_type="text/plain")
@@ -0,0 +1,143 @@
+import threading
+import time
+
+from typing import Iterator, List
+
+from .constants import WINDOW_SIZES
+
+# Durations are bucketed two buckets per power of two of nanoseconds, from 2^10 ns (~1 us)
+# to 2^35 ns (~34 s), so every bucket is at most 50% wider than its lower bound
+MIN_EXPONENT = 10
+MAX_EXPONENT = 35
+BUCKET_BOUNDS = [2**MIN_EXPONENT] + [
+    bound for e in range(MIN_EXPONENT, MAX_EXPONENT) for bound in (3 * 2 ** (e - 1), 2 ** (e + 1))
+]
+BUCKETS = len(BUCKET_BOUNDS) + 1  # The last one holds everything slower
+
+
+def bucket(ns: int) -> int:
+    """Index of the bucket of a duration in nanoseconds."""
+    e = ns.bit_length() - 1
+    if e < MIN_EXPONENT:
+        return 0
+    if e >= MAX_EXPONENT:
+        return BUCKETS - 1
+    return 1 + 2 * (e - MIN_EXPONENT) + ((ns >> (e - 1)) & 1)
+
+
+class LatencyHistogram:
+    """
+    Log-linear histogram of durations, in the style of an HDR histogram: recording one is a
+    few integer operations and a list increment.
+
+    Each thread records into its own list of counts, so batches applied in worker threads
+    never contend with the event loop. The lists are only summed when metrics are scraped.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._counts: List[List[int]] = []  # Per thread: count per bucket, then the sum
+
+    def record(self, ns: int) -> None:
+        counts = getattr(self._local, "counts", None)
+        if counts is None:
+            counts = self._local.counts = [0] * (BUCKETS + 1)
+            with self._lock:
+                self._counts.append(counts)
+        counts[bucket(ns)] += 1
+        counts[-1] += ns
+
+    def since(self, start_ns: int) -> None:
+        """Record the time elapsed since `start_ns`, a time.perf_counter_ns() reading."""
+        self.record(time.perf_counter_ns() - start_ns)
+
+    def snapshot(self) -> List[int]:
+        """Counts per bucket, then the sum in nanoseconds, over every thread."""
+        with self._lock:
+            per_thread = list(self._counts)
+        return [sum(column) for column in zip(*per_thread, strict=True)] or [0] * (BUCKETS + 1)
+
+
+# Phases of adding a batch: parsing the request (from when it reaches the app, so reading
+# the body is included), waiting for the symbol's lock, logging it to the write-ahead log,
+# updating the buffer and publishing the snapshot, and serializing the response
+ADD_BATCH_PHASES = ("parse", "lock_wait", "wal", "update", "serialize")
+add_batch_phases = {phase: LatencyHistogram() for phase in ADD_BATCH_PHASES}
+# GET /stats/{symbol}/{k}, from when the request reaches the app until its body is ready
+get_stats_latency = LatencyHistogram()
+
+
+class RequestTimer:
+    """ASGI middleware noting when each request reached the app, as scope["received_ns"]."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        scope["received_ns"] = time.perf_counter_ns()
+        await self.app(scope, receive, send)
+
+
+def render(symbol_manager) -> str:
+    """All metrics in the Prometheus text exposition format."""
+    return "".join(_render(symbol_manager))
+
+
+def _render(symbol_manager) -> Iterator[str]:
+    yield "# HELP fds_add_batch_phase_seconds Time spent in each phase of adding a batch\n"
+    yield "# TYPE fds_add_batch_phase_seconds histogram\n"
+    for phase, histogram in add_batch_phases.items():
+        yield from _histogram("fds_add_batch_phase_seconds", f'phase="{phase}"', histogram)
+
+    yield "# HELP fds_get_stats_seconds Time to serve GET /stats/{symbol}/{k}\n"
+    yield "# TYPE fds_get_stats_seconds histogram\n"
+    yield from _histogram("fds_get_stats_seconds", "", get_stats_latency)
+
+    # Per-symbol figures are read from the manager's state, at no cost to ingest
+    symbols = dict(symbol_manager.symbols)
+    labels = {symbol: f'symbol="{_escape(symbol)}"' for symbol in symbols}
+    yield "# HELP fds_batches_total Batches received per symbol\n"
+    yield "# TYPE fds_batches_total counter\n"
+    for state in list(symbol_manager.registry):
+        if state.batches:
+            yield f'fds_batches_total{{symbol="{_escape(state.name)}"}} {state.batches}\n'
+    yield "# HELP fds_updates_total Updates applied per symbol, each of one or more batches\n"
+    yield "# TYPE fds_updates_total counter\n"
+    for symbol, windows in symbols.items():
+        yield f"fds_updates_total{{{labels[symbol]}}} {windows.snapshot.version}\n"
+    yield "# HELP fds_trades_total Values ingested per symbol\n"
+    yield "# TYPE fds_trades_total counter\n"
+    for symbol, windows in symbols.items():
+        yield f"fds_trades_total{{{labels[symbol]}}} {windows.buffer.count}\n"
+    yield "# HELP fds_resident_bytes Memory held by the symbols' buffers not spilled\n"
+    yield "# TYPE fds_resident_bytes gauge\n"
+    yield f"fds_resident_bytes {symbol_manager.resident_bytes}\n"
+    yield "# HELP fds_spilled_symbols Symbols whose buffer is spilled to a memory-mapped file\n"
+    yield "# TYPE fds_spilled_symbols gauge\n"
+    yield f"fds_spilled_symbols {len(symbols) - len(symbol_manager.resident)}\n"
+    yield "# HELP fds_window_fill_ratio Fraction of each window size holding values\n"
+    yield "# TYPE fds_window_fill_ratio gauge\n"
+    for symbol, windows in symbols.items():
+        held = len(windows.buffer)
+        for k, size in WINDOW_SIZES.items():
+            ratio = min(held, size) / size
+            yield f'fds_window_fill_ratio{{{labels[symbol]},k="{k}"}} {ratio:g}\n'
+
+
+def _histogram(name: str, labels: str, histogram: LatencyHistogram) -> Iterator[str]:
+    counts = histogram.snapshot()
+    prefix = f"{labels}," if labels else ""
+    cumulative = 0
+    for bound, count in zip(BUCKET_BOUNDS, counts, strict=False):
+        cumulative += count
+        yield f'{name}_bucket{{{prefix}le="{bound / 1e9:g}"}} {cumulative}\n'
+    cumulative += counts[BUCKETS - 1]
+    yield f'{name}_bucket{{{prefix}le="+Inf"}} {cumulative}\n'
+    suffix = f"{{{labels}}}" if labels else ""
+    yield f"{name}_sum{suffix} {counts[-1] / 1e9}\n"
+    yield f"{name}_count{suffix} {cumulative}\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -1,9 +1,18 @@
-from math import isfinite
-from typing import List
+from typing import Dict, List, Tuple, Union
 
-from pydantic import BaseModel, field_validator
+import numpy as np
 
-from .constants import MAX_BATCH_SIZE
+from pydantic import BaseModel, PrivateAttr, ValidationError, field_validator, model_validator
+from pydantic_core import InitErrorDetails, PydanticCustomError
+
+from .constants import (
+    BINARY_DTYPES,
+    DEFAULT_BINARY_DTYPE,
+    MAX_BATCH_SIZE,
+    MAX_BULK_BATCHES,
+    SYMBOL_ID_BYTES,
+)
+from .exceptions import InvalidBatchError
 
 
 class Stats(BaseModel):
@@ -15,6 +24,21 @@ class Stats(BaseModel):
     values: int
 
 
+class SymbolStats(BaseModel):
+    """
+    Stats of several window sizes of one symbol, all from the same published snapshot.
+
+    Attributes:
+        version (int): Number of batches applied when the snapshot was published
+        count (int): Number of values ever added when the snapshot was published
+        stats (Dict[int, Stats]): Stats per window size exponent k
+    """
+
+    version: int
+    count: int
+    stats: Dict[int, Stats]
+
+
 class BatchResponse(BaseModel):
     status: str
     message: str
@@ -31,10 +55,16 @@ class BatchData(BaseModel):
     Attributes:
         symbol (str): Stock market symbol identifier
         values (List[float]): List of trading values
+        array (np.ndarray): The values as a float32 array, ready for ingest
     """
 
     symbol: str
     values: List[float]
+    _array: np.ndarray = PrivateAttr()
+
+    @property
+    def array(self) -> np.ndarray:
+        return self._array
 
     @field_validator("symbol")
     @classmethod
@@ -50,16 +80,107 @@ class BatchData(BaseModel):
     @classmethod
     def validate_values(cls, values: List[float]) -> List[float]:
         """
-        Validate list of trading values.
+        Validate list of trading values. Pydantic has already coerced every element to a float.
         """
-        if not isinstance(values, list):
-            raise ValueError("Values must be a list")
         if not values:
             raise ValueError("Values cannot be empty")
         if len(values) > MAX_BATCH_SIZE:
             raise ValueError(f"Batch size cannot exceed {MAX_BATCH_SIZE} values")
-        if not all(isinstance(value, (int, float)) for value in values):
-            raise ValueError("All values must be numbers")
-        if not all(isfinite(float(value)) for value in values):
-            raise ValueError("All values must be finite numbers")
         return values
+
+    @model_validator(mode="after")
+    def validate_finite_values(self) -> "BatchData":
+        """
+        Convert the values to an array once, check them all at once, and keep the array for
+        ingest so the list is not converted again downstream.
+        """
+        # Values are stored as float32, so they are checked after the cast: values out of its
+        # range become infinite, and would poison every window they land in
+        with np.errstate(over="ignore"):
+            array = np.asarray(self.values, dtype=np.float64).astype(np.float32)
+        if not np.isfinite(array).all():
+            error = PydanticCustomError("finite_number", "All values must be finite numbers")
+            raise ValidationError.from_exception_data(
+                type(self).__name__,
+                [InitErrorDetails(type=error, loc=("values",), input=self.values)],
+            )
+        self._array = array
+        return self
+
+
+class BulkBatchData(BaseModel):
+    """
+    Model for bulk input of many batches, for any mix of symbols, in one request.
+
+    Attributes:
+        batches (List[BatchData]): Batches in the order they should be applied
+    """
+
+    batches: List[BatchData]
+
+    @field_validator("batches")
+    @classmethod
+    def validate_batches(cls, batches: List[BatchData]) -> List[BatchData]:
+        """
+        Validate the number of batches.
+        """
+        if not batches:
+            raise ValueError("Batches cannot be empty")
+        if len(batches) > MAX_BULK_BATCHES:
+            raise ValueError(f"Bulk size cannot exceed {MAX_BULK_BATCHES} batches")
+        return batches
+
+
+def decode_binary_batch(body: bytes, dtype: str) -> np.ndarray:
+    """
+    Decode a binary batch of raw little-endian floats, then validate it with vectorized
+    checks, mirroring the rules of BatchData. float32 bodies are decoded without copying;
+    float64 ones are cast to the float32 values stored, and checked after the cast.
+
+    Raises:
+        InvalidBatchError: if the body is not a valid batch of the given dtype
+    """
+    if dtype not in BINARY_DTYPES:
+        raise InvalidBatchError(f"dtype must be one of {', '.join(BINARY_DTYPES)}")
+    itemsize = np.dtype(BINARY_DTYPES[dtype]).itemsize
+    if len(body) % itemsize:
+        raise InvalidBatchError(f"body length must be a multiple of {itemsize} bytes")
+
+    values = np.frombuffer(body, dtype=BINARY_DTYPES[dtype])
+    if not len(values):
+        raise InvalidBatchError("values cannot be empty")
+    if len(values) > MAX_BATCH_SIZE:
+        raise InvalidBatchError(f"batch size cannot exceed {MAX_BATCH_SIZE} values")
+    with np.errstate(over="ignore"):
+        values = values.astype(np.float32, copy=False)
+    if not np.isfinite(values).all():
+        raise InvalidBatchError("all values must be finite numbers")
+    return values
+
+
+def decode_ingest_frame(frame: bytes) -> Tuple[Union[str, int], np.ndarray]:
+    """
+    Decode a binary frame of the streaming ingest channel: one byte holding the length of the
+    symbol, the UTF-8 symbol, then the values as raw little-endian float64.
+    A zero length byte is followed by the symbol's ID instead, in SYMBOL_ID_BYTES bytes
+    little-endian, which is returned as an int.
+
+    Raises:
+        InvalidBatchError: if the frame is not a valid batch
+    """
+    if not frame:
+        raise InvalidBatchError("symbol cannot be empty")
+    if not frame[0]:
+        end = 1 + SYMBOL_ID_BYTES
+        if len(frame) < end:
+            raise InvalidBatchError("frame is shorter than its symbol ID")
+        symbol_id = int.from_bytes(frame[1:end], "little")
+        return symbol_id, decode_binary_batch(memoryview(frame)[end:], DEFAULT_BINARY_DTYPE)
+    end = 1 + frame[0]
+    if len(frame) < end:
+        raise InvalidBatchError("frame is shorter than its symbol")
+    try:
+        symbol = frame[1:end].decode()
+    except UnicodeDecodeError as e:
+        raise InvalidBatchError("symbol must be UTF-8") from e
+    return symbol, decode_binary_batch(memoryview(frame)[end:], DEFAULT_BINARY_DTYPE)
@@ -0,0 +1,36 @@
+from typing import Tuple
+
+import numpy as np
+
+# (count, sum, M2) of a set of values, where M2 is the sum of squared deviations from the mean
+Moments = Tuple[int, float, float]
+EMPTY_MOMENTS: Moments = (0, 0.0, 0.0)
+
+
+def moments(values: np.ndarray) -> Moments:
+    """Reduce values to their count, sum and sum of squared deviations, in float64."""
+    n = len(values)
+    if n == 0:
+        return EMPTY_MOMENTS
+    total = float(values.sum(dtype=np.float64))
+    deviations = np.subtract(values, total / n, dtype=np.float64)
+    return n, total, float(deviations @ deviations)
+
+
+def merge_moments(a: Moments, b: Moments) -> Moments:
+    """Moments of the union of two disjoint sets (Chan et al. pairwise update)."""
+    n = a[0] + b[0]
+    if a[0] == 0 or b[0] == 0:
+        return a if b[0] == 0 else b
+    delta = b[1] / b[0] - a[1] / a[0]
+    return n, a[1] + b[1], a[2] + b[2] + delta * delta * a[0] * b[0] / n
+
+
+def combine_moments(counts: np.ndarray, sums: np.ndarray, m2s: np.ndarray) -> Moments:
+    """Moments of the union of many disjoint sets given as arrays of their moments."""
+    n = counts.sum()
+    if n == 0:
+        return EMPTY_MOMENTS
+    total = sums.sum()
+    deviations = sums / counts - total / n
+    return int(n), float(total), float(m2s.sum() + (counts * np.square(deviations)).sum())
@@ -0,0 +1,135 @@
+import io
+import marshal
+import os
+import sys
+import threading
+
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    import line_profiler
+except ImportError:  # Optional: only needed for line-level timing
+    line_profiler = None
+
+# A function as pstats identifies it: file, first line and name
+Function = Tuple[str, int, str]
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler for the running process: a background thread wakes up every
+    `interval` seconds and records the call stack of every other thread.
+
+    The profiled code is never instrumented, so it runs at full speed between samples, and the
+    cost is one stack walk per thread per sample. That makes it safe to run under production
+    load, unlike cProfile, which traces every call.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks: Counter[Tuple[str, Tuple[Function, ...]]] = Counter()  # Root first
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                    frame = frame.f_back
+                thread = names.get(thread_id, str(thread_id))
+                self.stacks[thread, tuple(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        """
+        The samples in the collapsed stack format read by flamegraph.pl, speedscope and most
+        flame graph viewers: one line per distinct stack, root first, then its sample count.
+        The root of each stack is the name of its thread.
+        """
+        lines = []
+        for (thread, stack), count in sorted(self.stacks.items()):
+            frames = [thread] + [_label(function) for function in stack]
+            lines.append(f"{';'.join(frame.replace(';', ':') for frame in frames)} {count}\n")
+        return "".join(lines)
+
+    def pstats(self) -> bytes:
+        """
+        The samples as a marshalled pstats file (.prof), for snakeviz or pstats.Stats.
+
+        Times are estimated as samples times the interval. Sampling cannot count calls, so
+        each function's call count is the number of samples it was on the stack for.
+        """
+        # Per function: calls, primitive calls, own time, cumulative time, and the same
+        # figures per caller
+        stats: Dict[Function, List] = {}
+        for (_, stack), count in self.stacks.items():
+            elapsed = count * self.interval
+            seen = set()
+            for depth, function in enumerate(stack):
+                entry = stats.setdefault(function, [0, 0, 0.0, 0.0, {}])
+                # A recursive function is counted once per sample
+                if function not in seen:
+                    seen.add(function)
+                    entry[0] += count
+                    entry[1] += count
+                    entry[3] += elapsed
+                if depth:
+                    edge = entry[4].setdefault(stack[depth - 1], [0, 0, 0.0, 0.0])
+                    edge[0] += count
+                    edge[1] += count
+                    edge[3] += elapsed
+            stats[stack[-1]][2] += elapsed
+            callers = stats[stack[-1]][4]
+            if len(stack) > 1:
+                callers[stack[-2]][2] += elapsed
+
+        return marshal.dumps(
+            {
+                function: (*entry[:4], {caller: tuple(edge) for caller, edge in entry[4].items()})
+                for function, entry in stats.items()
+            }
+        )
+
+
+class LineTimer:
+    """
+    Line-level timing of a few functions with line_profiler, which traces every line they
+    run. Only calls made on the thread that started the timer are timed.
+    """
+
+    def __init__(self, *functions: Callable):
+        if line_profiler is None:
+            raise RuntimeError("line_profiler is not installed")
+        self.profiler = line_profiler.LineProfiler(*functions)
+
+    def start(self) -> None:
+        self.profiler.enable_by_count()
+
+    def stop(self) -> None:
+        self.profiler.disable_by_count()
+
+    def report(self) -> str:
+        stream = io.StringIO()
+        self.profiler.print_stats(stream=stream, stripzeros=True)
+        return stream.getvalue()
+
+
+def _label(function: Function) -> str:
+    filename, lineno, name = function
+    return f"{name} ({os.path.basename(filename)}:{lineno})"
@@ -0,0 +1,93 @@
+import asyncio
+import sys
+
+from collections import deque
+from typing import TYPE_CHECKING, Deque, Dict, Iterator, List, Optional
+
+from .constants import MAX_SYMBOLS, SYMBOL_ID_BYTES
+from .exceptions import MaxSymbolsReachedError
+
+if TYPE_CHECKING:
+    from .services import SymbolWindows
+
+
+class SymbolState:
+    """Everything the manager keeps for one symbol, so a request finds it with one lookup."""
+
+    __slots__ = ("batches", "id", "lock", "name", "windows")
+
+    def __init__(self, symbol_id: int, name: str):
+        self.id = symbol_id
+        self.name = name
+        self.lock = asyncio.Lock()  # Held while a batch is applied, or the buffer is read
+        self.windows: Optional[SymbolWindows] = None  # None until it holds data
+        self.batches = 0  # Batches received, queued or not
+
+
+class SymbolRegistry:
+    """
+    Symbols admitted by the manager, each with an integer ID. The state of a symbol is found
+    by name with one dict lookup, or by ID with a list index.
+
+    An ID is a slot in the list of states, in its low bits, and the generation of that slot
+    in its high bits. Removed symbols leave a tombstone, and their slot goes to a later
+    symbol with the next generation, so the registry holds no more states than symbols
+    registered at once, and IDs held by clients for a removed symbol stop matching rather
+    than naming another one. Slots are reused oldest tombstone first, so a stale ID only
+    matches again once its slot went through every generation.
+
+    Only admitted symbols are registered, so looking up unknown ones leaves nothing behind.
+    """
+
+    def __init__(self, capacity: int = MAX_SYMBOLS):
+        # Room for twice the symbols the manager holds, for those without data yet
+        self.slot_bits = (2 * capacity - 1).bit_length()
+        self.slot_mask = (1 << self.slot_bits) - 1
+        self.generation_mask = (1 << (8 * SYMBOL_ID_BYTES - self.slot_bits)) - 1
+        self.ids: Dict[str, int] = {}
+        self.states: List[Optional[SymbolState]] = []  # None for removed symbols
+        self.free: Deque[int] = deque()  # Next ID of each removed symbol's slot
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __iter__(self) -> Iterator[SymbolState]:
+        return (state for state in self.states if state is not None)
+
+    def get(self, symbol: str) -> Optional[SymbolState]:
+        symbol_id = self.ids.get(symbol)
+        return None if symbol_id is None else self.states[symbol_id & self.slot_mask]
+
+    def by_id(self, symbol_id: int) -> Optional[SymbolState]:
+        slot = symbol_id & self.slot_mask
+        state = self.states[slot] if 0 <= symbol_id and slot < len(self.states) else None
+        return state if state is not None and state.id == symbol_id else None
+
+    def register(self, symbol: str) -> SymbolState:
+        """
+        Return the state of a symbol, registering it in a free slot if it is new.
+
+        Raises MaxSymbolsReachedError if every slot is taken
+        """
+        state = self.get(symbol)
+        if state is None:
+            if self.free:
+                symbol_id = self.free.popleft()
+            elif len(self.states) <= self.slot_mask:
+                symbol_id = len(self.states)
+                self.states.append(None)
+            else:
+                raise MaxSymbolsReachedError(len(self.states))
+            symbol = sys.intern(symbol)
+            state = self.states[symbol_id & self.slot_mask] = SymbolState(symbol_id, symbol)
+            self.ids[symbol] = symbol_id
+        return state
+
+    def remove(self, symbol: str) -> None:
+        """Forget a symbol, if registered. Its ID no longer matches, and its slot is reused."""
+        symbol_id = self.ids.pop(symbol, None)
+        if symbol_id is not None:
+            slot = symbol_id & self.slot_mask
+            self.states[slot] = None
+            generation = ((symbol_id >> self.slot_bits) + 1) & self.generation_mask
+            self.free.append(generation << self.slot_bits | slot)
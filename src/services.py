@@ -1,157 +1,860 @@
 import asyncio
+import json
 import logging
+import time
 
-from collections import deque
-from typing import Dict, List, Optional
+from concurrent.futures import Executor
+from pathlib import Path
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Set, Tuple, Union
+from urllib.parse import quote
 
 import numpy as np
 
-from .constants import MAX_K, MAX_SYMBOLS, MIN_K, WINDOW_SIZES
-from .exceptions import MaxSymbolsReachedError, SymbolNotFoundError
+from .buffers import RingBuffer, TimeIndex
+from .checkpoint import Checkpointer
+from .constants import (
+    BUFFER_INITIAL_CAPACITY,
+    DEFAULT_PUSH_INTERVAL,
+    INGEST_MAX_QUEUED,
+    MAX_BUDGETED_SYMBOLS,
+    MAX_K,
+    MAX_SYMBOLS,
+    TIME_INDEX_INITIAL_SIZE,
+    WINDOW_SIZES,
+)
+from .exceptions import (
+    EmptyWindowError,
+    InvalidBatchError,
+    MaxSymbolsReachedError,
+    SymbolNotFoundError,
+)
+from .metrics import add_batch_phases
 from .models import Stats
+from .moments import Moments, merge_moments
+from .registry import SymbolRegistry, SymbolState
+from .shared import SharedStatsStore
+from .wal import WriteAheadLog
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-class RunningStats:
+class StatsSnapshot:
     """
-    Maintains running statistics for a fixed-size window of values, per symbol (x10).
-    Uses a deque for O(1) operations and pre-calculated stats.
+    Immutable stats of every window size of a symbol as of one batch, published by the writer
+    so readers never have to take the symbol's lock or touch the buffer.
+    The Stats models and their JSON encoding are only built on first read, then reused by
+    every later read of the same snapshot.
     """
 
-    def __init__(self, window_size: int):
-        """
-        Initialize RunningStats with a fixed window size.
-        """
-        self.window_size = window_size
-        self.values = deque(maxlen=window_size)
-        self.current_min = np.float32(float("inf"))
-        self.current_max = np.float32(float("-inf"))
-        self.sum = np.float32(0.0)
-        self.avg = np.float32(0.0)
-        self.M2 = np.float32(0.0)
-
-    def add(self, value: float) -> None:
-        """Add a value to the running stats."""
-        value = np.float32(value)
-
-        if len(self.values) == self.window_size:
-            old = self.values.popleft()
-            self.sum = self.sum - old
-
-            # Update for sliding window
-            n = self.window_size
-            old_avg = self.avg
-            self.avg = self.avg + (value - old) / n
-
-            # Update M2 by removing old value's contribution and adding new value's
-            self.M2 = (
-                self.M2
-                - (old - old_avg) * (old - self.avg)
-                + (value - old_avg) * (value - self.avg)
-            )
+    __slots__ = ("_fields", "_json", "_stats", "count", "version")
+
+    def __init__(self, version: int, count: int, fields: Dict[int, Dict[str, float]]):
+        self.version = version  # Number of batches applied
+        self.count = count  # Number of values ever added
+        self._fields = fields
+        self._stats: Dict[int, Stats] = {}
+        self._json: Dict[int, bytes] = {}
+
+    @property
+    def fields(self) -> Dict[int, Dict[str, float]]:
+        """The Stats fields per window size with data. Must not be modified."""
+        return self._fields
+
+    def get(self, k: int) -> Optional[Stats]:
+        stats = self._stats.get(k)
+        if stats is None and k in self._fields:
+            # Every field was computed by the writer already, so pydantic validation is skipped
+            stats = self._stats[k] = Stats.model_construct(**self._fields[k])
+        return stats
+
+    def json(self, k: int) -> Optional[bytes]:
+        """The Stats for 10^k values encoded as a JSON response body."""
+        body = self._json.get(k)
+        if body is None and k in self._fields:
+            # The fields are plain floats and ints in Stats field order
+            body = self._json[k] = json.dumps(self._fields[k], separators=(",", ":")).encode()
+        return body
+
+    def symbol_json(self, ks: Iterable[int]) -> bytes:
+        """The SymbolStats of the window sizes in `ks` with data, encoded as JSON."""
+        stats = b",".join(b'"%d":%s' % (k, self.json(k)) for k in ks if k in self._fields)
+        return b'{"version":%d,"count":%d,"stats":{%s}}' % (self.version, self.count, stats)
+
+
+def encode_multi_stats(
+    snapshots: Iterable[Tuple[str, Optional[StatsSnapshot]]], ks: Iterable[int]
+) -> bytes:
+    """
+    Encode the snapshots of several symbols as a JSON object of SymbolStats keyed by symbol,
+    leaving out symbols without data.
+    """
+    ks = list(ks)
+    parts = [
+        b"%s:%s" % (json.dumps(symbol).encode(), snapshot.symbol_json(ks))
+        for symbol, snapshot in snapshots
+        if snapshot is not None and snapshot.count
+    ]
+    return b"{%s}" % b",".join(parts)
 
-            # Update min and max if we just removed a value that was min or max
-            if old == self.current_min or old == self.current_max:
-                self.current_min = min(self.values)
-                self.current_max = max(self.values)
-        else:
-            # Welford's update for growing window
-            n = len(self.values)
-            delta = value - self.avg
-            self.avg = self.avg + delta / (n + 1)
-            self.M2 = self.M2 + delta * (value - self.avg)
 
-        self.current_min = min(self.current_min, value)
-        self.current_max = max(self.current_max, value)
-        self.sum = self.sum + value
-        self.values.append(value)
+class SymbolWindows:
+    """
+    Storage engine for a single symbol: one ring buffer of the largest window size with a
+    block summary index over it. Stats for any window length ending at the newest value are
+    combined from O(log n) block summaries plus the partial blocks at the edges, so ingest
+    cost does not depend on how many window sizes are served.
+    The buffer starts small and grows as values arrive, so symbols that trade rarely never
+    reserve the largest window. The time each batch arrived is also recorded, for time-based
+    windows.
+
+    After every batch, the stats of each size in WINDOW_SIZES are published as a new
+    StatsSnapshot, swapped in with a single reference assignment.
+    """
 
-    def get_stats(self) -> Optional[Stats]:
+    def __init__(self, capacity: int = WINDOW_SIZES[MAX_K]):
+        self.buffer = RingBuffer(capacity, initial_capacity=BUFFER_INITIAL_CAPACITY)
+        self.times = TimeIndex(TIME_INDEX_INITIAL_SIZE)
+        self.snapshot = StatsSnapshot(version=0, count=0, fields={})
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the buffer, unless spilled, and by the indexes."""
+        return self.buffer.nbytes + self.times.nbytes
+
+    def add_many(self, values: np.ndarray, timestamp: Optional[float] = None) -> None:
+        self.buffer.extend(np.asarray(values, dtype=np.float32))
+        self.times.record(self.buffer.count, time.time() if timestamp is None else timestamp)
+        self.times.trim(self.buffer.count - self.buffer.capacity)
+        self.publish()
+
+    def load(self, parts: Iterable[np.ndarray]) -> None:
+        """Bulk-load consecutive arrays of values, publishing a snapshot once at the end."""
+        for part in parts:
+            self.buffer.extend(part)
+        self.times.record(self.buffer.count, time.time())
+        self.times.trim(self.buffer.count - self.buffer.capacity)
+        self.publish()
+
+    def publish(self) -> None:
         """
-        Calculate statistics in O(1) time using running sums.
+        Publish the stats of every window size as of the newest value.
+
+        Windows within one block are answered straight from a view of the newest values, all
+        at once, by running sums, minimums and maximums from the newest value back. Larger
+        windows are nested, so each one is the previous window plus the older range it adds:
+        only that range is summarized from the block index and merged in, so every value is
+        gathered once rather than once per window. Windows holding the same values share
+        their fields.
         """
-        if not self.values:
-            logger.warning("Attempted to get stats with no values")
+        buffer = self.buffer
+        count, held = buffer.count, len(buffer)
+        fields: Dict[int, Dict[str, float]] = {}
+        if held:
+            newest = buffer.last(min(held, buffer.block_size))[::-1]
+            last = float(newest[0])
+            # Deviations from the newest value, which every window holds, keep the sums of
+            # squares close to the spread of each window
+            deviations = np.subtract(newest, last, dtype=np.float64)
+            sums = np.cumsum(deviations)
+            squares = np.cumsum(np.square(deviations))
+            lows = np.minimum.accumulate(newest)
+            highs = np.maximum.accumulate(newest)
+
+            # All the newest values, grown in turn into each larger window
+            total = _shifted_moments(len(newest), sums[-1], squares[-1], last)
+            lowest, highest = float(lows[-1]), float(highs[-1])
+            window = None
+            for k, size in WINDOW_SIZES.items():
+                n = min(size, held)
+                if window is None or n > window["values"]:
+                    if n <= len(newest):
+                        window = _fields(
+                            _shifted_moments(n, sums[n - 1], squares[n - 1], last),
+                            lows[n - 1],
+                            highs[n - 1],
+                            last,
+                        )
+                    else:
+                        part, part_min, part_max = buffer.summary(count - n, count - total[0])
+                        total = merge_moments(total, part)
+                        lowest, highest = min(lowest, part_min), max(highest, part_max)
+                        window = _fields(total, lowest, highest, last)
+                fields[k] = window
+        self.snapshot = StatsSnapshot(self.snapshot.version + 1, count, fields)
+
+    def window_stats(self, window_size: int) -> Optional[Stats]:
+        """Stats for the last `window_size` values (or all of them, if fewer were added)."""
+        return self._range_stats(self.buffer.count - min(window_size, len(self.buffer)))
+
+    def time_window_stats(self, seconds: float, now: Optional[float] = None) -> Optional[Stats]:
+        """Stats for the values added in the last `seconds` that are still held in the buffer."""
+        cutoff = (time.time() if now is None else now) - seconds
+        start = max(self.times.start_since(cutoff), self.buffer.count - len(self.buffer))
+        return self._range_stats(start)
+
+    def get_stats(self, k: int) -> Optional[Stats]:
+        """Stats for the last 10^k values, from the latest published snapshot."""
+        return self.snapshot.get(k)
+
+    def get_stats_json(self, k: int) -> Optional[bytes]:
+        """Stats for the last 10^k values as encoded JSON, from the latest published snapshot."""
+        return self.snapshot.json(k)
+
+    def _range_stats(self, start: int) -> Optional[Stats]:
+        """Stats for the values from absolute position `start` to the newest one."""
+        fields = self._range_fields(start)
+        return None if fields is None else Stats.model_construct(**fields)
+
+    def _range_fields(self, start: int) -> Optional[Dict[str, float]]:
+        if start >= self.buffer.count:
             return None
 
-        n = len(self.values)
-        var = np.float32(self.M2) / np.float32(n) if n > 0 else np.float32(0)
+        total, lowest, highest = self.buffer.summary(start, self.buffer.count)
+        return _fields(total, lowest, highest, float(self.buffer.value_at(0)))
 
-        return Stats(
-            min=float(self.current_min),
-            max=float(self.current_max),
-            last=float(self.values[-1]),
-            avg=float(self.avg),
-            var=float(var),
-            values=n,
-        )
+
+def _fields(total: Moments, lowest, highest, last: float) -> Dict[str, float]:
+    """The Stats fields of a window, as plain floats and ints in Stats field order."""
+    n, total_sum, m2 = total
+    return {
+        "min": float(lowest),
+        "max": float(highest),
+        "last": last,
+        "avg": total_sum / n,
+        "var": max(m2 / n, 0.0),
+        "values": n,
+    }
+
+
+def _shifted_moments(n: int, total: float, squares: float, shift: float) -> Moments:
+    """Moments of n values given the sum and sum of squares of their deviations from `shift`."""
+    return n, float(total) + n * shift, float(squares - total * total / n)
 
 
 class SymbolManager:
     """
     Manages multiple symbols' trading data with efficient statistical calculations.
-    Provides O(1) stats retrieval and O(b) batch updates.
-    """
+    Provides O(1) stats retrieval from published snapshots and O(b) batch updates.
+
+    With a memory budget, the buffers held in memory are tracked from least to most recently
+    used. Once they take more than the budget, the least recently used ones are spilled to
+    memory-mapped files in the spill directory, and moved back into memory by their next
+    batch; their published stats stay in memory and are served as before. Without a spill
+    directory, they are evicted instead, with their values and stats.
 
-    def __init__(self):
-        self.symbols: Dict[str, Dict[int, RunningStats]] = {}
-        self.locks: Dict[str, asyncio.Lock] = {}
+    Without a memory budget, at most MAX_SYMBOLS symbols are held, and new ones past it are
+    rejected. With one, up to MAX_BUDGETED_SYMBOLS are held, and a new symbol past it evicts
+    the least recently used one, spilled symbols first.
+    """
 
-    async def add_batch(self, symbol: str, values: List[float]) -> None:
+    def __init__(
+        self,
+        wal: Optional[WriteAheadLog] = None,
+        checkpointer: Optional[Checkpointer] = None,
+        store: Optional[SharedStatsStore] = None,
+        executor: Optional[Executor] = None,
+        memory_budget: Optional[int] = None,
+        spill_dir: Optional[str] = None,
+        max_symbols: Optional[int] = None,
+    ):
+        if max_symbols is None:
+            max_symbols = MAX_SYMBOLS if memory_budget is None else MAX_BUDGETED_SYMBOLS
+        self.max_symbols = max_symbols
+        # Every admitted symbol, with its ID, lock and windows
+        self.registry = SymbolRegistry(max_symbols)
+        self.symbols: Dict[str, SymbolWindows] = {}  # Windows of every symbol holding data
+        self.wal = wal  # Logs every batch before it is applied, if set
+        self.checkpointer = checkpointer  # Saves and restores every ring buffer, if set
+        self.store = store  # Receives every published snapshot, for reader processes, if set
+        self.executor = executor  # Runs the numeric update of each batch off the loop, if set
+        # Batches submitted per symbol and not applied yet, with the future of their submitter
+        # if it waits, and the task applying them
+        self.queues: Dict[str, List[Tuple[np.ndarray, Optional[asyncio.Future]]]] = {}
+        self.consumers: Dict[str, asyncio.Task] = {}
+        # Set, then replaced, whenever a symbol publishes a new snapshot
+        self.updated = asyncio.Event()
+
+        self.memory_budget = memory_budget  # Bytes of buffers held in memory, if limited
+        self.spill_dir = Path(spill_dir) if spill_dir else None
+        if self.spill_dir is not None:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+            # Files spilled by an earlier process are not needed to restart
+            for path in self.spill_dir.glob("*.f32"):
+                path.unlink()
+        # Symbols evicted and not reported in an ingest response yet, oldest first
+        self.evicted: Dict[str, None] = {}
+        # Bytes held per symbol whose buffer is in memory, least recently used first
+        self.resident: Dict[str, int] = {}
+        self.resident_bytes = 0
+        self.spilled: Dict[str, None] = {}  # Symbols whose buffer is spilled, oldest first
+        self.relieving = False  # Whether cold symbols are being spilled or evicted
+
+    async def add_batch(self, symbol: str, values: Union[List[float], np.ndarray]) -> None:
         """
         Add a batch of values for a symbol.
 
-        Time Complexity: O(b * k) where:
-        - b is len(values) (max 10000)
-        - k is number of window sizes (constant: 8)
+        Time Complexity: O(b) NumPy work where b is len(values) (max 10000), independent of
+        the number of window sizes. Python overhead is O(1) per batch.
+
+        Space Complexity: O(b) for new symbols, growing by doubling with the values held up
+        to O(w), where w is the largest window size
+
+        With an executor, the buffer update and snapshot run in it while the event loop keeps
+        serving other requests. The symbol's lock is held until they are done, so batches of
+        the same symbol are still applied one at a time, in arrival order.
+
+        With a memory budget, a spilled buffer is moved back into memory first, and cold
+        symbols are spilled or evicted afterwards if buffers take more than the budget.
+
+        A new symbol past `max_symbols` makes room by evicting the least recently used
+        symbols, spilled ones first, when there is a memory budget. Evicted symbols lose their
+        values, write-ahead log and checkpoint, and are listed in `evicted`.
+
+        Raises MaxSymbolsReachedError for a new symbol past `max_symbols` without a memory
+        budget, or when no symbol can be evicted, and InvalidBatchError for a symbol name
+        too long for the shared stats store
+        """
+        state = self.registry.get(symbol) or self._admit(symbol)
+
+        start_ns = time.perf_counter_ns()
+        async with state.lock:
+            add_batch_phases["lock_wait"].since(start_ns)
+            if self.registry.get(symbol) is not state:
+                # Evicted while waiting for the lock: start over with the symbol's new state
+                return await self.add_batch(symbol, values)
+            if state.windows is None:
+                try:
+                    self._check_room([] if symbol in self.consumers else [symbol])
+                    if self.store is not None:
+                        self.store.claim(symbol)
+                except (InvalidBatchError, MaxSymbolsReachedError):
+                    self._unregister(symbol)
+                    raise
+
+                # One buffer and index backs every window size
+                state.windows = self.symbols[state.name] = SymbolWindows()
+                self.evicted.pop(symbol, None)
+
+            values = np.asarray(values, dtype=np.float32)
+            if self.wal is not None:
+                start_ns = time.perf_counter_ns()
+                self.wal.append(symbol, values)
+                add_batch_phases["wal"].since(start_ns)
+
+            # Write the whole batch to the buffer and its index at once, then publish a snapshot
+            start_ns = time.perf_counter_ns()
+            windows = state.windows
+            if self.executor is None:
+                windows.add_many(values)
+            else:
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(self.executor, windows.add_many, values)
+            self._share(symbol)
+            add_batch_phases["update"].since(start_ns)
+            self._touch(symbol)
+
+        # Wake the stats subscribers
+        self.updated.set()
+        self.updated = asyncio.Event()
+
+        if self.memory_budget is not None and self.resident_bytes > self.memory_budget:
+            await self._relieve(symbol)
+
+    async def submit(
+        self, symbol: str, values: Union[List[float], np.ndarray], wait: bool = True
+    ) -> None:
+        """
+        Queue a batch of values for a symbol. A consumer task per symbol applies everything
+        queued at once, as one concatenated batch, so the fixed cost of an update is shared by
+        all the batches that arrived while the previous one was being applied.
 
-        Space Complexity: O(k * w) for new symbols
+        Args:
+            wait: Return once the batch is applied, so later reads see it, rather than once
+                it is queued. Submitters wait anyway while INGEST_MAX_QUEUED batches are queued.
 
-        Raises ValueError if attempting to add more than MAX_SYMBOLS unique symbols
+        Raises MaxSymbolsReachedError, before queuing, if the symbol would take the number of
+        unique symbols past MAX_SYMBOLS. Later errors only reach submitters that wait.
+        """
+        state = self.registry.get(symbol)
+        if (state is None or state.windows is None) and symbol not in self.consumers:
+            self._check_room([symbol])
+            if self.store is not None:
+                self.store.claim(symbol)
+            state = self.registry.register(symbol)
+
+        future = self._enqueue(state, values, wait)
+        if future is not None:
+            await future
+
+    async def synced(self) -> None:
         """
-        if symbol not in self.locks:
-            self.locks[symbol] = asyncio.Lock()
+        Wait until every batch applied so far is durable, with a write-ahead log: batches are
+        logged before they are applied, and the log's group commit fsyncs them.
+        """
+        if self.wal is not None:
+            await self.wal.synced()
+
+    async def flush(self) -> None:
+        """Wait until every queued batch is applied."""
+        while self.consumers:
+            await asyncio.wait(list(self.consumers.values()))
 
-        async with self.locks[symbol]:
-            if symbol not in self.symbols:
-                if len(self.symbols) >= MAX_SYMBOLS:
-                    logger.error(f"Failed to add symbol {symbol}: MAX_SYMBOLS limit reached")
-                    raise MaxSymbolsReachedError(MAX_SYMBOLS)
+    async def add_batches(
+        self, batches: Iterable[Tuple[str, Union[List[float], np.ndarray]]], wait: bool = True
+    ) -> None:
+        """
+        Add many batches for any mix of symbols. Batches of the same symbol are concatenated in
+        order and queued as one, like a batch passed to submit, so they are applied after the
+        batches already queued for the symbol, and each symbol takes its lock and publishes a
+        snapshot once.
 
-                # Initialize RunningStats for each window size
-                self.symbols[symbol] = {
-                    k: RunningStats(window_size=WINDOW_SIZES[k]) for k in range(MIN_K, MAX_K + 1)
-                }
+        Time Complexity: O(n) NumPy work where n is the total number of values, plus O(1)
+        Python overhead per symbol
 
-            # Update all window sizes with new values
-            for value in values:
-                for stats in self.symbols[symbol].values():
-                    stats.add(value)
+        Args:
+            wait: Return once every batch is applied, rather than once they are queued.
+
+        Raises MaxSymbolsReachedError, before queuing anything, if the batches would take the
+        number of unique symbols past MAX_SYMBOLS. Later errors only reach submitters that
+        wait, the first one once every batch is applied.
+        """
+        grouped: Dict[str, List[np.ndarray]] = {}
+        for symbol, values in batches:
+            grouped.setdefault(symbol, []).append(np.asarray(values, dtype=np.float32))
+
+        new_symbols = [
+            symbol
+            for symbol in grouped
+            if symbol not in self.symbols and symbol not in self.consumers
+        ]
+        self._check_room(new_symbols, keep=grouped)
+        if self.store is not None:
+            for symbol in new_symbols:
+                self.store.claim(symbol)
+        # Everything is queued before anything is awaited, so no other batch gets in between.
+        # Symbols are independent, so with an executor their updates run concurrently
+        futures = [
+            self._enqueue(
+                self.registry.register(symbol),
+                parts[0] if len(parts) == 1 else np.concatenate(parts),
+                wait,
+                len(parts),
+            )
+            for symbol, parts in grouped.items()
+        ]
+        results = await asyncio.gather(
+            *(future for future in futures if future is not None), return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+    def _enqueue(
+        self,
+        state: SymbolState,
+        values: Union[List[float], np.ndarray],
+        wait: bool,
+        batches: int = 1,
+    ) -> Optional[asyncio.Future]:
+        """
+        Queue values for an admitted symbol behind the batches already queued for it, starting
+        its consumer if it has none. Returns the future the submitter has to wait for, if any.
+        """
+        symbol = state.name
+        state.batches += batches
+        queue = self.queues.setdefault(symbol, [])
+        future = None
+        if wait or len(queue) >= INGEST_MAX_QUEUED:
+            future = asyncio.get_running_loop().create_future()
+        queue.append((np.asarray(values, dtype=np.float32), future))
+        if symbol not in self.consumers:
+            self.consumers[symbol] = asyncio.create_task(self._consume(symbol))
+        return future
+
+    async def recover(self) -> None:
+        """
+        Rebuild every logged symbol from the tail of the write-ahead log, bulk-loading the
+        memory-mapped values into a fresh ring buffer rather than replaying batches.
+        Recovered values count as added now for time-based windows.
+        """
+        for symbol, parts in list(self.wal.recover()):
+            await self._load(symbol, parts)
+
+    async def checkpoint(self) -> None:
+        """
+        Save every symbol's ring buffer in the background. Its lock is only held while each
+        chunk is copied out, as batches may be applied off the event loop.
+        """
+        await self.checkpointer.save(
+            {symbol: w.buffer for symbol, w in self.symbols.items()},
+            {state.name: state.lock for state in self.registry},
+        )
+
+    async def restore(self) -> None:
+        """
+        Rebuild every symbol from the latest checkpoint, bulk-loading the memory-mapped values
+        into a fresh ring buffer. Restored values count as added now for time-based windows.
+        """
+        for symbol, parts in self.checkpointer.restore():
+            await self._load(symbol, parts)
 
     async def get_stats(self, symbol: str, k: int) -> Stats:
         """
         Get statistics for a symbol's last 10^k values
 
-        Time Complexity: O(1) - constant time retrieval
+        Reads the snapshot published by the last add_batch without taking the symbol's lock,
+        so it never waits behind an ingest.
+
+        Time Complexity: O(1) - lookup in the published snapshot
         Space Complexity: O(1) - returns fixed-size Stats object
 
         Raises:
             SymbolNotFoundError: if symbol doesn't exist
         """
-        if symbol not in self.locks:
-            self.locks[symbol] = asyncio.Lock()
+        stats = self._get_windows(symbol).get_stats(k)
+        if stats is None:
+            logger.error(f"Stats request failed: No data for symbol {symbol}")
+            raise SymbolNotFoundError(symbol)
 
-        async with self.locks[symbol]:
-            if symbol not in self.symbols:
-                logger.error(f"Stats request failed: Symbol {symbol} not found")
-                raise SymbolNotFoundError(symbol)
+        logger.debug(f"Retrieved stats for {symbol} with k={k}")
+        return stats
 
-            stats = self.symbols[symbol][k].get_stats()
-            if stats is None:
-                logger.error(f"Stats request failed: No data for symbol {symbol}")
-                raise SymbolNotFoundError(symbol)
+    async def get_stats_json(self, symbol: str, k: int) -> bytes:
+        """
+        Get statistics for a symbol's last 10^k values, already encoded as a JSON body
 
-            logger.debug(f"Retrieved stats for {symbol} with k={k}")
+        The encoding is cached in the published snapshot, so repeated reads between two
+        batches skip both the Stats model and its serialization.
+
+        Time Complexity: O(1) - lookup in the published snapshot
+        Space Complexity: O(1) - returns the cached bytes
+
+        Raises:
+            SymbolNotFoundError: if symbol doesn't exist
+        """
+        body = self._get_windows(symbol).get_stats_json(k)
+        if body is None:
+            logger.error(f"Stats request failed: No data for symbol {symbol}")
+            raise SymbolNotFoundError(symbol)
+
+        logger.debug(f"Retrieved stats for {symbol} with k={k}")
+        return body
+
+    async def get_stats_json_by_id(self, symbol_id: int, k: int) -> bytes:
+        """
+        Same as get_stats_json, for the symbol with the given ID, found with a list index
+        rather than by hashing its name.
+
+        Raises:
+            SymbolNotFoundError: if no symbol with that ID holds data
+        """
+        state = self.registry.by_id(symbol_id)
+        windows = None if state is None else state.windows
+        body = None if windows is None else windows.get_stats_json(k)
+        if body is None:
+            logger.error(f"Stats request failed: No data for symbol #{symbol_id}")
+            raise SymbolNotFoundError(f"#{symbol_id}")
+        return body
+
+    def symbol_ids(self) -> Dict[str, int]:
+        """The ID of every symbol holding data, for the ID-based API."""
+        return {symbol: self.registry.ids[symbol] for symbol in self.symbols}
+
+    def symbol_name(self, symbol_id: int) -> str:
+        """
+        The symbol with the given ID.
+
+        Raises:
+            SymbolNotFoundError: if no symbol has that ID
+        """
+        state = self.registry.by_id(symbol_id)
+        if state is None:
+            raise SymbolNotFoundError(f"#{symbol_id}")
+        return state.name
+
+    def clear(self) -> None:
+        """Forget every symbol, with its values and stats."""
+        for state in list(self.registry):
+            state.windows = None
+            if self.store is not None:
+                self.store.release(state.name)
+            self._unregister(state.name)
+        self.symbols.clear()
+        self.resident.clear()
+        self.resident_bytes = 0
+        self.spilled.clear()
+
+    async def get_multi_stats_json(
+        self, symbols: Optional[List[str]] = None, ks: Optional[List[int]] = None
+    ) -> bytes:
+        """
+        Get statistics for several symbols and window sizes, encoded as a JSON object of
+        SymbolStats keyed by symbol. Every symbol's stats are read from one snapshot, so all of
+        its windows reflect the same trade. Symbols without data are left out.
+
+        Args:
+            symbols: Symbols to include, or None for every symbol
+            ks: Window size exponents to include, or None for all of them
+
+        Time Complexity: O(s * k) - lookups in the published snapshots
+        Space Complexity: O(s * k) - the encoded response
+        """
+        ks = list(WINDOW_SIZES) if ks is None else list(dict.fromkeys(ks))
+        symbols = list(self.symbols) if symbols is None else list(dict.fromkeys(symbols))
+        return encode_multi_stats(((symbol, self._snapshot(symbol)) for symbol in symbols), ks)
+
+    async def stats_updates(
+        self,
+        symbols: Optional[List[str]] = None,
+        ks: Optional[List[int]] = None,
+        interval: float = DEFAULT_PUSH_INTERVAL,
+    ) -> AsyncIterator[bytes]:
+        """
+        Yield the stats of the subscribed symbols whose snapshot changed since the last update,
+        encoded like get_multi_stats_json, as soon as a batch lands. Updates are coalesced:
+        after each one, batches that land during the next `interval` seconds are all sent
+        together in a single update.
+
+        Args:
+            symbols: Symbols to subscribe to, or None for every symbol, including new ones
+            ks: Window size exponents to include, or None for all of them
+            interval: Minimum seconds between two updates
+        """
+        sent: Dict[str, int] = {}
+        while True:
+            subscribed = self.symbols if symbols is None else symbols
+            changed = [
+                symbol
+                for symbol in subscribed
+                if symbol in self.symbols
+                and self.symbols[symbol].snapshot.version != sent.get(symbol, 0)
+            ]
+            if not changed:
+                # Nothing is awaited between the check and here, so no update can be missed
+                await self.updated.wait()
+                continue
+
+            for symbol in changed:
+                sent[symbol] = self.symbols[symbol].snapshot.version
+            yield await self.get_multi_stats_json(changed, ks)
+            await asyncio.sleep(interval)
+
+    async def get_window_stats(
+        self, symbol: str, last: Optional[int] = None, seconds: Optional[float] = None
+    ) -> Stats:
+        """
+        Get statistics for a symbol's last `last` values, or for the values added in the last
+        `seconds`. Exactly one of the two must be given.
+
+        Time Complexity: O(log w) - a binary search over batch times for time-based windows,
+        then block summaries, w being the window size
+        Space Complexity: O(1) - returns fixed-size Stats object
+
+        Raises:
+            SymbolNotFoundError: if symbol doesn't exist
+            EmptyWindowError: if no values were added in the time window
+        """
+        state = self.registry.get(symbol)
+        self._get_windows(symbol)
+        async with state.lock:
+            windows = state.windows
+            if windows is None:
+                raise SymbolNotFoundError(symbol)  # Evicted meanwhile
+            if seconds is not None:
+                stats = windows.time_window_stats(seconds)
+                if stats is None:
+                    raise EmptyWindowError(symbol, seconds)
+            else:
+                stats = windows.window_stats(last)
+            if symbol in self.resident:
+                self._touch(symbol)
+
+            logger.debug(f"Retrieved stats for {symbol} with last={last} seconds={seconds}")
             return stats
+
+    def _admit(self, symbol: str) -> SymbolState:
+        """
+        Register a new symbol, unless the manager is full: rejected symbols leave nothing
+        behind, however many are tried.
+        """
+        self._check_room([symbol])
+        return self.registry.register(symbol)
+
+    def _check_room(self, new_symbols: List[str], keep: Iterable[str] = ()) -> None:
+        """
+        Make room for new symbols that would take the number of unique symbols past the limit,
+        by evicting the least recently used ones (other than `keep`) with a memory budget, or
+        else raise MaxSymbolsReachedError. Symbols with batches queued but not applied yet are
+        not in `symbols`, but already hold their place.
+        """
+        pending = [name for name in self.consumers if name not in self.symbols]
+        excess = len(self.symbols) + len(pending) + len(new_symbols) - self.max_symbols
+        if excess > 0 and self.memory_budget is not None:
+            excess -= self._evict_coldest(excess, set(keep))
+        if excess > 0:
+            logger.error(f"Failed to add symbols {new_symbols}: MAX_SYMBOLS limit reached")
+            raise MaxSymbolsReachedError(self.max_symbols)
+
+    def _evict_coldest(self, count: int, keep: Set[str]) -> int:
+        """
+        Evict up to `count` of the least recently used symbols, spilled ones first, and return
+        how many were. Symbols being written to or read, or with batches queued, are skipped,
+        so nothing is awaited.
+        """
+        evicted = 0
+        for victim in [*self.spilled, *self.resident]:
+            if evicted == count:
+                break
+            if (
+                victim in keep
+                or victim in self.consumers
+                or self.registry.get(victim).lock.locked()
+            ):
+                continue
+            self.resident_bytes -= self.resident.pop(victim, 0)
+            self._evict(victim)
+            evicted += 1
+        return evicted
+
+    def _get_windows(self, symbol: str) -> SymbolWindows:
+        state = self.registry.get(symbol)
+        windows = None if state is None else state.windows
+        if windows is None:
+            logger.error(f"Stats request failed: Symbol {symbol} not found")
+            raise SymbolNotFoundError(symbol)
+        return windows
+
+    async def _consume(self, symbol: str) -> None:
+        """Apply the batches queued for a symbol, all at once, until its queue is empty."""
+        try:
+            while self.queues.get(symbol):
+                batches = self.queues.pop(symbol)
+                values = [values for values, _ in batches]
+                error = None
+                try:
+                    await self.add_batch(
+                        symbol, values[0] if len(values) == 1 else np.concatenate(values)
+                    )
+                except Exception as e:
+                    error = e
+
+                waiters = [future for _, future in batches if future is not None]
+                for future in waiters:
+                    if future.done():
+                        continue  # The submitter was cancelled
+                    if error is None:
+                        future.set_result(None)
+                    else:
+                        future.set_exception(error)
+                if error is not None and not waiters:
+                    logger.error(f"Failed to apply queued batches for symbol {symbol}: {error}")
+        finally:
+            del self.consumers[symbol]
+            state = self.registry.get(symbol)
+            if state is not None and state.windows is None:
+                self._unregister(symbol)  # Its batches all failed
+
+    def _touch(self, symbol: str) -> None:
+        """Mark a symbol's buffer as in memory and the most recently used, and count its bytes."""
+        nbytes = self.symbols[symbol].nbytes
+        self.resident_bytes += nbytes - self.resident.pop(symbol, 0)
+        self.resident[symbol] = nbytes
+        self.spilled.pop(symbol, None)
+
+    async def _relieve(self, keep: str) -> None:
+        """
+        Spill, or evict without a spill directory, the least recently used symbols until the
+        buffers in memory fit the memory budget. `keep`, which was just used, is left alone.
+        """
+        if self.relieving:
+            return  # Another batch is already relieving memory
+        self.relieving = True
+        try:
+            while self.resident_bytes > self.memory_budget:
+                victim = next((symbol for symbol in self.resident if symbol != keep), None)
+                if victim is None:
+                    break
+                async with self.registry.get(victim).lock:
+                    if victim not in self.resident:
+                        continue  # Evicted meanwhile
+                    self.resident_bytes -= self.resident.pop(victim)
+                    if self.spill_dir is None:
+                        self._evict(victim)
+                        continue
+                    buffer = self.symbols[victim].buffer
+                    path = self.spill_dir / f"{quote(victim, safe='')}.f32"
+                    loop = asyncio.get_running_loop()
+                    await loop.run_in_executor(self.executor, buffer.spill, path)
+                    self.spilled[victim] = None
+                    logger.info(f"Spilled {len(buffer)} values of symbol {victim} to {path}")
+        finally:
+            self.relieving = False
+
+    def _evict(self, symbol: str) -> None:
+        """Drop a symbol with its values and its ID, as if it never received any."""
+        windows = self.symbols.pop(symbol)
+        self.registry.get(symbol).windows = None
+        self._unregister(symbol)
+        if windows.buffer.path is not None:
+            # Spilled, its file is no longer needed
+            self.spilled.pop(symbol, None)
+            windows.buffer.path.unlink(missing_ok=True)
+        if self.store is not None:
+            # Readers no longer find the symbol, and its slot goes to the next one claimed
+            self.store.release(symbol)
+        # A restart must not bring back the values dropped here
+        if self.wal is not None:
+            self.wal.remove(symbol)
+        if self.checkpointer is not None:
+            self.checkpointer.discard(symbol)
+        self.evicted[symbol] = None
+        if len(self.evicted) > self.max_symbols:
+            # Nobody collects them, without a router: keep only as many as could be held
+            del self.evicted[next(iter(self.evicted))]
+        logger.info(f"Evicted symbol {symbol} with {len(windows.buffer)} values")
+
+    def _unregister(self, symbol: str) -> None:
+        """
+        Reclaim the registry state of a symbol holding no data, unless batches are queued for
+        it. Batches waiting for its lock then register it again.
+        """
+        if symbol not in self.consumers:
+            self.registry.remove(symbol)
+
+    def _share(self, symbol: str) -> None:
+        """Copy the symbol's latest snapshot to the shared stats store, if there is one."""
+        if self.store is not None:
+            snapshot = self.symbols[symbol].snapshot
+            self.store.publish(symbol, snapshot.version, snapshot.count, snapshot.fields)
+
+    def _snapshot(self, symbol: str) -> Optional[StatsSnapshot]:
+        state = self.registry.get(symbol)
+        return None if state is None or state.windows is None else state.windows.snapshot
+
+    async def _load(self, symbol: str, parts: List[np.ndarray]) -> None:
+        """
+        Bulk-load the values of a symbol, then spill or evict cold symbols, as after a batch,
+        if buffers take more than the memory budget.
+        """
+        if symbol not in self.symbols:
+            try:
+                self._check_room([symbol])
+            except MaxSymbolsReachedError:
+                logger.error(f"Failed to load symbol {symbol}: MAX_SYMBOLS limit reached")
+                return
+        if self.store is not None:
+            try:
+                self.store.claim(symbol)
+            except InvalidBatchError as e:
+                logger.error(f"Failed to load symbol {symbol}: {e}")
+                return
+        state = self.registry.register(symbol)
+        windows = state.windows = self.symbols[state.name] = SymbolWindows()
+        self.evicted.pop(symbol, None)
+        windows.load(parts)
+        self._share(symbol)
+        self._touch(symbol)
+        logger.info(f"Loaded {windows.buffer.count} values for symbol {symbol}")
+        if self.memory_budget is not None and self.resident_bytes > self.memory_budget:
+            await self._relieve(symbol)
@@ -0,0 +1,309 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import tempfile
+import zlib
+
+from contextlib import asynccontextmanager
+from typing import Dict, Iterable, List, Optional, Set
+
+import httpx
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+from .constants import (
+    CHECKPOINT_DIR_ENV,
+    EVICTED_HEADER,
+    MAX_SYMBOLS,
+    MEMORY_BUDGET_ENV,
+    SHARD_SOCKET_NAME,
+    SHARD_STARTUP_TIMEOUT,
+    STATS_SHM_ENV,
+    WAL_DIR_ENV,
+)
+from .exceptions import (
+    FinancialServiceError,
+    InvalidBatchError,
+    MaxSymbolsReachedError,
+    NotShardedError,
+)
+from .models import BatchResponse
+
+
+def shard_for(symbol: str, shards: int) -> int:
+    """Index of the shard owning a symbol. Stable across processes and restarts."""
+    return zlib.crc32(symbol.encode()) % shards
+
+
+class ShardRouter:
+    """
+    Front router of the sharded mode. Every symbol is owned by one worker process, picked by
+    shard_for, which holds its SymbolManager state. Requests are forwarded to the owner over
+    a client per shard, normally HTTP over a Unix socket.
+
+    The router also enforces MAX_SYMBOLS across all shards, as each shard only sees its own.
+    Shards list the symbols they evicted in their ingest responses, which stop counting.
+    Without `max_symbols`, as when shards have a memory budget and evict cold symbols to
+    make room for new ones, nothing is rejected here.
+    """
+
+    def __init__(self, clients: List[httpx.AsyncClient], max_symbols: Optional[int] = MAX_SYMBOLS):
+        self.clients = clients
+        self.max_symbols = max_symbols
+        self.symbols: Set[str] = set()  # Symbols known to hold data on some shard
+
+    def client_for(self, symbol: str) -> httpx.AsyncClient:
+        return self.clients[shard_for(symbol, len(self.clients))]
+
+    async def sync_symbols(self, timeout: float = SHARD_STARTUP_TIMEOUT) -> None:
+        """Learn the symbols the shards already hold, waiting for them to start listening."""
+        deadline = asyncio.get_running_loop().time() + timeout
+        for client in self.clients:
+            while True:
+                try:
+                    response = await client.get("/stats")
+                    break
+                except httpx.TransportError:
+                    if asyncio.get_running_loop().time() > deadline:
+                        raise
+                    await asyncio.sleep(0.1)
+            self.symbols.update(response.json())
+
+    def admit(self, symbols: Iterable[str]) -> List[str]:
+        """
+        Register the symbols not seen before and return them, or raise if they would take the
+        total past MAX_SYMBOLS. Nothing is awaited in between, so concurrent requests cannot
+        both take the last slot.
+        """
+        new_symbols = [symbol for symbol in dict.fromkeys(symbols) if symbol not in self.symbols]
+        if self.max_symbols is not None and len(self.symbols) + len(new_symbols) > self.max_symbols:
+            raise MaxSymbolsReachedError(self.max_symbols)
+        self.symbols.update(new_symbols)
+        return new_symbols
+
+    async def forward(
+        self, client: httpx.AsyncClient, request: Request, content: bytes
+    ) -> Response:
+        """Forward a request to a shard with the given body, and relay its response."""
+        response = await client.request(
+            request.method,
+            request.url.path,
+            params=request.query_params.multi_items(),
+            content=content,
+            headers={"Content-Type": request.headers.get("Content-Type", "application/json")},
+        )
+        evicted = response.headers.get(EVICTED_HEADER)
+        if evicted:
+            self.symbols.difference_update(json.loads(evicted))
+        return relay(response)
+
+    async def ingest(self, symbols: List[str], request: Request, content: bytes) -> Response:
+        """
+        Forward an ingest request for `symbols`, all owned by the same shard, releasing the
+        symbols it newly admitted if the shard rejects it.
+        """
+        new_symbols = self.admit(symbols)
+        response = await self.forward(self.client_for(symbols[0]), request, content)
+        if response.status_code >= 300:
+            self.symbols.difference_update(new_symbols)
+        return response
+
+
+def relay(response: httpx.Response) -> Response:
+    return Response(
+        content=response.content,
+        status_code=response.status_code,
+        media_type=response.headers.get("Content-Type"),
+    )
+
+
+def create_router_app(router: ShardRouter) -> FastAPI:
+    """
+    The front app of the sharded mode, exposing the HTTP API of src.main. Symbol IDs, metrics
+    and profiling are per process, so those endpoints answer 501 here.
+    """
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        await router.sync_symbols()
+        yield
+        for client in router.clients:
+            await client.aclose()
+
+    app = FastAPI(title="Financial Data Service (sharded)", lifespan=lifespan)
+
+    @app.exception_handler(FinancialServiceError)
+    async def financial_service_exception_handler(request, exc: FinancialServiceError):
+        return JSONResponse(status_code=exc.status_code, content={"detail": str(exc)})
+
+    @app.post("/add_batch/")
+    async def add_batch(request: Request) -> Response:
+        # Only the symbol is read here, the owning shard validates the whole batch
+        body = await request.body()
+        try:
+            symbol = str(json.loads(body)["symbol"])
+        except (ValueError, KeyError, TypeError) as e:
+            raise InvalidBatchError("body must be a JSON object with a symbol") from e
+        return await router.ingest([symbol], request, body)
+
+    @app.post("/add_batch/{symbol}")
+    async def add_binary_batch(symbol: str, request: Request) -> Response:
+        return await router.ingest([symbol], request, await request.body())
+
+    @app.post("/add_batches/")
+    async def add_batches(request: Request) -> Response:
+        """
+        Split the batches by owning shard and forward each part, in its original order.
+        Admission is all or nothing, validation and ingest are atomic per shard.
+        """
+        body = await request.body()
+        try:
+            batches = json.loads(body)["batches"]
+            by_shard: Dict[int, List[dict]] = {}
+            for batch in batches:
+                shard = shard_for(str(batch["symbol"]), len(router.clients))
+                by_shard.setdefault(shard, []).append(batch)
+        except (ValueError, KeyError, TypeError) as e:
+            raise InvalidBatchError("body must be a JSON object with a list of batches") from e
+
+        if not by_shard:
+            # Let a shard reject the empty bulk like the single-process service does
+            return await router.forward(router.clients[0], request, body)
+
+        new_symbols = router.admit(str(batch["symbol"]) for batch in batches)
+        responses = await asyncio.gather(
+            *(
+                router.forward(
+                    router.clients[shard], request, json.dumps({"batches": shard_batches}).encode()
+                )
+                for shard, shard_batches in by_shard.items()
+            )
+        )
+        failed = []
+        for shard, response in zip(by_shard, responses, strict=True):
+            if response.status_code >= 300:
+                failed.append(response)
+                router.symbols.difference_update(
+                    symbol
+                    for symbol in new_symbols
+                    if router.client_for(symbol) is router.clients[shard]
+                )
+        if failed:
+            return failed[0]
+        # Every shard answers 201, or 202 with wait=false
+        status_code = responses[0].status_code
+        verb = "Added" if status_code == 201 else "Queued"
+        symbols = ", ".join(dict.fromkeys(str(batch["symbol"]) for batch in batches))
+        response = BatchResponse(
+            status="success", message=f"{verb} {len(batches)} batches for symbols: {symbols}"
+        )
+        return JSONResponse(response.model_dump(), status_code=status_code)
+
+    @app.get("/stats")
+    async def get_multi_stats(request: Request) -> Response:
+        symbols: Optional[List[str]] = request.query_params.getlist("symbol") or None
+        shards = range(len(router.clients))
+        if symbols is not None:
+            shards = sorted({shard_for(symbol, len(router.clients)) for symbol in symbols})
+        responses = await asyncio.gather(
+            *(
+                router.clients[shard].get("/stats", params=request.query_params.multi_items())
+                for shard in shards
+            )
+        )
+        merged = {}
+        for response in responses:
+            if response.status_code != 200:
+                return relay(response)
+            merged.update(response.json())
+        # Keep the order of the requested symbols
+        if symbols is not None:
+            merged = {symbol: merged[symbol] for symbol in symbols if symbol in merged}
+        return JSONResponse(merged)
+
+    @app.get("/symbols")
+    @app.get("/stats/by-id/{symbol_id}/{k}")
+    async def get_by_id(request: Request) -> Response:
+        raise NotShardedError("symbol IDs are assigned by each shard, use symbol names")
+
+    @app.get("/metrics")
+    @app.post("/admin/profile")
+    async def per_process(request: Request) -> Response:
+        raise NotShardedError(f"{request.url.path} is served by each shard on its own socket")
+
+    @app.get("/stats/{symbol}/{k}")
+    async def get_stats(symbol: str, k: str, request: Request) -> Response:
+        return relay(await router.client_for(symbol).get(request.url.path))
+
+    @app.get("/stats/{symbol}")
+    async def get_window_stats(symbol: str, request: Request) -> Response:
+        client = router.client_for(symbol)
+        return relay(await client.get(request.url.path, params=request.query_params.multi_items()))
+
+    return app
+
+
+def socket_path(socket_dir: str, index: int) -> str:
+    return os.path.join(socket_dir, SHARD_SOCKET_NAME.format(index=index))
+
+
+def run_shard(index: int, socket_dir: str, log_level: str) -> None:
+    """Serve src.main:app on the shard's Unix socket, with its own WAL and checkpoints."""
+    import uvicorn
+
+    for variable in (WAL_DIR_ENV, CHECKPOINT_DIR_ENV):
+        if os.environ.get(variable):
+            os.environ[variable] = os.path.join(os.environ[variable], f"shard-{index}")
+    uvicorn.run("src.main:app", uds=socket_path(socket_dir, index), log_level=log_level)
+
+
+def main(shards: int, host: str, port: int, socket_dir: str, log_level: str) -> None:
+    if os.environ.get(STATS_SHM_ENV):
+        # Stats readers attach to one segment, which every shard would claim as its own
+        raise SystemExit(f"{STATS_SHM_ENV} is not supported in sharded mode, unset it")
+
+    import uvicorn
+
+    workers = [
+        multiprocessing.Process(target=run_shard, args=(index, socket_dir, log_level), daemon=True)
+        for index in range(shards)
+    ]
+    for worker in workers:
+        worker.start()
+
+    clients = [
+        httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(uds=socket_path(socket_dir, index)),
+            base_url="http://shard",
+            timeout=30.0,
+        )
+        for index in range(shards)
+    ]
+    # With a memory budget, shards evict cold symbols rather than reject new ones
+    max_symbols = None if os.environ.get(MEMORY_BUDGET_ENV) else MAX_SYMBOLS
+    try:
+        uvicorn.run(
+            create_router_app(ShardRouter(clients, max_symbols)),
+            host=host,
+            port=port,
+            log_level=log_level,
+        )
+    finally:
+        for worker in workers:
+            worker.terminate()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run the service as one worker process per shard behind a front router."
+    )
+    parser.add_argument("--shards", type=int, default=os.cpu_count(), help="Worker processes")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--socket-dir", default=tempfile.gettempdir())
+    parser.add_argument("--log-level", default="warning")
+    args = parser.parse_args()
+    main(args.shards, args.host, args.port, args.socket_dir, args.log_level)
@@ -0,0 +1,222 @@
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .constants import MAX_K, MAX_SYMBOLS, MIN_K, SHARED_SYMBOL_BYTES
+from .exceptions import InvalidBatchError, MaxSymbolsReachedError
+
+# Stats fields in the order they are stored, which is the Stats field order
+STATS_FIELDS = ("min", "max", "last", "avg", "var", "values")
+
+# Slots ever claimed, whether the writer still runs, and the number of times a slot that was
+# claimed changed symbol since
+HEADER = np.dtype([("symbols", "<u8"), ("open", "<u8"), ("generation", "<u8")])
+SLOT = np.dtype(
+    [
+        ("sequence", "<u8"),
+        ("version", "<u8"),
+        ("count", "<u8"),
+        # A window without data is stored as zeros: one with data holds at least one value
+        ("stats", "<f8", (MAX_K - MIN_K + 1, len(STATS_FIELDS))),
+        ("symbol", f"S{SHARED_SYMBOL_BYTES}"),
+    ],
+    align=True,
+)
+
+
+class SharedStatsStore:
+    """
+    The latest published stats snapshot of every symbol, in one shared memory segment, so
+    reader processes on other cores can serve stats without going through the ingest process.
+
+    The segment holds a header, then one fixed-size slot per symbol, claimed in order and
+    never moved. A released slot is blanked and claimed again by the next new symbol, which
+    bumps the header's generation so readers index the slots again. Only the writer, which
+    owns the segment, writes to it. Each slot is guarded by a seqlock: the writer makes the
+    slot's sequence odd, writes the slot, then makes the sequence even again, while readers
+    copy the slot and retry if the sequence was odd or changed meanwhile. Readers take no
+    lock and never hold the writer back.
+    """
+
+    def __init__(self, memory: shared_memory.SharedMemory, owner: bool = False):
+        self.memory = memory
+        self.owner = owner
+        slots = (memory.size - HEADER.itemsize) // SLOT.itemsize
+        self.header = np.ndarray((), dtype=HEADER, buffer=memory.buf)
+        self.slots = np.ndarray((slots,), dtype=SLOT, buffer=memory.buf, offset=HEADER.itemsize)
+        # Views of single fields, which are cheaper to take once than on every access
+        self.sequences = self.slots["sequence"]
+        self.versions = self.slots["version"]
+        self.index: Dict[str, int] = {}  # Slot of each symbol seen so far
+        self.scanned = 0  # Slots indexed so far
+        self.generation = 0  # Generation of the header when the slots were indexed
+        self.free: List[int] = []  # Slots released by the writer, to claim again
+
+    @classmethod
+    def create(cls, name: str, slots: int = MAX_SYMBOLS) -> "SharedStatsStore":
+        """Create the segment as its writer, replacing one left behind by a previous writer."""
+        size = HEADER.itemsize + slots * SLOT.itemsize
+        try:
+            memory = shared_memory.SharedMemory(name, create=True, size=size)
+        except FileExistsError:
+            stale = cls(shared_memory.SharedMemory(name))
+            # Readers still attached to it see it closed, and attach to the new one
+            stale.header["open"] = 0
+            stale.memory.unlink()
+            stale.close()
+            memory = shared_memory.SharedMemory(name, create=True, size=size)
+        store = cls(memory, owner=True)
+        store.header["open"] = 1
+        return store
+
+    @classmethod
+    def attach(cls, name: str) -> "SharedStatsStore":
+        """Attach to the segment of a running writer, as a reader."""
+        # Untracked, so the segment is not unlinked when a reader exits
+        return cls(shared_memory.SharedMemory(name, track=False))
+
+    @property
+    def closed(self) -> bool:
+        """Whether the segment was closed, by its writer or by this process."""
+        return self.memory.buf is None or not self.header["open"]
+
+    def claim(self, symbol: str) -> int:
+        """
+        Return the slot of a symbol, claiming a released one or the next free one if it has
+        none yet.
+
+        Raises:
+            InvalidBatchError: if the symbol is too long to be stored
+            MaxSymbolsReachedError: if every slot is taken
+        """
+        slot = self.index.get(symbol)
+        if slot is not None:
+            return slot
+        encoded = symbol.encode()
+        if len(encoded) > SHARED_SYMBOL_BYTES:
+            raise InvalidBatchError(f"symbol cannot exceed {SHARED_SYMBOL_BYTES} bytes")
+        if self.free:
+            slot = self.free.pop()
+            self._rename(slot, encoded)
+        else:
+            slot = int(self.header["symbols"])
+            if slot >= len(self.slots):
+                raise MaxSymbolsReachedError(len(self.slots))
+            self.slots["symbol"][slot] = encoded
+            # Readers only look at slots below the count, so the slot is named before it counts
+            self.header["symbols"] = slot + 1
+        self.index[symbol] = slot
+        return slot
+
+    def release(self, symbol: str) -> None:
+        """Blank the slot of a symbol, which readers then no longer find, and free it."""
+        slot = self.index.pop(symbol, None)
+        if slot is not None:
+            self._rename(slot, b"")
+            self.free.append(slot)
+
+    def publish(
+        self, symbol: str, version: int, count: int, fields: Dict[int, Dict[str, float]]
+    ) -> None:
+        """Write the latest snapshot of a symbol to its slot."""
+        stats = np.zeros(SLOT["stats"].shape)
+        for k, window in fields.items():
+            stats[k - MIN_K] = [window[name] for name in STATS_FIELDS]
+
+        slot = self.claim(symbol)
+        self.sequences[slot] += 1  # Odd: the slot is being written
+        self.versions[slot] = version
+        self.slots["count"][slot] = count
+        self.slots["stats"][slot] = stats
+        self.sequences[slot] += 1  # Even: the slot is consistent again
+
+    def sequence(self, symbol: str) -> Optional[int]:
+        """
+        The seqlock sequence of a symbol's slot, or None if the symbol has no slot. It changes
+        with every write and never repeats, even once the slot is claimed by another symbol,
+        unlike the versions of a symbol evicted and added again. A single aligned word, so it
+        is read without the seqlock, to skip reading unchanged snapshots.
+        """
+        slot = self._slot(symbol)
+        return None if slot is None else int(self.sequences[slot])
+
+    def read(self, symbol: str) -> Optional[Tuple[int, int, Dict[int, Dict[str, float]]]]:
+        """
+        The version, count and Stats fields per window size of a symbol's latest snapshot,
+        or None if the symbol has no slot.
+        """
+        slot = self._slot(symbol)
+        if slot is None:
+            return None
+
+        while True:
+            before = self.sequences[slot]
+            if before % 2:
+                continue
+            record = self.slots[slot : slot + 1].copy()[0]
+            if self.sequences[slot] == before:
+                break
+        if record["symbol"] != symbol.encode():
+            # Released, and maybe claimed by another symbol, since the slots were indexed
+            self.generation = -1
+            self.refresh()
+            return self.read(symbol)
+
+        fields = {}
+        for k, row in enumerate(record["stats"].tolist(), start=MIN_K):
+            if row[-1]:
+                fields[k] = dict(zip(STATS_FIELDS, row, strict=True))
+                fields[k]["values"] = int(row[-1])
+        return int(record["version"]), int(record["count"]), fields
+
+    def symbols(self) -> List[str]:
+        """Every symbol with a slot, in the order they were claimed."""
+        self.refresh()
+        return list(self.index)
+
+    def refresh(self) -> None:
+        """
+        Pick up the slots claimed by the writer since the last refresh, or index every slot
+        again if one changed symbol meanwhile.
+        """
+        generation = int(self.header["generation"])
+        if generation != self.generation:
+            self.index.clear()
+            self.scanned = 0
+            self.generation = generation
+        symbols = int(self.header["symbols"])
+        for slot in range(self.scanned, symbols):
+            name = self.slots["symbol"][slot]
+            if name:
+                self.index[name.decode()] = slot
+        self.scanned = symbols
+
+    def _rename(self, slot: int, encoded: bytes) -> None:
+        """Give a claimed slot to another symbol, or none, starting from no snapshot."""
+        self.sequences[slot] += 1
+        self.versions[slot] = 0
+        self.slots["count"][slot] = 0
+        self.slots["stats"][slot] = 0
+        self.slots["symbol"][slot] = encoded
+        self.sequences[slot] += 1
+        self.header["generation"] += 1
+
+    def _slot(self, symbol: str) -> Optional[int]:
+        slot = self.index.get(symbol)
+        if slot is None:
+            self.refresh()
+            slot = self.index.get(symbol)
+        return slot
+
+    def close(self) -> None:
+        """Detach from the segment. The writer also marks it closed and unlinks it."""
+        if self.memory.buf is None:
+            return
+        # A writer replaced by a new one already had its segment closed and unlinked
+        unlink = self.owner and not self.closed
+        if unlink:
+            self.header["open"] = 0
+        self.memory.close()
+        if unlink:
+            self.memory.unlink()
@@ -0,0 +1,90 @@
+import os
+
+from typing import Annotated, Dict, List, Optional, Tuple
+
+from fastapi import FastAPI, Query
+from fastapi.responses import JSONResponse, Response
+
+from src.constants import DEFAULT_STATS_SHM_NAME, MAX_K, MIN_K, STATS_SHM_ENV, WINDOW_SIZES
+from src.exceptions import (
+    FinancialServiceError,
+    InvalidWindowSizeError,
+    StatsUnavailableError,
+    SymbolNotFoundError,
+)
+from src.models import Stats, SymbolStats
+from src.services import StatsSnapshot, encode_multi_stats
+from src.shared import SharedStatsStore
+
+# Read-only app serving stats from the shared memory segment published by the ingest process
+# (src.main with STATS_SHM_NAME set). It holds no state of its own, so any number of workers
+# can run it, e.g. uvicorn src.stats_reader:app --workers 4 --port 8001
+stats_shm_name = os.environ.get(STATS_SHM_ENV, DEFAULT_STATS_SHM_NAME)
+store: Optional[SharedStatsStore] = None
+# Latest snapshot read per symbol, with the sequence of its slot then, so its Stats and JSON
+# are reused until a batch lands
+snapshots: Dict[str, Tuple[int, StatsSnapshot]] = {}
+
+app = FastAPI(title="Financial Data Service (stats reader)")
+
+
+@app.exception_handler(FinancialServiceError)
+async def financial_service_exception_handler(request, exc: FinancialServiceError):
+    return JSONResponse(status_code=exc.status_code, content={"detail": str(exc)})
+
+
+def get_store() -> SharedStatsStore:
+    """The shared stats store, attached on first use and again after the writer restarts."""
+    global store
+    if store is None or store.closed:
+        try:
+            attached = SharedStatsStore.attach(stats_shm_name)
+        except FileNotFoundError as e:
+            raise StatsUnavailableError("the ingest process is not running") from e
+        if store is not None:
+            store.close()
+        store = attached
+        snapshots.clear()
+    return store
+
+
+def read_snapshot(symbol: str) -> Optional[StatsSnapshot]:
+    """The latest snapshot of a symbol, or None if it has no data."""
+    store = get_store()
+    sequence = store.sequence(symbol)
+    cached = snapshots.get(symbol)
+    if cached is None or cached[0] != sequence:
+        record = store.read(symbol)
+        if record is None:
+            snapshots.pop(symbol, None)
+            return None
+        cached = snapshots[symbol] = (sequence, StatsSnapshot(*record))
+    snapshot = cached[1]
+    return snapshot if snapshot.count else None
+
+
+@app.get("/stats", response_model=Dict[str, SymbolStats])
+async def get_multi_stats(
+    symbol: Annotated[Optional[List[str]], Query()] = None,
+    k: Annotated[Optional[List[int]], Query()] = None,
+) -> Response:
+    """Same as GET /stats of the ingest process, read from shared memory."""
+    for window in k or []:
+        if not MIN_K <= window <= MAX_K:
+            raise InvalidWindowSizeError(window)
+    symbols = get_store().symbols() if symbol is None else list(dict.fromkeys(symbol))
+    ks = list(WINDOW_SIZES) if k is None else list(dict.fromkeys(k))
+    body = encode_multi_stats(((name, read_snapshot(name)) for name in symbols), ks)
+    return Response(content=body, media_type="application/json")
+
+
+@app.get("/stats/{symbol}/{k}", response_model=Stats)
+async def get_stats(symbol: str, k: int) -> Response:
+    """Same as GET /stats/{symbol}/{k} of the ingest process, read from shared memory."""
+    if not MIN_K <= k <= MAX_K:
+        raise InvalidWindowSizeError(k)
+    snapshot = read_snapshot(symbol)
+    body = None if snapshot is None else snapshot.json(k)
+    if body is None:
+        raise SymbolNotFoundError(symbol)
+    return Response(content=body, media_type="application/json")
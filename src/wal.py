@@ -0,0 +1,273 @@
+import asyncio
+import logging
+import os
+import shutil
+
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from urllib.parse import quote, unquote
+
+import numpy as np
+
+from .constants import (
+    MAX_K,
+    WAL_FSYNC_INTERVAL,
+    WAL_MAX_OPEN_FILES,
+    WAL_SEGMENT_VALUES,
+    WINDOW_SIZES,
+)
+
+# Values are logged exactly as they are stored in the ring buffers
+WAL_DTYPE = np.dtype("<f4")
+
+logger = logging.getLogger(__name__)
+
+
+class SymbolLog:
+    """
+    Append-only log of one symbol's values, split into segment files of raw little-endian
+    float32. Each segment is named after the position of its first value in the log, so the
+    position of any value is known without reading the files.
+
+    The last segment is opened by the first append, and can be closed between appends to
+    return its file descriptor.
+    """
+
+    def __init__(self, directory: Path, retain: int, segment_values: int):
+        self.directory = directory
+        self.retain = retain  # Values kept on disk, older segments are deleted
+        self.segment_values = segment_values
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segments: List[Tuple[int, Path]] = sorted(
+            (int(path.stem), path) for path in self.directory.glob("*.f32")
+        )
+        self.end = 0  # Position after the last value logged
+        self.file = None
+        self.unsynced: Dict[Path, None] = {}  # Segments written to since the last flush
+        if self.segments:
+            start, path = self.segments[-1]
+            # Drop a value torn by a crash in the middle of a write
+            size = path.stat().st_size // WAL_DTYPE.itemsize
+            os.truncate(path, size * WAL_DTYPE.itemsize)
+            self.end = start + size
+
+    def append(self, values: np.ndarray) -> None:
+        values = np.ascontiguousarray(values, dtype=WAL_DTYPE)
+        while len(values):
+            if self.file is None or self.end - self.segments[-1][0] >= self.segment_values:
+                self._roll()
+            room = self.segment_values - (self.end - self.segments[-1][0])
+            self.file.write(memoryview(values[:room]))
+            self.unsynced[self.segments[-1][1]] = None
+            self.end += len(values[:room])
+            values = values[room:]
+
+    def flush(self) -> List[Path]:
+        """
+        Hand the values written so far to the OS, and return every segment they went to since
+        the last flush, for the caller to fsync.
+        """
+        if self.file is not None:
+            self.file.flush()
+        paths, self.unsynced = list(self.unsynced), {}
+        return paths
+
+    def sync(self) -> None:
+        _fsync(self.flush())
+
+    def tail(self, n: int) -> List[np.ndarray]:
+        """Memory-map the last n values logged, as one read-only array per segment."""
+        parts = []
+        stop = self.end
+        for start, path in reversed(self.segments):
+            if stop - start > 0:
+                part = np.memmap(path, dtype=WAL_DTYPE, mode="r", shape=(stop - start,))
+                parts.append(part[max(0, self.end - n - start) :])
+            if start <= self.end - n:
+                break
+            stop = start
+        return parts[::-1]
+
+    def close(self) -> None:
+        self.sync()
+        self.close_file()
+
+    def close_file(self) -> None:
+        """
+        Close the open segment, handing its values to the OS. The next commit still fsyncs
+        it, and the next append opens it again.
+        """
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def _roll(self) -> None:
+        """Continue the last segment if it has room, otherwise start a new one."""
+        self.close_file()
+        if not self.segments or self.end - self.segments[-1][0] >= self.segment_values:
+            self.segments.append((self.end, self.directory / f"{self.end:020d}.f32"))
+        self.file = open(self.segments[-1][1], "ab")
+
+        # Segments whose values all precede the retained tail are no longer needed
+        while len(self.segments) > 1 and self.segments[1][0] <= self.end - self.retain:
+            self.segments.pop(0)[1].unlink()
+
+
+class WriteAheadLog:
+    """
+    Optional durable log of every batch, one SymbolLog per symbol under `directory`.
+
+    Writes go to the OS page cache as batches arrive and are group-committed: `run` fsyncs
+    the dirty segment files together every `fsync_interval` seconds, in a worker thread so
+    the event loop never waits on the disk. Callers that must not acknowledge a batch before
+    it is durable wait for the commit covering it with `synced`, so all the requests of an
+    interval share one fsync. A crash loses the batches logged since the last commit
+    finished, at most `fsync_interval` plus the time of one commit. Only the last `retain`
+    values of each symbol are kept, which is all a restart needs to refill the largest
+    window.
+
+    Only the segments of the `max_open` symbols logged to most recently are kept open, so
+    the number of file descriptors does not grow with the number of symbols.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        retain: int = WINDOW_SIZES[MAX_K],
+        segment_values: int = WAL_SEGMENT_VALUES,
+        fsync_interval: float = WAL_FSYNC_INTERVAL,
+        max_open: int = WAL_MAX_OPEN_FILES,
+    ):
+        self.directory = Path(directory)
+        self.retain = retain
+        self.segment_values = segment_values
+        self.fsync_interval = fsync_interval
+        self.max_open = max_open
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.logs: Dict[str, SymbolLog] = {
+            unquote(path.name): SymbolLog(path, retain, segment_values)
+            for path in sorted(self.directory.iterdir())
+            if path.is_dir()
+        }
+        self.dirty: Set[str] = set()
+        # Logs with an open segment, least recently appended to first
+        self.open: Dict[str, SymbolLog] = {}
+        self.appended = 0  # Batches logged so far
+        self.durable = 0  # Batches logged before the last commit that finished started
+        # Resolved when the running commit finishes, if anything waits for it
+        self.committed: Optional[asyncio.Future] = None
+        self.failed: List[Path] = []  # Segments of a failed commit, fsynced by the next one
+
+    def append(self, symbol: str, values: np.ndarray) -> None:
+        """Log a batch of values for a symbol. It is durable once the next commit finishes."""
+        log = self.logs.get(symbol)
+        if log is None:
+            # Quoting keeps any symbol a single, safe directory name
+            directory = self.directory / quote(symbol, safe="")
+            log = self.logs[symbol] = SymbolLog(directory, self.retain, self.segment_values)
+        log.append(values)
+        self.appended += 1
+        self.dirty.add(symbol)
+        self.open[symbol] = self.open.pop(symbol, log)
+        if len(self.open) > self.max_open:
+            idle = next(iter(self.open))
+            self.open.pop(idle).close_file()
+
+    async def commit(self) -> None:
+        """
+        Group-commit every batch logged so far: flush the dirty segments on the event loop,
+        which only copies them to the page cache, then fsync them all in a worker thread.
+        """
+        appended = self.appended
+        paths = self.failed + [path for symbol in self.dirty for path in self.logs[symbol].flush()]
+        self.dirty.clear()
+        self.failed = []
+        try:
+            await asyncio.to_thread(_fsync, paths)
+        except BaseException as e:
+            self.failed = paths
+            # Waiters get the error, or if cancelled, wait for the next commit
+            if isinstance(e, Exception) and self.committed is not None:
+                self.committed.set_exception(e)
+                self.committed = None
+            raise
+        self._committed(appended)
+
+    async def synced(self) -> None:
+        """
+        Wait until every batch logged so far is fsynced, by the commits `run` makes.
+
+        Raises the error of a commit that failed meanwhile
+        """
+        appended = self.appended
+        while self.durable < appended:
+            if self.committed is None:
+                self.committed = asyncio.get_running_loop().create_future()
+            # Shielded, so a waiter cancelled does not cancel it for the others
+            await asyncio.shield(self.committed)
+
+    async def run(self) -> None:
+        """Commit every `fsync_interval` seconds, until cancelled."""
+        while True:
+            await asyncio.sleep(self.fsync_interval)
+            try:
+                await self.commit()
+            except OSError as e:
+                # Waiters got the error, and the next commit fsyncs the same segments again
+                logger.error(f"Failed to commit the write-ahead log: {e}")
+
+    def sync(self) -> None:
+        """Flush and fsync every segment written to since the last commit, blocking."""
+        _fsync(self.failed + [path for symbol in self.dirty for path in self.logs[symbol].flush()])
+        self.dirty.clear()
+        self.failed = []
+        self._committed(self.appended)
+
+    def remove(self, symbol: str) -> None:
+        """
+        Delete the log of a symbol, if it has one, so a restart does not bring back the values
+        it held, and values logged later start a new log.
+        """
+        log = self.logs.pop(symbol, None)
+        if log is not None:
+            log.close_file()
+            self.dirty.discard(symbol)
+            self.open.pop(symbol, None)
+            shutil.rmtree(log.directory, ignore_errors=True)
+
+    def _committed(self, appended: int) -> None:
+        """Record that the first `appended` batches are durable, and wake their waiters."""
+        self.durable = max(self.durable, appended)
+        committed, self.committed = self.committed, None
+        if committed is not None:
+            committed.set_result(None)
+
+    def recover(self, symbol: Optional[str] = None) -> Iterator[Tuple[str, List[np.ndarray]]]:
+        """
+        Yield each logged symbol (or only `symbol`) with its last `retain` values, memory-mapped
+        rather than read, as one array per segment in log order.
+        """
+        for name, log in self.logs.items():
+            if symbol is None or name == symbol:
+                yield name, log.tail(self.retain)
+
+    def close(self) -> None:
+        for log in self.logs.values():
+            log.close()
+        self.dirty.clear()
+        self.open.clear()
+
+
+def _fsync(paths: List[Path]) -> None:
+    """
+    Fsync segment files by path, one open at a time, so they need not stay open until then.
+    """
+    for path in paths:
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except FileNotFoundError:
+            continue  # Deleted meanwhile, as older than the retained tail
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
@@ -0,0 +1,117 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from src.buffers import RingBuffer
+from src.checkpoint import Checkpointer
+from src.services import SymbolManager
+
+
+@pytest.mark.asyncio
+async def test_checkpoint_save_and_restore(tmp_path):
+    buffer = RingBuffer(capacity=50)
+    buffer.extend(np.arange(70, dtype=np.float32))  # Wraps around
+    other = RingBuffer(capacity=50)
+    other.extend(np.array([1.5], dtype=np.float32))
+
+    checkpointer = Checkpointer(str(tmp_path), chunk_values=16)
+    await checkpointer.save({"AAPL": buffer, "BRK/A": other})
+
+    restored = dict(Checkpointer(str(tmp_path)).restore())
+    assert set(restored) == {"AAPL", "BRK/A"}
+    (values,) = restored["AAPL"]
+    assert isinstance(values, np.memmap)
+    np.testing.assert_array_equal(values, np.arange(20, 70))
+    np.testing.assert_array_equal(restored["BRK/A"][0], [1.5])
+
+
+@pytest.mark.asyncio
+async def test_checkpoint_replaces_previous(tmp_path):
+    buffer = RingBuffer(capacity=50)
+    checkpointer = Checkpointer(str(tmp_path))
+    buffer.extend(np.arange(10, dtype=np.float32))
+    await checkpointer.save({"AAPL": buffer})
+    buffer.extend(np.arange(10, 15, dtype=np.float32))
+    await checkpointer.save({"AAPL": buffer})
+
+    assert len(list(tmp_path.glob("*.f32"))) == 1
+    ((_, (values,)),) = checkpointer.restore()
+    np.testing.assert_array_equal(values, np.arange(15))
+
+
+def test_checkpoint_restore_without_checkpoint(tmp_path):
+    assert list(Checkpointer(str(tmp_path)).restore()) == []
+
+
+@pytest.mark.asyncio
+async def test_checkpoint_keeps_consistent_part_when_overwritten(tmp_path):
+    buffer = RingBuffer(capacity=64)
+    buffer.extend(np.arange(64, dtype=np.float32))
+    checkpointer = Checkpointer(str(tmp_path), chunk_values=16)
+
+    async def ingest():
+        # Lands while the checkpoint writes its chunks
+        for start in range(64, 64 + 48, 8):
+            buffer.extend(np.arange(start, start + 8, dtype=np.float32))
+            await asyncio.sleep(0)
+
+    await asyncio.gather(checkpointer.save({"AAPL": buffer}), ingest())
+
+    ((_, (values,)),) = checkpointer.restore()
+    # Only the newest values that were not overwritten before being saved are kept
+    assert 0 < len(values) <= 64
+    np.testing.assert_array_equal(values, np.arange(64 - len(values), 64))
+
+
+@pytest.mark.asyncio
+async def test_symbol_manager_checkpoint_and_restore(tmp_path):
+    manager = SymbolManager(checkpointer=Checkpointer(str(tmp_path)))
+    await manager.add_batch("AAPL", [1.0, 2.0, 3.0])
+    await manager.add_batch("MSFT", [10.0])
+    expected = await manager.get_stats("AAPL", 1)
+    await manager.checkpoint()
+
+    restored = SymbolManager(checkpointer=Checkpointer(str(tmp_path)))
+    await restored.restore()
+    assert await restored.get_stats("AAPL", 1) == expected
+    assert (await restored.get_stats("MSFT", 1)).last == 10.0
+
+
+@pytest.mark.asyncio
+async def test_checkpoint_waits_for_symbol_lock(tmp_path):
+    buffer = RingBuffer(capacity=50)
+    buffer.extend(np.arange(10, dtype=np.float32))
+    lock = asyncio.Lock()
+    checkpointer = Checkpointer(str(tmp_path))
+
+    # A batch being applied in a worker thread holds the symbol's lock
+    await lock.acquire()
+    save = asyncio.create_task(checkpointer.save({"AAPL": buffer}, {"AAPL": lock}))
+    await asyncio.sleep(0.05)
+    assert not save.done()
+    buffer.extend(np.arange(10, 15, dtype=np.float32))
+    lock.release()
+    await save
+
+    ((_, (values,)),) = checkpointer.restore()
+    np.testing.assert_array_equal(values, np.arange(10))
+
+
+@pytest.mark.asyncio
+async def test_symbol_manager_restores_without_evicted_symbols(tmp_path):
+    manager = SymbolManager(checkpointer=Checkpointer(str(tmp_path)), memory_budget=1)
+    await manager.add_batch("A", [1.0, 2.0])
+    await manager.checkpoint()
+    await manager.add_batch("B", [3.0])  # Evicts A, which the checkpoint still holds
+
+    restored = SymbolManager(checkpointer=Checkpointer(str(tmp_path)))
+    await restored.restore()
+    assert list(restored.symbols) == []
+
+    # The next checkpoint leaves it out for good
+    await manager.checkpoint()
+    restored = SymbolManager(checkpointer=Checkpointer(str(tmp_path)))
+    await restored.restore()
+    assert list(restored.symbols) == ["B"]
+    assert not (tmp_path / "discarded.txt").exists()
@@ -1,4 +1,15 @@
-from src.exceptions import FinancialServiceError, MaxSymbolsReachedError, SymbolNotFoundError
+from src.exceptions import (
+    EmptyWindowError,
+    FinancialServiceError,
+    ForbiddenError,
+    InvalidBatchError,
+    InvalidWindowError,
+    MaxSymbolsReachedError,
+    NotShardedError,
+    ProfilerUnavailableError,
+    StatsUnavailableError,
+    SymbolNotFoundError,
+)
 
 
 def test_financial_service_error():
@@ -28,3 +39,45 @@ def test_error_inheritance():
 
     assert isinstance(error1, FinancialServiceError)
     assert isinstance(error2, FinancialServiceError)
+
+
+def test_empty_window_error():
+    error = EmptyWindowError("AAPL", 5.0)
+    assert str(error) == "No values for symbol AAPL in the last 5.0 seconds"
+    assert error.status_code == 404
+
+
+def test_invalid_window_error():
+    error = InvalidWindowError("seconds must be positive")
+    assert str(error) == "Invalid window: seconds must be positive"
+    assert error.status_code == 422
+
+
+def test_invalid_batch_error():
+    error = InvalidBatchError("values cannot be empty")
+    assert str(error) == "Invalid batch: values cannot be empty"
+    assert error.status_code == 422
+
+
+def test_stats_unavailable_error():
+    error = StatsUnavailableError("the ingest process is not running")
+    assert str(error) == "Stats unavailable: the ingest process is not running"
+    assert error.status_code == 503
+
+
+def test_forbidden_error():
+    error = ForbiddenError("invalid admin token")
+    assert str(error) == "Forbidden: invalid admin token"
+    assert error.status_code == 403
+
+
+def test_profiler_unavailable_error():
+    error = ProfilerUnavailableError("line_profiler is not installed")
+    assert str(error) == "Profiler unavailable: line_profiler is not installed"
+    assert error.status_code == 503
+
+
+def test_not_sharded_error():
+    error = NotShardedError("symbol IDs are per shard")
+    assert str(error) == "Not available in sharded mode: symbol IDs are per shard"
+    assert error.status_code == 501
@@ -1,9 +1,27 @@
+import asyncio
+
+from concurrent.futures import ThreadPoolExecutor
+
 import httpx
+import numpy as np
 import pytest
 
-from src.constants import MAX_BATCH_SIZE, MAX_K, MAX_SYMBOLS, MIN_K
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from src import main
+from src.constants import (
+    INGEST_ACK_EVERY,
+    INGEST_MAX_IN_FLIGHT,
+    MAX_BATCH_SIZE,
+    MAX_K,
+    MAX_SYMBOLS,
+    MIN_K,
+)
 from src.main import app
 from src.main import symbol_manager as app_symbol_manager
+from src.models import Stats, SymbolStats
+from src.wal import WriteAheadLog
 
 
 @pytest.mark.asyncio
@@ -17,6 +35,75 @@ async def test_add_batch_endpoint_valid():
         assert response.status_code == 201
 
 
+@pytest.mark.asyncio
+async def test_add_batch_endpoint_without_wait():
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as async_client:
+        response = await async_client.post(
+            "/add_batch/?wait=false", json={"symbol": "QUEUED", "values": [1.0, 2.0]}
+        )
+        assert response.status_code == 202
+        assert response.json()["message"] == "Queued batch for symbol: QUEUED"
+
+        response = await async_client.post(
+            "/add_batch/QUEUED?wait=false",
+            content=np.array([3.0]).tobytes(),
+            headers={"Content-Type": "application/octet-stream"},
+        )
+        assert response.status_code == 202
+
+        await app_symbol_manager.flush()
+        response = await async_client.get("/stats/QUEUED/1")
+        assert response.json()["values"] == 3
+
+
+@pytest.mark.asyncio
+async def test_add_batch_endpoints_wait_for_the_wal_commit(tmp_path, monkeypatch):
+    synced = []
+    monkeypatch.setattr("src.wal.os.fsync", synced.append)
+    wal = WriteAheadLog(str(tmp_path), fsync_interval=0.01)
+    monkeypatch.setattr(app_symbol_manager, "wal", wal)
+    commits = asyncio.create_task(wal.run())
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as async_client:
+        requests = [
+            async_client.post("/add_batch/", json={"symbol": "DURABLE", "values": [1.0]}),
+            async_client.post(
+                "/add_batches/", json={"batches": [{"symbol": "DURABLE", "values": [2.0]}]}
+            ),
+            async_client.post("/add_batch/DURABLE", content=np.array([3.0]).tobytes()),
+        ]
+        for request in requests:
+            assert (await request).status_code == 201
+            # Replied to once its batch was fsynced
+            assert wal.durable == wal.appended
+        assert synced
+
+        # Without waiting, the reply does not wait for the commit either
+        commits.cancel()
+        response = await async_client.post(
+            "/add_batch/?wait=false", json={"symbol": "DURABLE", "values": [4.0]}
+        )
+        assert response.status_code == 202
+        await app_symbol_manager.flush()
+        assert wal.durable < wal.appended
+    wal.close()
+
+
+@pytest.mark.asyncio
+async def test_add_batch_endpoint_out_of_float32_range():
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as async_client:
+        response = await async_client.post(
+            "/add_batch/", json={"symbol": "HUGE", "values": [1.0, 1e39]}
+        )
+        assert response.status_code == 422
+        assert (await async_client.get("/stats/HUGE/1")).status_code == 404
+
+
 @pytest.mark.asyncio
 async def test_add_batch_endpoint_invalid_batch_size():
     async with httpx.AsyncClient(
@@ -39,9 +126,11 @@ async def test_get_stats_endpoint_valid():
 
         response = await async_client.get("/stats/AAPL/1")
         assert response.status_code == 200
+        assert response.headers["content-type"] == "application/json"
         data = response.json()
         assert data["min"] == 1.0
         assert data["max"] == 3.0
+        assert set(data) == set(Stats.model_fields)
 
 
 @pytest.mark.asyncio
@@ -90,16 +179,18 @@ async def test_get_stats_endpoint_invalid_k_negative():
 
 
 @pytest.mark.asyncio
-async def test_add_batch_endpoint_max_symbols_error():
+async def test_add_batch_endpoint_max_symbols_error(monkeypatch):
     # Clear the existing symbol_manager
-    app_symbol_manager.symbols.clear()
+    app_symbol_manager.clear()
+    assert app_symbol_manager.max_symbols == MAX_SYMBOLS
+    monkeypatch.setattr(app_symbol_manager, "max_symbols", 10)
 
-    print(f"\nMAX_SYMBOLS = {MAX_SYMBOLS}")
+    print(f"\nmax_symbols = {app_symbol_manager.max_symbols}")
     async with httpx.AsyncClient(
         transport=httpx.ASGITransport(app=app), base_url="http://test"
     ) as async_client:
-        # Add MAX_SYMBOLS (should all succeed)
-        for i in range(MAX_SYMBOLS):
+        # Add max_symbols (should all succeed)
+        for i in range(app_symbol_manager.max_symbols):
             print(f"\nBefore adding TEST{i}, symbols: {list(app_symbol_manager.symbols.keys())}")
             response = await async_client.post(
                 "/add_batch/", json={"symbol": f"TEST{i}", "values": [1.0]}
@@ -112,3 +203,366 @@ async def test_add_batch_endpoint_max_symbols_error():
         response = await async_client.post("/add_batch/", json={"symbol": "EXTRA", "values": [1.0]})
         assert response.status_code == 400
         assert "Maximum number of symbols" in response.json()["detail"]
+
+
+@pytest.mark.asyncio
+async def test_get_window_stats_endpoint_last():
+    app_symbol_manager.clear()
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as async_client:
+        await async_client.post("/add_batch/", json={"symbol": "MSFT", "values": [5.0, 1.0, 3.0]})
+
+        response = await async_client.get("/stats/MSFT", params={"last": 2})
+        assert response.status_code == 200
+        data = response.json()
+        assert data["values"] == 2
+        assert data["min"] == 1.0
+        assert data["max"] == 3.0
+
+
+@pytest.mark.asyncio
+async def test_get_window_stats_endpoint_seconds():
+    app_symbol_manager.clear()
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as async_client:
+        await async_client.post("/add_batch/", json={"symbol": "AMZN", "values": [2.0, 4.0]})
+
+        response = await async_client.get("/stats/AMZN", params={"seconds": 60})
+        assert response.status_code == 200
+        assert response.json()["avg"] == 3.0
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "params", [{}, {"last": 5, "seconds": 1.0}, {"last": 0}, {"last": 10**9}, {"seconds": 0}]
+)
+async def test_get_window_stats_endpoint_invalid_window(params):
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as async_client:
+        response = await async_client.get("/stats/AAPL", params=params)
+        assert response.status_code == 422
+        assert "Invalid window" in response.json()["detail"]
+
+
+@pytest.mark.asyncio
+async def test_get_window_stats_endpoint_invalid_symbol():
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as async_client:
+        response = await async_client.get("/stats/NOSUCH", params={"last": 5})
+        assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("dtype", ["float32", "float64"])
+async def test_add_binary_batch_endpoint(dtype):
+    app_symbol_manager.clear()
+    values = np.array([1.0, 2.5, 4.0], dtype=dtype)
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as async_client:
+        response = await async_client.post(
+            "/add_batch/IBM",
+            params={"dtype": dtype},
+            content=values.astype(values.dtype.newbyteorder("<")).tobytes(),
+            headers={"Content-Type": "application/octet-stream"},
+        )
+        assert response.status_code == 201
+
+        data = (await async_client.get("/stats/IBM/1")).json()
+        assert data["values"] == 3
+        assert data["max"] == 4.0
+        assert data["avg"] == pytest.approx(2.5)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "body, params",
+    [
+        (b"", {}),
+        (b"\x00" * 7, {}),
+        (np.array([1.0, np.nan]).tobytes(), {}),
+        (np.array([1.0, 1e39]).tobytes(), {}),
+        (np.ones(MAX_BATCH_SIZE + 1).tobytes(), {}),
+        (np.ones(2).tobytes(), {"dtype": "int64"}),
+    ],
+)
+async def test_add_binary_batch_endpoint_invalid(body, params):
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as async_client:
+        response = await async_client.post("/add_batch/IBM", params=params, content=body)
+        assert response.status_code == 422
+        assert response.json()["detail"].startswith("Invalid batch")
+
+
+@pytest.mark.asyncio
+async def test_add_batches_endpoint():
+    app_symbol_manager.clear()
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as async_client:
+        response = await async_client.post(
+            "/add_batches/",
+            json={
+                "batches": [
+                    {"symbol": "AAPL", "values": [1.0, 2.0]},
+                    {"symbol": "MSFT", "values": [5.0]},
+                    {"symbol": "AAPL", "values": [3.0]},
+                ]
+            },
+        )
+        assert response.status_code == 201
+        assert response.json()["message"] == "Added 3 batches for symbols: AAPL, MSFT"
+
+        data = (await async_client.get("/stats/AAPL/1")).json()
+        assert data["values"] == 3
+        assert data["last"] == 3.0
+
+
+@pytest.mark.asyncio
+async def test_add_batches_endpoint_keeps_arrival_order(monkeypatch):
+    app_symbol_manager.clear()
+    # Batches are applied in worker threads, so a bulk batch could overtake queued ones
+    monkeypatch.setattr(app_symbol_manager, "executor", ThreadPoolExecutor(4))
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as async_client:
+        big = np.arange(10000, dtype=np.float64)
+        for values in (big, [1.0]):
+            response = await async_client.post(
+                "/add_batch/?wait=false", json={"symbol": "ORDER", "values": list(values)}
+            )
+            assert response.status_code == 202
+        response = await async_client.post(
+            "/add_batches/?wait=false",
+            json={
+                "batches": [
+                    {"symbol": "ORDER", "values": [2.0]},
+                    {"symbol": "OTHER", "values": [1.0]},
+                    {"symbol": "ORDER", "values": [3.0]},
+                ]
+            },
+        )
+        assert response.status_code == 202
+        assert response.json()["message"] == "Queued 3 batches for symbols: ORDER, OTHER"
+        response = await async_client.post(
+            "/add_batches/", json={"batches": [{"symbol": "ORDER", "values": [4.0]}]}
+        )
+        assert response.status_code == 201
+        response = await async_client.post("/add_batch/", json={"symbol": "ORDER", "values": [5.0]})
+        assert response.status_code == 201
+
+    buffer = app_symbol_manager.symbols["ORDER"].buffer
+    np.testing.assert_array_equal(buffer.last(6), [9999.0, 1.0, 2.0, 3.0, 4.0, 5.0])
+    app_symbol_manager.executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_add_batches_endpoint_invalid():
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as async_client:
+        response = await async_client.post("/add_batches/", json={"batches": []})
+        assert response.status_code == 422
+
+        response = await async_client.post(
+            "/add_batches/", json={"batches": [{"symbol": "", "values": [1.0]}]}
+        )
+        assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_get_multi_stats_endpoint():
+    app_symbol_manager.clear()
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as async_client:
+        await async_client.post("/add_batch/", json={"symbol": "AAPL", "values": [1.0, 2.0]})
+        await async_client.post("/add_batch/", json={"symbol": "MSFT", "values": [3.0]})
+
+        response = await async_client.get("/stats")
+        assert response.status_code == 200
+        data = response.json()
+        assert set(data) == {"AAPL", "MSFT"}
+        assert len(data["AAPL"]["stats"]) == MAX_K - MIN_K + 1
+        SymbolStats.model_validate(data["AAPL"])
+
+        response = await async_client.get("/stats", params={"symbol": ["MSFT"], "k": [1, 3]})
+        data = response.json()
+        assert list(data) == ["MSFT"]
+        assert set(data["MSFT"]["stats"]) == {"1", "3"}
+        assert data["MSFT"]["stats"]["3"]["last"] == 3.0
+
+
+@pytest.mark.asyncio
+async def test_get_multi_stats_endpoint_invalid_k():
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as async_client:
+        response = await async_client.get("/stats", params={"k": [1, MAX_K + 1]})
+        assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_symbol_id_endpoints():
+    app_symbol_manager.clear()
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as async_client:
+        await async_client.post("/add_batch/", json={"symbol": "BYID", "values": [1.0, 2.0]})
+        ids = (await async_client.get("/symbols")).json()
+        assert list(ids) == ["BYID"]
+
+        response = await async_client.get(f"/stats/by-id/{ids['BYID']}/1")
+        assert response.status_code == 200
+        assert response.json() == (await async_client.get("/stats/BYID/1")).json()
+
+        response = await async_client.get("/stats/by-id/100000/1")
+        assert response.status_code == 404
+        response = await async_client.get(f"/stats/by-id/{ids['BYID']}/9")
+        assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint():
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as async_client:
+        await async_client.post("/add_batch/", json={"symbol": "METRICS", "values": [1.0]})
+        await async_client.get("/stats/METRICS/1")
+        response = await async_client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        text = response.text
+        assert 'fds_batches_total{symbol="METRICS"} 1' in text
+        assert 'fds_trades_total{symbol="METRICS"} 1' in text
+        for phase in ("parse", "lock_wait", "update", "serialize"):
+            count = f'fds_add_batch_phase_seconds_count{{phase="{phase}"}} '
+            assert int(text.split(count)[1].split("\n")[0]) >= 1
+        assert int(text.split("fds_get_stats_seconds_count ")[1].split("\n")[0]) >= 1
+
+
+def test_stream_stats_endpoint():
+    app_symbol_manager.clear()
+    with TestClient(app) as client:
+        client.post("/add_batch/", json={"symbol": "AAPL", "values": [1.0, 2.0]})
+        with client.websocket_connect("/ws/stats?symbol=AAPL&k=1&interval=0") as websocket:
+            data = websocket.receive_json()
+            assert data["AAPL"]["stats"]["1"]["last"] == 2.0
+
+            client.post("/add_batch/", json={"symbol": "AAPL", "values": [5.0]})
+            data = websocket.receive_json()
+            assert data["AAPL"]["version"] == 2
+            assert data["AAPL"]["stats"]["1"]["last"] == 5.0
+
+
+def test_stream_stats_endpoint_invalid_k():
+    with TestClient(app) as client:
+        with pytest.raises(WebSocketDisconnect) as exc_info:
+            with client.websocket_connect(f"/ws/stats?k={MAX_K + 1}") as websocket:
+                websocket.receive_json()
+        assert exc_info.value.code == 1008
+
+
+def ingest_frame(symbol: str, values) -> bytes:
+    encoded = symbol.encode()
+    return bytes([len(encoded)]) + encoded + np.asarray(values, dtype="<f8").tobytes()
+
+
+def test_stream_ingest_endpoint():
+    app_symbol_manager.clear()
+    with TestClient(app) as client:
+        with client.websocket_connect("/ws/ingest") as websocket:
+            assert websocket.receive_json() == {
+                "ack_every": INGEST_ACK_EVERY,
+                "max_in_flight": INGEST_MAX_IN_FLIGHT,
+            }
+            websocket.send_bytes(ingest_frame("AAPL", [1.0, 2.0]))
+            websocket.send_text('{"symbol": "MSFT", "values": [3.0]}')
+            websocket.send_bytes(ingest_frame("AAPL", [np.inf]))
+            assert websocket.receive_json() == {
+                "error": "Invalid batch: all values must be finite numbers",
+                "batch": 3,
+            }
+            websocket.send_text('{"symbol": "", "values": [3.0]}')
+            assert websocket.receive_json()["batch"] == 4
+            websocket.send_text("flush")
+            assert websocket.receive_json() == {"ack": 4}
+
+            for value in range(INGEST_ACK_EVERY - 4):
+                websocket.send_bytes(ingest_frame("AAPL", [float(value)]))
+            assert websocket.receive_json() == {"ack": INGEST_ACK_EVERY}
+
+        data = client.get("/stats/AAPL/8").json()
+        assert data["values"] == INGEST_ACK_EVERY - 2
+        assert client.get("/stats/MSFT/1").json()["last"] == 3.0
+
+        # Frames can name their symbol by ID
+        symbol_id = client.get("/symbols").json()["MSFT"]
+        with client.websocket_connect("/ws/ingest") as websocket:
+            websocket.receive_json()
+            frame = b"\x00" + symbol_id.to_bytes(4, "little")
+            websocket.send_bytes(frame + np.array([4.0], dtype="<f8").tobytes())
+            unknown = b"\x00" + (100000).to_bytes(4, "little")
+            websocket.send_bytes(unknown + np.array([5.0], dtype="<f8").tobytes())
+            assert websocket.receive_json() == {"error": "Symbol #100000 not found", "batch": 2}
+            websocket.send_text("flush")
+            assert websocket.receive_json() == {"ack": 2}
+        assert client.get("/stats/MSFT/1").json()["last"] == 4.0
+
+
+@pytest.mark.asyncio
+async def test_profile_endpoint_forbidden(monkeypatch):
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as async_client:
+        monkeypatch.setattr(main, "admin_token", None)
+        response = await async_client.post("/admin/profile?seconds=0.01")
+        assert response.status_code == 403
+
+        monkeypatch.setattr(main, "admin_token", "secret")
+        response = await async_client.post(
+            "/admin/profile?seconds=0.01", headers={"X-Admin-Token": "wrong"}
+        )
+        assert response.status_code == 403
+
+
+@pytest.mark.asyncio
+async def test_profile_endpoint(monkeypatch):
+    monkeypatch.setattr(main, "admin_token", "secret")
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as async_client:
+        headers = {"X-Admin-Token": "secret"}
+        response = await async_client.post(
+            "/admin/profile?seconds=0.1&interval=0.001", headers=headers
+        )
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        # The event loop was sampled while it waited for the session to end
+        assert "MainThread;" in response.text
+
+        response = await async_client.post(
+            "/admin/profile?seconds=0.05&interval=0.001&format=prof", headers=headers
+        )
+        assert response.status_code == 200
+        assert "profile.prof" in response.headers["content-disposition"]
+        assert response.content
+
+        response = await async_client.post(
+            "/admin/profile?seconds=0.05&format=html", headers=headers
+        )
+        assert response.status_code == 422
+
+        # One session at a time
+        first = asyncio.create_task(
+            async_client.post("/admin/profile?seconds=0.2", headers=headers)
+        )
+        await asyncio.sleep(0.05)
+        response = await async_client.post("/admin/profile?seconds=0.01", headers=headers)
+        assert response.status_code == 503
+        assert (await first).status_code == 200
@@ -0,0 +1,69 @@
+import itertools
+import threading
+
+import numpy as np
+import pytest
+
+from src.constants import MIN_K
+from src.metrics import BUCKET_BOUNDS, BUCKETS, LatencyHistogram, bucket, render
+from src.services import SymbolManager
+
+
+def test_bucket_bounds():
+    assert bucket(0) == 0
+    assert bucket(BUCKET_BOUNDS[0]) == 1
+    for index, bound in enumerate(BUCKET_BOUNDS):
+        # A bucket holds durations up to and excluding its bound
+        assert bucket(bound - 1) == index
+        assert bucket(bound) == index + 1
+    assert bucket(BUCKET_BOUNDS[-1] * 100) == BUCKETS - 1
+    # Every bucket is at most 50% wider than its lower bound
+    for low, high in itertools.pairwise(BUCKET_BOUNDS):
+        assert high <= 1.5 * low
+
+
+def test_latency_histogram_sums_threads():
+    histogram = LatencyHistogram()
+    histogram.record(5_000)
+
+    def record():
+        for _ in range(100):
+            histogram.record(5_000)
+
+    threads = [threading.Thread(target=record) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    counts = histogram.snapshot()
+    assert len(counts) == BUCKETS + 1
+    assert counts[bucket(5_000)] == 401
+    assert sum(counts[:-1]) == 401
+    assert counts[-1] == 401 * 5_000
+
+
+def test_latency_histogram_empty():
+    assert LatencyHistogram().snapshot() == [0] * (BUCKETS + 1)
+
+
+@pytest.mark.asyncio
+async def test_render():
+    symbol_manager = SymbolManager()
+    await symbol_manager.submit("AAPL", np.arange(20.0))
+    await symbol_manager.add_batches([("AAPL", np.array([1.0])), ('A"B', np.array([2.0]))])
+    text = render(symbol_manager)
+
+    assert "# TYPE fds_add_batch_phase_seconds histogram" in text
+    assert 'fds_add_batch_phase_seconds_bucket{phase="update",le="+Inf"}' in text
+    assert "fds_get_stats_seconds_count " in text
+    assert 'fds_batches_total{symbol="AAPL"} 2' in text
+    assert 'fds_batches_total{symbol="A\\"B"} 1' in text
+    assert 'fds_updates_total{symbol="AAPL"} 2' in text
+    assert 'fds_trades_total{symbol="AAPL"} 21' in text
+    assert f'fds_window_fill_ratio{{symbol="AAPL",k="{MIN_K}"}} 1' in text
+    assert f'fds_window_fill_ratio{{symbol="AAPL",k="{MIN_K + 1}"}} 0.21' in text
+    # Every sample line is a name, optional labels and a number
+    for line in text.splitlines():
+        if not line.startswith("#"):
+            float(line.rsplit(" ", 1)[1])
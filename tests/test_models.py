@@ -1,9 +1,17 @@
+import numpy as np
 import pytest
 
 from pydantic import ValidationError
 
-from src.constants import MAX_BATCH_SIZE
-from src.models import BatchData, Stats
+from src.constants import MAX_BATCH_SIZE, MAX_BULK_BATCHES
+from src.exceptions import InvalidBatchError
+from src.models import (
+    BatchData,
+    BulkBatchData,
+    Stats,
+    decode_binary_batch,
+    decode_ingest_frame,
+)
 
 
 def test_batch_data_valid():
@@ -108,3 +116,61 @@ def test_batch_data_empty_symbol():
     error = exc_info.value.errors()[0]
     assert error["loc"] == ("symbol",)
     assert "Symbol cannot be empty" in error["msg"]
+
+
+def test_batch_data_array():
+    batch = BatchData(symbol="AAPL", values=[1, 2.5, "3"])
+    assert batch.values == [1.0, 2.5, 3.0]
+    assert batch.array.dtype == np.float32
+    np.testing.assert_array_equal(batch.array, [1.0, 2.5, 3.0])
+    assert "_array" not in batch.model_dump()
+
+
+def test_batch_data_validation_nan():
+    with pytest.raises(ValidationError) as exc_info:
+        BatchData(symbol="AAPL", values=[1.0, float("nan")])
+    assert exc_info.value.errors()[0]["loc"] == ("values",)
+
+
+def test_batch_data_validation_out_of_float32_range():
+    # Finite as float64, but infinite once stored as float32
+    with pytest.raises(ValidationError) as exc_info:
+        BatchData(symbol="AAPL", values=[1.0, 1e39])
+    assert exc_info.value.errors()[0]["loc"] == ("values",)
+    with pytest.raises(InvalidBatchError):
+        decode_binary_batch(np.array([1.0, -1e39], dtype="<f8").tobytes(), "float64")
+    values = decode_binary_batch(np.array([3.0e38], dtype="<f8").tobytes(), "float64")
+    assert values.dtype == np.float32
+
+
+def test_bulk_batch_data_limits():
+    with pytest.raises(ValidationError) as exc_info:
+        BulkBatchData(batches=[])
+    assert "Batches cannot be empty" in str(exc_info.value)
+
+    batches = [{"symbol": "AAPL", "values": [1.0]}] * (MAX_BULK_BATCHES + 1)
+    with pytest.raises(ValidationError) as exc_info:
+        BulkBatchData(batches=batches)
+    assert f"Bulk size cannot exceed {MAX_BULK_BATCHES} batches" in str(exc_info.value)
+
+
+def test_decode_ingest_frame():
+    frame = bytes([4]) + b"AAPL" + np.array([1.5, 2.0], dtype="<f8").tobytes()
+    symbol, values = decode_ingest_frame(frame)
+    assert symbol == "AAPL"
+    np.testing.assert_array_equal(values, [1.5, 2.0])
+
+
+def test_decode_ingest_frame_with_symbol_id():
+    frame = b"\x00" + (258).to_bytes(4, "little") + np.array([1.5], dtype="<f8").tobytes()
+    symbol_id, values = decode_ingest_frame(frame)
+    assert symbol_id == 258
+    np.testing.assert_array_equal(values, [1.5])
+
+
+@pytest.mark.parametrize(
+    "frame", [b"", b"\x00" + b"\x00" * 8, b"\x00\x01", b"\x05AAPL", b"\x02\xff\xfe"]
+)
+def test_decode_ingest_frame_invalid(frame):
+    with pytest.raises(InvalidBatchError):
+        decode_ingest_frame(frame)
@@ -0,0 +1,51 @@
+import pstats
+import tempfile
+import threading
+import time
+
+from src.profiler import SamplingProfiler
+
+
+def spin(stop: threading.Event) -> None:
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def profile_spin(seconds: float = 0.2) -> SamplingProfiler:
+    stop = threading.Event()
+    thread = threading.Thread(target=spin, args=(stop,), name="spinner")
+    thread.start()
+    profiler = SamplingProfiler(0.001)
+    profiler.start()
+    time.sleep(seconds)
+    profiler.stop()
+    stop.set()
+    thread.join()
+    return profiler
+
+
+def test_sampling_profiler_collapsed():
+    profiler = profile_spin()
+    lines = profiler.collapsed().splitlines()
+    spinner = [line for line in lines if line.startswith("spinner;")]
+    assert spinner
+    stack, count = spinner[0].rsplit(" ", 1)
+    assert int(count) > 0
+    # Root first: the thread, then its run() down to the sampled function
+    assert stack.split(";")[-1].startswith("spin (test_profiler.py:")
+    # The profiler never samples its own thread
+    assert not any(line.startswith("profiler;") for line in lines)
+
+
+def test_sampling_profiler_pstats():
+    profiler = profile_spin()
+    with tempfile.NamedTemporaryFile(suffix=".prof") as file:
+        file.write(profiler.pstats())
+        file.flush()
+        stats = pstats.Stats(file.name).stats
+
+    spin_stats = next(value for key, value in stats.items() if key[2] == "spin")
+    calls, _, own, cumulative, callers = spin_stats
+    assert calls > 0
+    assert 0 < own <= cumulative
+    assert any(caller[2] == "run" for caller in callers)
@@ -0,0 +1,64 @@
+import sys
+
+import pytest
+
+from src.constants import SYMBOL_ID_BYTES
+from src.exceptions import MaxSymbolsReachedError
+from src.registry import SymbolRegistry
+
+
+def test_registry_assigns_ids_in_order():
+    registry = SymbolRegistry()
+    aapl = registry.register("AAPL")
+    msft = registry.register("MSFT")
+    assert (aapl.id, msft.id) == (0, 1)
+    assert registry.register("AAPL") is aapl
+    assert registry.get("MSFT") is msft
+    assert registry.by_id(1) is msft
+    assert [state.name for state in registry] == ["AAPL", "MSFT"]
+
+
+def test_registry_interns_names():
+    registry = SymbolRegistry()
+    name = "".join(["AA", "PL"])
+    assert registry.register(name).name is sys.intern(name)
+
+
+def test_registry_lookups_of_unknown_symbols_leave_nothing_behind():
+    registry = SymbolRegistry()
+    registry.register("AAPL")
+    assert registry.get("MSFT") is None
+    assert registry.by_id(1) is None
+    assert registry.by_id(-1) is None
+    assert len(registry) == 1
+    assert registry.ids == {"AAPL": 0}
+
+
+def test_registry_reuses_slots_of_removed_symbols():
+    registry = SymbolRegistry(capacity=2)
+    aapl = registry.register("AAPL")
+    registry.register("MSFT")
+    registry.remove("AAPL")
+    registry.remove("UNKNOWN")
+    assert registry.get("AAPL") is None
+    assert registry.by_id(aapl.id) is None
+    assert [state.name for state in registry] == ["MSFT"]
+
+    # The slot goes to the next symbol, with an ID the old one does not match
+    goog = registry.register("GOOG")
+    assert goog.id != aapl.id
+    assert goog.id & registry.slot_mask == aapl.id & registry.slot_mask
+    assert registry.by_id(goog.id) is goog
+    assert registry.by_id(aapl.id) is None
+    assert len(registry.states) == 2
+    assert goog.id < 2 ** (8 * SYMBOL_ID_BYTES)
+
+
+def test_registry_limits_slots():
+    registry = SymbolRegistry(capacity=1)
+    registry.register("AAPL")
+    registry.register("MSFT")
+    with pytest.raises(MaxSymbolsReachedError):
+        registry.register("GOOG")
+    registry.remove("AAPL")
+    assert registry.register("GOOG").name == "GOOG"
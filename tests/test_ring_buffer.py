@@ -0,0 +1,200 @@
+import numpy as np
+import pytest
+
+from src.buffers import BlockIndex, RingBuffer, TimeIndex
+
+
+def test_ring_buffer_initialization():
+    buffer = RingBuffer(capacity=5)
+    assert buffer.capacity == 5
+    assert buffer.count == 0
+    assert len(buffer) == 0
+    assert buffer.data.dtype == np.float32
+    assert len(buffer.last(3)) == 0
+
+
+def test_ring_buffer_append_and_last():
+    buffer = RingBuffer(capacity=3)
+    for value in [1.0, 2.0, 3.0, 4.0]:
+        buffer.append(value)
+
+    assert buffer.count == 4
+    assert len(buffer) == 3
+    assert list(buffer.last(3)) == [2.0, 3.0, 4.0]
+    assert list(buffer.last(2)) == [3.0, 4.0]
+    assert buffer.value_at(0) == 4.0
+    assert buffer.value_at(2) == 2.0
+
+
+def test_ring_buffer_extend_wraps_around():
+    buffer = RingBuffer(capacity=4)
+    buffer.extend(np.array([1.0, 2.0, 3.0], dtype=np.float32))
+    buffer.extend(np.array([4.0, 5.0], dtype=np.float32))
+
+    assert buffer.count == 5
+    assert list(buffer.last(4)) == [2.0, 3.0, 4.0, 5.0]
+
+
+def test_ring_buffer_extend_larger_than_capacity():
+    buffer = RingBuffer(capacity=3)
+    buffer.append(0.0)
+    buffer.extend(np.arange(1.0, 8.0, dtype=np.float32))
+
+    assert buffer.count == 8
+    assert list(buffer.last(3)) == [5.0, 6.0, 7.0]
+    assert buffer.value_at(0) == 7.0
+
+
+def test_ring_buffer_last_is_view_when_contiguous():
+    buffer = RingBuffer(capacity=10)
+    buffer.extend(np.arange(5, dtype=np.float32))
+    assert np.shares_memory(buffer.last(3), buffer.data)
+
+
+def test_ring_buffer_grows_to_capacity():
+    rng = np.random.default_rng(3)
+    values = rng.normal(size=300).astype(np.float32)
+    buffer = RingBuffer(capacity=100, block_size=4, initial_capacity=8)
+    assert len(buffer.data) == 8
+
+    buffer.extend(values[:10])
+    assert len(buffer.data) == 16
+    buffer.append(values[10])
+    buffer.extend(values[11:60])
+    assert len(buffer.data) == 60  # Enough for the batch, if more than double
+    (n, total, _), lowest, highest = buffer.summary(5, 60)
+    assert n == 55
+    assert total == pytest.approx(values[5:60].sum(), rel=1e-5)
+    assert (lowest, highest) == (values[5:60].min(), values[5:60].max())
+
+    # Never past the capacity, and wrapping as usual once there
+    buffer.extend(values[60:])
+    assert len(buffer.data) == 100
+    np.testing.assert_array_equal(buffer.last(100), values[-100:])
+    assert buffer.min_max(250, 300) == (values[250:].min(), values[250:].max())
+
+
+def test_ring_buffer_spill_and_unspill(tmp_path):
+    buffer = RingBuffer(capacity=8, block_size=2)
+    buffer.extend(np.arange(10, dtype=np.float32))
+    in_memory = buffer.nbytes
+
+    path = tmp_path / "spilled.f32"
+    buffer.spill(path)
+    assert path.exists()
+    assert buffer.nbytes == in_memory - buffer.data.nbytes
+    # Still readable from the file
+    assert list(buffer.last(3)) == [7.0, 8.0, 9.0]
+    assert buffer.min_max(2, 10) == (2.0, 9.0)
+
+    # The next write moves the values back into memory
+    buffer.append(10.0)
+    assert not path.exists()
+    assert buffer.nbytes == in_memory
+    assert list(buffer.last(8)) == [float(v) for v in range(3, 11)]
+    assert buffer.min_max(3, 11) == (3.0, 10.0)
+
+
+def test_block_index_matches_brute_force():
+    rng = np.random.default_rng(7)
+    data = rng.uniform(-100.0, 100.0, 1000).astype(np.float32)
+    index = BlockIndex(data, block_size=4)
+    index.update(0, len(data))
+    assert len(index.moments) == 4  # 250, 63, 16, 4 blocks
+
+    for _ in range(200):
+        first, last = sorted(rng.integers(0, len(data) + 1, size=2))
+        if first == last:
+            continue
+        assert index.min_max([(first, last)]) == (data[first:last].min(), data[first:last].max())
+
+
+def test_block_index_partial_update():
+    data = np.zeros(100, dtype=np.float32)
+    index = BlockIndex(data, block_size=4)
+    index.update(0, 100)
+
+    data[37:41] = [5.0, -3.0, 9.0, 1.0]
+    index.update(37, 41)
+    assert index.min_max([(0, 100)]) == (-3.0, 9.0)
+    assert index.min_max([(40, 100)]) == (0.0, 1.0)
+
+
+def test_ring_buffer_min_max_across_wrap():
+    buffer = RingBuffer(capacity=50, block_size=4)
+    values = np.arange(80, dtype=np.float32)
+    buffer.extend(values[:45])
+    buffer.extend(values[45:])  # Wraps around the end of the array
+
+    for start, stop in [(30, 80), (45, 52), (79, 80), (31, 77)]:
+        assert buffer.min_max(start, stop) == (start, stop - 1)
+
+
+def test_block_index_summary_matches_brute_force():
+    rng = np.random.default_rng(5)
+    data = rng.normal(100.0, 3.0, 1000).astype(np.float32)
+    index = BlockIndex(data, block_size=4)
+    index.update(0, len(data))
+
+    for _ in range(200):
+        first, last = sorted(rng.integers(0, len(data) + 1, size=2))
+        if first == last:
+            continue
+        window = data[first:last].astype(np.float64)
+        (n, total, m2), lowest, highest = index.summary([(first, last)])
+        assert n == len(window)
+        assert total == pytest.approx(window.sum(), rel=1e-12)
+        assert m2 / n == pytest.approx(window.var(), rel=1e-9)
+        assert (lowest, highest) == (window.min(), window.max())
+
+
+def test_ring_buffer_summary_after_overwrites():
+    rng = np.random.default_rng(9)
+    buffer = RingBuffer(capacity=300, block_size=4)
+    history = []
+    for size in [50, 120, 7, 300, 1, 99, 64]:
+        batch = rng.uniform(0.0, 10.0, size).astype(np.float32)
+        buffer.extend(batch)
+        history.extend(batch)
+
+    window = np.array(history[-250:], dtype=np.float64)
+    (n, total, m2), lowest, highest = buffer.summary(buffer.count - 250, buffer.count)
+    assert n == 250
+    assert total == pytest.approx(window.sum(), rel=1e-12)
+    assert m2 / n == pytest.approx(window.var(), rel=1e-9)
+    assert (lowest, highest) == (window.min(), window.max())
+
+
+def test_time_index_start_since():
+    times = TimeIndex(initial_size=2)
+    for end, timestamp in [(10, 100.0), (15, 101.0), (40, 102.5), (41, 104.0)]:
+        times.record(end, timestamp)
+
+    assert len(times) == 4
+    assert times.start_since(99.0) == 0
+    assert times.start_since(101.0) == 10
+    assert times.start_since(102.0) == 15
+    assert times.start_since(104.0) == 40
+    assert times.start_since(105.0) == 41
+
+
+def test_time_index_trim():
+    times = TimeIndex(initial_size=2)
+    for end, timestamp in [(10, 100.0), (15, 101.0), (40, 102.5)]:
+        times.record(end, timestamp)
+
+    times.trim(12)  # Only the first batch is entirely evicted
+    assert len(times) == 2
+    assert times.start_since(0.0) == 10
+
+    for i in range(10):
+        times.record(50 + i, 103.0 + i)
+    assert len(times) == 12
+    assert times.start_since(108.0) == 54
+
+
+def test_time_index_clock_going_backwards():
+    times = TimeIndex()
+    times.record(10, 100.0)
+    times.record(20, 99.0)
+    assert times.start_since(100.0) == 0
@@ -0,0 +1,177 @@
+import importlib.util
+
+import httpx
+import pytest
+
+from src.constants import EVICTED_HEADER, MAX_SYMBOLS, STATS_SHM_ENV
+from src.services import SymbolManager
+from src.sharding import ShardRouter, create_router_app, main, shard_for
+
+SHARDS = 3
+SYMBOLS = ["AAPL", "GOOGL", "MSFT", "AMZN", "TSLA", "FB"]
+
+
+def load_shard():
+    """A separate instance of src.main, with its own SymbolManager, standing in for a worker."""
+    spec = importlib.util.find_spec("src.main")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def shards():
+    return [load_shard() for _ in range(SHARDS)]
+
+
+@pytest.fixture
+def router(shards):
+    return ShardRouter(
+        [
+            httpx.AsyncClient(transport=httpx.ASGITransport(app=shard.app), base_url="http://shard")
+            for shard in shards
+        ]
+    )
+
+
+@pytest.fixture
+def client(router):
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=create_router_app(router)), base_url="http://test"
+    )
+
+
+def test_shard_for_is_stable_and_in_range():
+    assert [shard_for(symbol, SHARDS) for symbol in SYMBOLS] == [
+        shard_for(symbol, SHARDS) for symbol in SYMBOLS
+    ]
+    assert {shard_for(symbol, SHARDS) for symbol in SYMBOLS} <= set(range(SHARDS))
+    assert shard_for("AAPL", 1) == 0
+
+
+@pytest.mark.asyncio
+async def test_router_routes_symbols_to_their_shard(shards, client):
+    async with client:
+        for i, symbol in enumerate(SYMBOLS):
+            response = await client.post(
+                "/add_batch/", json={"symbol": symbol, "values": [float(i), 1.0]}
+            )
+            assert response.status_code == 201
+
+        for i, symbol in enumerate(SYMBOLS):
+            owner = shard_for(symbol, SHARDS)
+            for index, shard in enumerate(shards):
+                assert (symbol in shard.symbol_manager.symbols) == (index == owner)
+            data = (await client.get(f"/stats/{symbol}/1")).json()
+            assert data["min"] == min(float(i), 1.0)
+
+        response = await client.get("/stats/AAPL", params={"last": 1})
+        assert response.json()["values"] == 1
+        assert (await client.get("/stats/NOSUCH/1")).status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_router_splits_bulk_batches_and_merges_stats(shards, client):
+    async with client:
+        batches = [{"symbol": symbol, "values": [1.0, 2.0]} for symbol in SYMBOLS]
+        response = await client.post("/add_batches/", json={"batches": batches})
+        assert response.status_code == 201
+        assert response.json()["message"].endswith(", ".join(SYMBOLS))
+
+        data = (await client.get("/stats", params={"k": [1]})).json()
+        assert set(data) == set(SYMBOLS)
+        data = (await client.get("/stats", params={"symbol": ["MSFT", "AAPL"]})).json()
+        assert list(data) == ["MSFT", "AAPL"]
+
+        response = await client.post(
+            "/add_batches/", params={"wait": "false"}, json={"batches": batches}
+        )
+        assert response.status_code == 202
+        assert response.json()["message"].startswith("Queued 6 batches")
+        for shard in shards:
+            await shard.symbol_manager.flush()
+        assert (await client.get("/stats/AAPL/1")).json()["values"] == 4
+
+        assert (await client.post("/add_batches/", json={"batches": []})).status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_router_enforces_max_symbols_across_shards(router, client):
+    assert router.max_symbols == MAX_SYMBOLS
+    router.max_symbols = 10
+    async with client:
+        for i in range(router.max_symbols):
+            response = await client.post("/add_batch/", json={"symbol": f"S{i}", "values": [1.0]})
+            assert response.status_code == 201
+
+        response = await client.post("/add_batch/", json={"symbol": "EXTRA", "values": [1.0]})
+        assert response.status_code == 400
+        assert "Maximum number of symbols" in response.json()["detail"]
+
+
+@pytest.mark.asyncio
+async def test_router_forgets_symbols_evicted_by_shards(shards, router, client):
+    for shard in shards:
+        # Every batch of a new symbol evicts the one the shard held
+        shard.symbol_manager = SymbolManager(memory_budget=1)
+    router.max_symbols = SHARDS + 1
+    async with client:
+        for i in range(4 * SHARDS):
+            response = await client.post("/add_batch/", json={"symbol": f"S{i}", "values": [1.0]})
+            assert response.status_code == 201
+            assert EVICTED_HEADER not in response.headers
+            held = {symbol for shard in shards for symbol in shard.symbol_manager.symbols}
+            assert router.symbols == held
+
+
+@pytest.mark.asyncio
+async def test_router_leaves_max_symbols_to_shards_with_a_budget(shards, router, client):
+    for shard in shards:
+        # New symbols past the shard's limit evict the least recently used one
+        shard.symbol_manager = SymbolManager(memory_budget=2**30, max_symbols=1)
+    router.max_symbols = None
+    async with client:
+        for i in range(4 * SHARDS):
+            response = await client.post("/add_batch/", json={"symbol": f"S{i}", "values": [1.0]})
+            assert response.status_code == 201
+        held = {symbol for shard in shards for symbol in shard.symbol_manager.symbols}
+        assert len(held) <= SHARDS
+        assert router.symbols == held
+
+
+@pytest.mark.asyncio
+async def test_router_releases_symbols_of_rejected_batches(router, client):
+    async with client:
+        response = await client.post("/add_batch/", json={"symbol": "AAPL", "values": []})
+        assert response.status_code == 422
+        assert router.symbols == set()
+
+        response = await client.post("/add_batch/", content=b"not json")
+        assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_router_learns_existing_symbols(shards, router):
+    await shards[shard_for("AAPL", SHARDS)].symbol_manager.add_batch("AAPL", [1.0])
+    await router.sync_symbols()
+    assert router.symbols == {"AAPL"}
+
+
+@pytest.mark.asyncio
+async def test_router_rejects_per_process_endpoints(client):
+    async with client:
+        for method, path in [
+            ("GET", "/symbols"),
+            ("GET", "/stats/by-id/0/1"),
+            ("GET", "/metrics"),
+            ("POST", "/admin/profile"),
+        ]:
+            response = await client.request(method, path)
+            assert response.status_code == 501
+            assert response.json()["detail"].startswith("Not available in sharded mode")
+
+
+def test_main_refuses_shared_stats(monkeypatch):
+    monkeypatch.setenv(STATS_SHM_ENV, "stats")
+    with pytest.raises(SystemExit, match=STATS_SHM_ENV):
+        main(SHARDS, "127.0.0.1", 0, "/nonexistent", "warning")
@@ -0,0 +1,185 @@
+import sys
+import threading
+import uuid
+
+from multiprocessing import shared_memory
+
+import httpx
+import pytest
+
+from src import stats_reader
+from src.constants import SHARED_SYMBOL_BYTES
+from src.exceptions import InvalidBatchError, MaxSymbolsReachedError
+from src.services import SymbolManager
+from src.shared import SharedStatsStore
+
+
+@pytest.fixture
+def writer():
+    store = SharedStatsStore.create(f"fds-test-{uuid.uuid4().hex[:12]}", slots=3)
+    yield store
+    store.close()
+
+
+def attach(writer: SharedStatsStore) -> SharedStatsStore:
+    # A separate mapping of the segment, as a reader process would have
+    return SharedStatsStore(shared_memory.SharedMemory(writer.memory.name))
+
+
+def test_shared_store_publish_and_read(writer):
+    reader = attach(writer)
+    assert reader.read("AAPL") is None
+
+    fields = {1: {"min": 1.0, "max": 3.0, "last": 3.0, "avg": 2.0, "var": 2 / 3, "values": 3}}
+    writer.publish("AAPL", 1, 3, fields)
+    writer.publish("BRK/A", 1, 0, {})
+
+    assert reader.read("AAPL") == (1, 3, fields)
+    assert reader.read("BRK/A") == (1, 0, {})
+    assert reader.symbols() == ["AAPL", "BRK/A"]
+    assert not reader.closed
+    reader.close()
+
+
+def test_shared_store_claim_limits(writer):
+    with pytest.raises(InvalidBatchError):
+        writer.claim("X" * (SHARED_SYMBOL_BYTES + 1))
+    for symbol in ("A", "B", "C"):
+        writer.claim(symbol)
+    assert writer.claim("A") == 0
+    with pytest.raises(MaxSymbolsReachedError):
+        writer.claim("D")
+
+
+def test_shared_store_release_and_reuse(writer):
+    reader = attach(writer)
+    fields = {1: {"min": 1.0, "max": 1.0, "last": 1.0, "avg": 1.0, "var": 0.0, "values": 1}}
+    for symbol in ("A", "B", "C"):
+        writer.publish(symbol, 1, 1, fields)
+    assert reader.read("A") == (1, 1, fields)
+    sequence = reader.sequence("A")
+
+    writer.release("A")
+    assert reader.read("A") is None
+    assert reader.symbols() == ["B", "C"]
+    # The released slot goes to the next symbol, starting from no snapshot
+    assert writer.claim("D") == 0
+    assert reader.read("D") == (0, 0, {})
+    assert reader.sequence("D") > sequence
+    assert reader.read("A") is None
+    assert sorted(reader.symbols()) == ["B", "C", "D"]
+    with pytest.raises(MaxSymbolsReachedError):
+        writer.claim("E")
+    reader.close()
+
+
+def test_shared_store_replaces_stale_segment(writer):
+    reader = attach(writer)
+    replacement = SharedStatsStore.create(writer.memory.name)
+    # The stale segment is marked closed, so readers know to attach again
+    assert reader.closed
+    assert not replacement.closed
+    replacement.close()
+    reader.close()
+
+
+def test_shared_store_reads_are_consistent(writer):
+    reader = attach(writer)
+    writer.publish("AAPL", 0, 0, {})
+    done = threading.Event()
+
+    def publish():
+        for version in range(1, 20001):
+            value = float(version)
+            stats = {"min": value, "max": value, "last": value, "avg": value, "var": value}
+            writer.publish("AAPL", version, version, {1: {**stats, "values": version}})
+        done.set()
+
+    thread = threading.Thread(target=publish)
+    thread.start()
+    while not done.is_set():
+        version, count, fields = reader.read("AAPL")
+        # Every field of a read comes from the same publish
+        assert count == version
+        if version:
+            assert set(fields[1].values()) == {float(version)}
+    thread.join()
+    assert reader.read("AAPL")[0] == 20000
+    reader.close()
+
+
+@pytest.mark.asyncio
+async def test_symbol_manager_publishes_to_shared_store(writer):
+    manager = SymbolManager(store=writer)
+    await manager.add_batch("AAPL", [1.0, 2.0, 3.0])
+    await manager.add_batches([("MSFT", [4.0]), ("AAPL", [5.0])])
+
+    reader = attach(writer)
+    for symbol in ("AAPL", "MSFT"):
+        snapshot = manager.symbols[symbol].snapshot
+        assert reader.read(symbol) == (snapshot.version, snapshot.count, snapshot.fields)
+    reader.close()
+
+
+@pytest.mark.asyncio
+async def test_symbol_manager_evictions_release_shared_slots(writer, monkeypatch):
+    manager = SymbolManager(store=writer, memory_budget=1, max_symbols=3)
+    monkeypatch.setattr(stats_reader, "store", attach(writer))
+    monkeypatch.setattr(stats_reader, "snapshots", {})
+    for i in range(4):
+        await manager.add_batch(f"S{i}", [1.0, 2.0])
+        assert stats_reader.read_snapshot(f"S{i}").count == 2
+    # Each batch evicted the previous symbol and freed its slot for the next one
+    assert list(manager.symbols) == ["S3"]
+    assert stats_reader.read_snapshot("S2") is None
+    assert stats_reader.store.symbols() == ["S3"]
+
+    # Added again, its versions start over, but readers do not mistake them for old ones
+    await manager.add_batch("S0", [5.0])
+    assert stats_reader.read_snapshot("S0").get(1).last == 5.0
+    stats_reader.store.close()
+
+
+@pytest.mark.asyncio
+async def test_stats_reader_endpoints(writer, monkeypatch):
+    manager = SymbolManager(store=writer)
+    await manager.add_batch("AAPL", [1.0, 2.0, 3.0])
+    monkeypatch.setattr(stats_reader, "store", attach(writer))
+    monkeypatch.setattr(stats_reader, "snapshots", {})
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=stats_reader.app), base_url="http://test"
+    ) as client:
+        response = await client.get("/stats/AAPL/1")
+        assert response.status_code == 200
+        assert response.content == await manager.get_stats_json("AAPL", 1)
+
+        response = await client.get("/stats", params={"k": 1})
+        assert response.content == await manager.get_multi_stats_json(ks=[1])
+
+        # The snapshot read is reused until a batch lands
+        snapshot = stats_reader.snapshots["AAPL"]
+        await client.get("/stats/AAPL/2")
+        assert stats_reader.snapshots["AAPL"][1] is snapshot[1]
+        await manager.add_batch("AAPL", [4.0])
+        response = await client.get("/stats/AAPL/1")
+        assert response.json()["last"] == 4.0
+
+        assert (await client.get("/stats/MSFT/1")).status_code == 404
+        assert (await client.get("/stats/AAPL/9")).status_code == 422
+    stats_reader.store.close()
+
+
+@pytest.mark.skipif(sys.version_info < (3, 13), reason="untracked attach needs Python 3.13")
+@pytest.mark.asyncio
+async def test_stats_reader_attaches_by_name(writer, monkeypatch):
+    monkeypatch.setattr(stats_reader, "stats_shm_name", writer.memory.name)
+    monkeypatch.setattr(stats_reader, "store", None)
+    writer.publish("AAPL", 1, 1, {1: dict.fromkeys(("min", "max", "last", "avg", "var"), 1.0)})
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=stats_reader.app), base_url="http://test"
+    ) as client:
+        assert (await client.get("/stats")).json()["AAPL"]["version"] == 1
+        writer.close()
+        assert (await client.get("/stats")).status_code == 503
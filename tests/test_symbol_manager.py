@@ -1,20 +1,30 @@
+import asyncio
+import json
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 import pytest
 
-from src.constants import MAX_SYMBOLS
+from src.constants import MAX_BUDGETED_SYMBOLS, MAX_SYMBOLS, WINDOW_SIZES
 from src.exceptions import MaxSymbolsReachedError, SymbolNotFoundError
-from src.services import SymbolManager
+from src.services import SymbolManager, SymbolWindows
 
 
 def test_symbol_manager_initialization():
     manager = SymbolManager()
     assert len(manager.symbols) == 0
+    assert manager.max_symbols == MAX_SYMBOLS
+    assert SymbolManager(memory_budget=1).max_symbols == MAX_BUDGETED_SYMBOLS
 
 
 @pytest.mark.asyncio
 async def test_symbol_manager_max_symbols():
-    manager = SymbolManager()
-    # Add MAX_SYMBOLS symbols
-    for i in range(MAX_SYMBOLS):
+    manager = SymbolManager(max_symbols=10)
+    # Add max_symbols symbols
+    for i in range(manager.max_symbols):
         await manager.add_batch(f"SYMBOL{i}", [1.0])
 
     # Try to add one more
@@ -49,3 +59,463 @@ async def test_symbol_manager_batch_processing():
     stats_k1 = await manager.get_stats("AAPL", 1)  # window_size = 10
     assert stats_k1.min == 1.0
     assert stats_k1.max == 3.0
+
+
+@pytest.mark.asyncio
+async def test_symbol_manager_windows_share_one_buffer():
+    manager = SymbolManager()
+    await manager.add_batch("AAPL", [float(v) for v in range(15)])
+    assert manager.symbols["AAPL"].buffer.count == 15
+
+    stats_k1 = await manager.get_stats("AAPL", 1)
+    stats_k2 = await manager.get_stats("AAPL", 2)
+    assert stats_k1.values == 10
+    assert stats_k1.min == 5.0
+    assert stats_k2.values == 15
+    assert stats_k2.min == 0.0
+
+
+def test_symbol_windows_arbitrary_window_lengths():
+    rng = np.random.default_rng(1)
+    windows = SymbolWindows(capacity=50_000)
+    values = rng.uniform(100.0, 200.0, 60_000).astype(np.float32)
+    for batch in np.array_split(values, 17):
+        windows.add_many(batch)
+
+    for window_size in [1, 7, 1000, 2049, 33_333, 50_000, 10**6]:
+        window = values[-window_size:][-50_000:].astype(np.float64)
+        stats = windows.window_stats(window_size)
+        assert stats.values == len(window)
+        assert stats.min == window.min()
+        assert stats.max == window.max()
+        assert stats.last == values[-1]
+        assert stats.avg == pytest.approx(window.mean(), rel=1e-12)
+        assert stats.var == pytest.approx(window.var(), rel=1e-9)
+
+
+def test_symbol_windows_published_stats_match_every_window():
+    rng = np.random.default_rng(2)
+    windows = SymbolWindows()
+    values = np.empty(0, dtype=np.float32)
+    # From one value, within one block, then past it and across many blocks
+    for size in [1, 5, 37, 1000, 3, 30_000, 1, 200_000, 7]:
+        batch = (150.0 + np.cumsum(rng.normal(0.0, 0.5, size))).astype(np.float32)
+        windows.add_many(batch)
+        values = np.concatenate([values, batch])
+
+        for k, window_size in WINDOW_SIZES.items():
+            window = values[-window_size:].astype(np.float64)
+            stats = windows.get_stats(k)
+            assert stats.values == len(window)
+            assert stats.min == window.min()
+            assert stats.max == window.max()
+            assert stats.last == values[-1]
+            assert stats.avg == pytest.approx(window.mean(), rel=1e-12)
+            assert stats.var == pytest.approx(window.var(), rel=1e-9, abs=1e-12)
+
+
+def test_symbol_windows_empty():
+    assert SymbolWindows(capacity=10).window_stats(5) is None
+
+
+def test_symbol_windows_time_window_stats():
+    windows = SymbolWindows(capacity=100)
+    windows.add_many(np.array([1.0, 2.0, 3.0]), timestamp=100.0)
+    windows.add_many(np.array([10.0, 20.0]), timestamp=104.0)
+    windows.add_many(np.array([30.0]), timestamp=105.0)
+
+    stats = windows.time_window_stats(2.0, now=106.0)
+    assert stats.values == 3
+    assert stats.min == 10.0
+    assert stats.avg == pytest.approx(20.0)
+
+    assert windows.time_window_stats(10.0, now=106.0).values == 6
+    assert windows.time_window_stats(0.5, now=106.0) is None
+
+
+def test_symbol_windows_time_window_limited_to_buffer():
+    windows = SymbolWindows(capacity=4)
+    windows.add_many(np.array([1.0, 2.0, 3.0]), timestamp=100.0)
+    windows.add_many(np.array([4.0, 5.0, 6.0]), timestamp=101.0)
+
+    stats = windows.time_window_stats(10.0, now=101.0)
+    assert stats.values == 4
+    assert stats.min == 3.0
+
+
+@pytest.mark.asyncio
+async def test_symbol_manager_get_window_stats():
+    manager = SymbolManager()
+    await manager.add_batch("AAPL", [float(v) for v in range(25)])
+
+    stats = await manager.get_window_stats("AAPL", last=5)
+    assert stats.values == 5
+    assert stats.min == 20.0
+
+    stats = await manager.get_window_stats("AAPL", seconds=60.0)
+    assert stats.values == 25
+
+    with pytest.raises(SymbolNotFoundError):
+        await manager.get_window_stats("NONEXISTENT", last=5)
+
+
+def test_symbol_windows_publishes_snapshot_per_batch():
+    windows = SymbolWindows(capacity=1000)
+    assert windows.snapshot.version == 0
+    assert windows.get_stats(1) is None
+
+    windows.add_many(np.arange(15, dtype=np.float32))
+    first = windows.snapshot
+    windows.add_many(np.array([100.0], dtype=np.float32))
+
+    assert windows.snapshot.version == 2
+    assert windows.snapshot.count == 16
+    # Earlier snapshots are left untouched for readers still holding them
+    assert first.get(1).last == 14.0
+    assert first.get(1).values == 10
+    assert windows.get_stats(1).last == 100.0
+    assert windows.get_stats(2).values == 16
+    assert windows.get_stats(1) is windows.get_stats(1)
+
+
+@pytest.mark.asyncio
+async def test_symbol_manager_get_stats_does_not_wait_for_lock():
+    manager = SymbolManager()
+    await manager.add_batch("AAPL", [1.0, 2.0, 3.0])
+
+    async with manager.registry.get("AAPL").lock:
+        stats = await manager.get_stats("AAPL", 1)
+    assert stats.values == 3
+
+
+def test_symbol_windows_stats_json_matches_model():
+    windows = SymbolWindows(capacity=1000)
+    windows.add_many(np.array([1.5, 2.25, 3.0], dtype=np.float32))
+
+    body = windows.get_stats_json(1)
+    assert body == windows.get_stats(1).model_dump_json().encode()
+    assert windows.get_stats_json(1) is body
+
+    windows.add_many(np.array([4.0], dtype=np.float32))
+    assert windows.get_stats_json(1) != body
+
+
+@pytest.mark.asyncio
+async def test_symbol_manager_get_stats_json():
+    manager = SymbolManager()
+    await manager.add_batch("AAPL", [1.0, 2.0, 3.0])
+
+    assert json.loads(await manager.get_stats_json("AAPL", 1))["values"] == 3
+    with pytest.raises(SymbolNotFoundError):
+        await manager.get_stats_json("NONEXISTENT", 1)
+
+
+@pytest.mark.asyncio
+async def test_symbol_manager_add_batches_groups_by_symbol():
+    manager = SymbolManager()
+    await manager.add_batches(
+        [("AAPL", [1.0, 2.0]), ("MSFT", [10.0]), ("AAPL", np.array([3.0])), ("MSFT", [20.0])]
+    )
+
+    stats = await manager.get_stats("AAPL", 1)
+    assert stats.values == 3
+    assert stats.last == 3.0
+    assert (await manager.get_stats("MSFT", 1)).avg == pytest.approx(15.0)
+    # One snapshot per symbol, not per batch
+    assert manager.symbols["AAPL"].snapshot.version == 1
+
+
+@pytest.mark.asyncio
+async def test_symbol_manager_add_batches_max_symbols():
+    manager = SymbolManager(max_symbols=10)
+    await manager.add_batch("SYMBOL0", [1.0])
+
+    batches = [(f"SYMBOL{i}", [1.0]) for i in range(manager.max_symbols + 1)]
+    with pytest.raises(MaxSymbolsReachedError):
+        await manager.add_batches(batches)
+    # Nothing was added
+    assert list(manager.symbols) == ["SYMBOL0"]
+    assert manager.symbols["SYMBOL0"].buffer.count == 1
+
+    # Queued symbols count towards the limit before they are applied
+    for i in range(1, manager.max_symbols):
+        await manager.submit(f"QUEUED{i}", [1.0], wait=False)
+    with pytest.raises(MaxSymbolsReachedError):
+        await manager.add_batches([("SYMBOL0", [2.0]), ("EXTRA", [1.0])])
+    assert manager.registry.get("EXTRA") is None
+    await manager.flush()
+    assert len(manager.symbols) == manager.max_symbols
+
+
+@pytest.mark.asyncio
+async def test_symbol_manager_get_multi_stats_json():
+    manager = SymbolManager()
+    await manager.add_batch("AAPL", [float(v) for v in range(20)])
+    await manager.add_batch("MSFT", [5.0])
+
+    data = json.loads(await manager.get_multi_stats_json())
+    assert set(data) == {"AAPL", "MSFT"}
+    assert data["AAPL"]["version"] == 1
+    assert data["AAPL"]["count"] == 20
+    assert set(data["AAPL"]["stats"]) == {str(k) for k in WINDOW_SIZES}
+    assert data["AAPL"]["stats"]["1"] == manager.symbols["AAPL"].get_stats(1).model_dump()
+
+    data = json.loads(await manager.get_multi_stats_json(["MSFT", "NONEXISTENT"], [2, 1]))
+    assert list(data) == ["MSFT"]
+    assert list(data["MSFT"]["stats"]) == ["2", "1"]
+
+
+@pytest.mark.asyncio
+async def test_symbol_manager_stats_updates_are_coalesced():
+    manager = SymbolManager()
+    updates = manager.stats_updates(["AAPL"], [1], interval=0.01)
+
+    await manager.add_batch("AAPL", [1.0])
+    update = json.loads(await asyncio.wait_for(anext(updates), timeout=1))
+    assert update["AAPL"]["version"] == 1
+
+    # Batches landing before the next update are sent together; other symbols are ignored
+    await manager.add_batch("AAPL", [2.0])
+    await manager.add_batch("MSFT", [1.0])
+    await manager.add_batch("AAPL", [3.0])
+    update = json.loads(await asyncio.wait_for(anext(updates), timeout=1))
+    assert list(update) == ["AAPL"]
+    assert update["AAPL"]["version"] == 3
+    assert update["AAPL"]["stats"]["1"]["last"] == 3.0
+
+    # Nothing is pushed until the symbol changes again
+    await manager.add_batch("MSFT", [2.0])
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(anext(updates), timeout=0.05)
+
+
+@pytest.mark.asyncio
+async def test_symbol_manager_executor_keeps_batch_order():
+    with ThreadPoolExecutor(4) as executor:
+        manager = SymbolManager(executor=executor)
+        batches = [np.arange(i * 100, (i + 1) * 100, dtype=np.float32) for i in range(50)]
+        await asyncio.gather(*(manager.add_batch("AAPL", batch) for batch in batches))
+        await manager.add_batches([("MSFT", [1.0]), ("AAPL", [5000.0])])
+
+    buffer = manager.symbols["AAPL"].buffer
+    values = np.frombuffer(b"".join(buffer.parts(0, buffer.count)), dtype=np.float32)
+    np.testing.assert_array_equal(values, np.arange(5001))
+    assert manager.symbols["AAPL"].snapshot.version == 51
+    assert (await manager.get_stats("MSFT", 1)).last == 1.0
+
+
+@pytest.mark.asyncio
+async def test_symbol_manager_executor_does_not_block_reads(monkeypatch):
+    with ThreadPoolExecutor(1) as executor:
+        manager = SymbolManager(executor=executor)
+        await manager.add_batch("MSFT", [1.0])
+
+        threads = []
+        add_many = SymbolWindows.add_many
+
+        def slow_add_many(self, values):
+            threads.append(threading.current_thread())
+            time.sleep(0.2)
+            add_many(self, values)
+
+        monkeypatch.setattr(SymbolWindows, "add_many", slow_add_many)
+        ingest = asyncio.create_task(manager.add_batch("AAPL", [1.0]))
+        await asyncio.sleep(0.01)
+        # Served while the batch is still being applied in the worker thread
+        assert (await manager.get_stats("MSFT", 1)).last == 1.0
+        assert not ingest.done()
+        await ingest
+
+    assert threads != [threading.main_thread()]
+    assert (await manager.get_stats("AAPL", 1)).last == 1.0
+
+
+@pytest.mark.asyncio
+async def test_symbol_manager_submit_coalesces_queued_batches():
+    manager = SymbolManager()
+    for i in range(100):
+        await manager.submit("AAPL", [float(i)], wait=False)
+    assert "AAPL" not in manager.symbols
+    await manager.flush()
+
+    # Applied as one batch, in submission order
+    snapshot = manager.symbols["AAPL"].snapshot
+    assert (snapshot.version, snapshot.count) == (1, 100)
+    assert (await manager.get_stats("AAPL", 1)).last == 99.0
+    assert not manager.consumers
+
+    await asyncio.gather(*(manager.submit("AAPL", [1.0, 2.0]) for _ in range(10)))
+    # Every waiting submitter returns once its batch is applied
+    assert manager.symbols["AAPL"].snapshot.count == 120
+    assert manager.symbols["AAPL"].snapshot.version < 11
+
+
+@pytest.mark.asyncio
+async def test_symbol_manager_submit_errors(monkeypatch):
+    manager = SymbolManager(max_symbols=10)
+    for i in range(manager.max_symbols):
+        await manager.submit(f"SYMBOL{i}", [1.0], wait=False)
+    # Queued symbols count towards the limit before they are applied
+    with pytest.raises(MaxSymbolsReachedError):
+        await manager.submit("EXTRA", [1.0], wait=False)
+    await manager.flush()
+
+    async def failing_add_batch(symbol, values):
+        raise ValueError("apply failed")
+
+    monkeypatch.setattr(manager, "add_batch", failing_add_batch)
+    with pytest.raises(ValueError, match="apply failed"):
+        await manager.submit("SYMBOL0", [1.0])
+
+
+@pytest.mark.asyncio
+async def test_symbol_manager_submit_waits_when_queue_is_full(monkeypatch):
+    monkeypatch.setattr("src.services.INGEST_MAX_QUEUED", 2)
+    manager = SymbolManager()
+    await manager.submit("AAPL", [1.0], wait=False)
+    await manager.submit("AAPL", [2.0], wait=False)
+    # The third submitter waits for all three batches to be applied
+    await manager.submit("AAPL", [3.0], wait=False)
+    assert manager.symbols["AAPL"].snapshot.count == 3
+
+
+@pytest.mark.asyncio
+async def test_symbol_manager_allocates_windows_lazily():
+    manager = SymbolManager()
+    await manager.add_batch("AAPL", [1.0, 2.0])
+    # Nowhere near the 10^8 values of the largest window
+    assert manager.symbols["AAPL"].nbytes < 2**16
+    assert manager.resident_bytes == manager.symbols["AAPL"].nbytes
+
+
+@pytest.mark.asyncio
+async def test_symbol_manager_spills_cold_symbols(tmp_path):
+    values = np.arange(5000, dtype=np.float32)
+    probe = SymbolWindows()
+    probe.add_many(values)
+    # Room for two symbols' buffers, not three
+    manager = SymbolManager(memory_budget=int(probe.nbytes * 2.5), spill_dir=str(tmp_path))
+    for symbol in ["AAPL", "MSFT", "GOOG"]:
+        await manager.add_batch(symbol, values)
+
+    # The least recently used symbol was spilled, and still serves its stats
+    assert list(manager.resident) == ["MSFT", "GOOG"]
+    assert manager.resident_bytes <= manager.memory_budget
+    assert manager.symbols["AAPL"].buffer.path == tmp_path / "AAPL.f32"
+    assert (await manager.get_stats("AAPL", 3)).avg == pytest.approx(4499.5)
+    assert (await manager.get_window_stats("AAPL", last=10)).min == 4990.0
+    assert list(manager.resident) == ["MSFT", "GOOG"]
+
+    # Its next batch moves it back into memory, spilling the next coldest ones
+    await manager.add_batch("AAPL", [5000.0])
+    assert list(manager.resident)[-1] == "AAPL"
+    assert manager.symbols["MSFT"].buffer.path is not None
+    assert manager.resident_bytes <= manager.memory_budget
+    assert not (tmp_path / "AAPL.f32").exists()
+    stats = await manager.get_stats("AAPL", 4)
+    assert stats.values == 5001
+    assert stats.max == 5000.0
+
+
+@pytest.mark.asyncio
+async def test_symbol_manager_evicts_cold_symbols_past_max_symbols(tmp_path):
+    values = np.arange(5000, dtype=np.float32)
+    probe = SymbolWindows()
+    probe.add_many(values)
+    manager = SymbolManager(
+        memory_budget=int(probe.nbytes * 2.5), spill_dir=str(tmp_path), max_symbols=3
+    )
+    for symbol in ["AAPL", "MSFT", "GOOG"]:
+        await manager.add_batch(symbol, values)
+    assert list(manager.spilled) == ["AAPL"]
+
+    # New symbols evict the least recently used ones rather than being rejected, spilled first
+    await manager.add_batch("AMZN", [1.0])
+    assert list(manager.symbols) == ["MSFT", "GOOG", "AMZN"]
+    assert not (tmp_path / "AAPL.f32").exists()
+    assert not manager.spilled
+    await manager.add_batches([("TSLA", [1.0]), ("MSFT", [2.0])])
+    assert list(manager.symbols) == ["MSFT", "AMZN", "TSLA"]
+    assert list(manager.evicted) == ["AAPL", "GOOG"]
+
+    # Symbols with batches being applied are not evicted
+    async with manager.registry.get("AMZN").lock:
+        await manager.add_batch("NVDA", [1.0])
+    assert list(manager.symbols) == ["MSFT", "AMZN", "NVDA"]
+
+
+@pytest.mark.asyncio
+async def test_symbol_manager_evicts_cold_symbols_without_spill_dir():
+    manager = SymbolManager(memory_budget=1)
+    await manager.add_batch("AAPL", [1.0])
+    await manager.add_batch("MSFT", [2.0])
+
+    # Only the symbol just added is kept, however small the budget
+    assert list(manager.symbols) == ["MSFT"]
+    with pytest.raises(SymbolNotFoundError):
+        await manager.get_stats("AAPL", 1)
+
+    await manager.add_batch("AAPL", [3.0])
+    assert list(manager.symbols) == ["AAPL"]
+    assert (await manager.get_stats("AAPL", 1)).values == 1
+
+
+@pytest.mark.asyncio
+async def test_symbol_manager_unknown_symbols_leave_nothing_behind():
+    manager = SymbolManager(max_symbols=1)
+    await manager.add_batch("AAPL", [1.0])
+    for i in range(100):
+        with pytest.raises(SymbolNotFoundError):
+            await manager.get_stats_json(f"UNKNOWN{i}", 1)
+        with pytest.raises(SymbolNotFoundError):
+            await manager.get_window_stats(f"UNKNOWN{i}", last=10)
+        with pytest.raises(MaxSymbolsReachedError):
+            await manager.add_batch(f"REJECTED{i}", [1.0])
+    assert len(manager.registry) == 1
+
+
+@pytest.mark.asyncio
+async def test_symbol_manager_symbol_ids():
+    manager = SymbolManager(memory_budget=1)
+    await manager.add_batch("AAPL", [1.0, 2.0])
+    await manager.add_batch("MSFT", [3.0])
+    assert manager.symbol_ids() == {"MSFT": 1}  # AAPL was evicted
+    assert json.loads(await manager.get_stats_json_by_id(1, 1))["last"] == 3.0
+    assert manager.symbol_name(1) == "MSFT"
+    for symbol_id in (0, 2):
+        with pytest.raises(SymbolNotFoundError):
+            await manager.get_stats_json_by_id(symbol_id, 1)
+        with pytest.raises(SymbolNotFoundError):
+            manager.symbol_name(symbol_id)
+
+    # Added again, an evicted symbol gets a new ID, and its old one stays unknown
+    await manager.add_batch("AAPL", [4.0])
+    (symbol_id,) = manager.symbol_ids().values()
+    assert symbol_id != 0
+    assert json.loads(await manager.get_stats_json_by_id(symbol_id, 1))["last"] == 4.0
+    with pytest.raises(SymbolNotFoundError):
+        manager.symbol_name(0)
+
+
+@pytest.mark.asyncio
+async def test_symbol_manager_evictions_reclaim_registry_states():
+    manager = SymbolManager(memory_budget=1, max_symbols=2)
+    for i in range(100):
+        await manager.add_batch(f"S{i}", [1.0])
+    assert list(manager.symbols) == ["S99"]
+    assert len(manager.registry) == 1
+    assert len(manager.registry.states) == 2
+
+    # A batch waiting for the lock of a symbol being evicted registers it again
+    state = manager.registry.get("S99")
+    async with state.lock:
+        task = asyncio.create_task(manager.add_batch("S99", [2.0]))
+        await asyncio.sleep(0)
+        manager._evict("S99")
+    await task
+    assert manager.registry.get("S99") is not state
+    assert manager.registry.get("S99").windows is manager.symbols["S99"]
+    assert (await manager.get_stats("S99", 1)).values == 1
+
+    manager.clear()
+    assert len(manager.registry) == 0
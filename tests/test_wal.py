@@ -0,0 +1,181 @@
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+from src.services import SymbolManager
+from src.wal import WriteAheadLog
+
+
+def test_wal_append_and_recover(tmp_path):
+    wal = WriteAheadLog(str(tmp_path), retain=100, segment_values=16)
+    wal.append("AAPL", np.arange(10, dtype=np.float32))
+    wal.append("BRK/A", np.array([1.5], dtype=np.float32))
+    wal.append("AAPL", np.arange(10, 30, dtype=np.float32))
+    wal.close()
+
+    recovered = dict(WriteAheadLog(str(tmp_path), retain=100, segment_values=16).recover())
+    assert set(recovered) == {"AAPL", "BRK/A"}
+    np.testing.assert_array_equal(np.concatenate(recovered["AAPL"]), np.arange(30))
+    assert len(recovered["AAPL"]) == 2  # One memory-mapped array per segment
+    np.testing.assert_array_equal(np.concatenate(recovered["BRK/A"]), [1.5])
+
+
+def test_wal_recovers_only_the_tail(tmp_path):
+    wal = WriteAheadLog(str(tmp_path), retain=20, segment_values=8)
+    for start in range(0, 100, 7):
+        wal.append("AAPL", np.arange(start, min(start + 7, 100), dtype=np.float32))
+    wal.close()
+
+    # Segments wholly before the last 20 values were deleted
+    assert len(list((tmp_path / "AAPL").iterdir())) <= 4
+    ((_, parts),) = WriteAheadLog(str(tmp_path), retain=20, segment_values=8).recover()
+    np.testing.assert_array_equal(np.concatenate(parts), np.arange(80, 100))
+
+
+def test_wal_continues_after_restart_and_torn_write(tmp_path):
+    wal = WriteAheadLog(str(tmp_path), retain=100, segment_values=16)
+    wal.append("AAPL", np.arange(5, dtype=np.float32))
+    wal.close()
+    # A crash in the middle of writing a value leaves a partial one at the end
+    with open(tmp_path / "AAPL" / f"{0:020d}.f32", "ab") as segment:
+        segment.write(b"\x00\x01")
+
+    wal = WriteAheadLog(str(tmp_path), retain=100, segment_values=16)
+    wal.append("AAPL", np.arange(5, 20, dtype=np.float32))
+    wal.close()
+
+    ((_, parts),) = WriteAheadLog(str(tmp_path), retain=100, segment_values=16).recover()
+    np.testing.assert_array_equal(np.concatenate(parts), np.arange(20))
+
+
+@pytest.mark.asyncio
+async def test_wal_group_commit_fsyncs_off_the_event_loop(tmp_path, monkeypatch):
+    synced = []
+    monkeypatch.setattr("src.wal.os.fsync", lambda fd: synced.append(threading.get_ident()))
+    wal = WriteAheadLog(str(tmp_path), retain=100, segment_values=16)
+    # Appending never fsyncs, even past a segment boundary
+    wal.append("AAPL", np.arange(20, dtype=np.float32))
+    wal.append("MSFT", np.arange(3, dtype=np.float32))
+    assert not synced
+
+    await wal.commit()
+    # Both segments of AAPL and the one of MSFT, from a worker thread
+    assert len(synced) == 3
+    assert threading.get_ident() not in synced
+    assert not wal.dirty
+    await wal.commit()
+    assert len(synced) == 3
+    wal.close()
+
+    recovered = dict(WriteAheadLog(str(tmp_path), retain=100, segment_values=16).recover())
+    np.testing.assert_array_equal(np.concatenate(recovered["AAPL"]), np.arange(20))
+
+
+@pytest.mark.asyncio
+async def test_wal_synced_waits_for_the_commit_covering_it(tmp_path, monkeypatch):
+    synced = []
+    monkeypatch.setattr("src.wal.os.fsync", synced.append)
+    wal = WriteAheadLog(str(tmp_path), retain=100, segment_values=16)
+    await wal.synced()  # Nothing logged yet
+
+    wal.append("AAPL", np.arange(3, dtype=np.float32))
+    waiters = [asyncio.create_task(wal.synced()) for _ in range(3)]
+    await asyncio.sleep(0.01)
+    assert not any(waiter.done() for waiter in waiters)
+    # The waiters share one commit
+    await wal.commit()
+    await asyncio.gather(*waiters)
+    assert len(synced) == 1
+
+    # A failed commit reaches its waiters, and the next one fsyncs its segments again
+    def fail(fd):
+        raise OSError("disk gone")
+
+    monkeypatch.setattr("src.wal.os.fsync", fail)
+    wal.append("AAPL", np.arange(3, dtype=np.float32))
+    waiter = asyncio.create_task(wal.synced())
+    await asyncio.sleep(0)
+    with pytest.raises(OSError):
+        await wal.commit()
+    with pytest.raises(OSError):
+        await waiter
+    monkeypatch.setattr("src.wal.os.fsync", synced.append)
+    waiter = asyncio.create_task(wal.synced())
+    await asyncio.sleep(0)
+    await wal.commit()
+    await waiter
+    assert len(synced) == 2
+    wal.close()
+
+
+@pytest.mark.asyncio
+async def test_wal_keeps_few_files_open(tmp_path, monkeypatch):
+    synced = []
+    monkeypatch.setattr("src.wal.os.fsync", synced.append)
+    wal = WriteAheadLog(str(tmp_path), retain=100, segment_values=16, max_open=2)
+    symbols = [f"S{i}" for i in range(5)]
+    for symbol in symbols * 2:
+        wal.append(symbol, np.arange(3, dtype=np.float32))
+        assert sum(log.file is not None for log in wal.logs.values()) <= 2
+    assert list(wal.open) == ["S3", "S4"]
+
+    # Closed segments are still fsynced by the next commit, and reopened by the next append
+    await wal.commit()
+    assert len(synced) == len(symbols)
+    wal.append("S0", np.arange(3, 5, dtype=np.float32))
+    wal.close()
+
+    recovered = dict(WriteAheadLog(str(tmp_path), retain=100, segment_values=16).recover())
+    np.testing.assert_array_equal(np.concatenate(recovered["S0"]), [0, 1, 2, 0, 1, 2, 3, 4])
+    np.testing.assert_array_equal(np.concatenate(recovered["S4"]), [0, 1, 2, 0, 1, 2])
+
+
+@pytest.mark.asyncio
+async def test_symbol_manager_recovers_from_wal(tmp_path):
+    manager = SymbolManager(wal=WriteAheadLog(str(tmp_path)))
+    await manager.add_batch("AAPL", [1.0, 2.0, 3.0])
+    await manager.add_batch("MSFT", [10.0])
+    await manager.add_batch("AAPL", [4.0])
+    expected = await manager.get_stats("AAPL", 1)
+    manager.wal.close()
+
+    recovered = SymbolManager(wal=WriteAheadLog(str(tmp_path)))
+    await recovered.recover()
+    assert await recovered.get_stats("AAPL", 1) == expected
+    assert (await recovered.get_stats("MSFT", 1)).last == 10.0
+
+    # New batches are logged after the recovered ones
+    await recovered.add_batch("AAPL", [5.0])
+    assert (await recovered.get_stats("AAPL", 1)).values == 5
+
+
+@pytest.mark.asyncio
+async def test_symbol_manager_restarts_without_evicted_symbols(tmp_path):
+    manager = SymbolManager(wal=WriteAheadLog(str(tmp_path)), memory_budget=1)
+    await manager.add_batch("A", [1.0, 2.0])
+    await manager.add_batch("B", [3.0])
+    # Evicted, A is added again without the values it held
+    await manager.add_batch("A", [4.0])
+    assert list(manager.symbols) == ["A"]
+    manager.wal.close()
+
+    recovered = SymbolManager(wal=WriteAheadLog(str(tmp_path)))
+    await recovered.recover()
+    assert list(recovered.symbols) == ["A"]
+    assert (await recovered.get_stats("A", 1)).values == 1
+
+
+@pytest.mark.asyncio
+async def test_symbol_manager_recovers_within_memory_budget(tmp_path):
+    manager = SymbolManager(wal=WriteAheadLog(str(tmp_path)))
+    for symbol in ("A", "B", "C"):
+        await manager.add_batch(symbol, [1.0, 2.0])
+    manager.wal.close()
+
+    recovered = SymbolManager(wal=WriteAheadLog(str(tmp_path)), memory_budget=1)
+    await recovered.recover()
+    assert list(recovered.symbols) == ["C"]
+    assert list(recovered.resident) == ["C"]
+    assert list(recovered.wal.logs) == ["C"]